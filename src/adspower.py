@@ -1,13 +1,14 @@
 
-import httpx
 import logging
 import asyncio
+import os
+from src import http_pool
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-ADSPOWER_API_URL = "http://127.0.0.1:50325"
-ADSPOWER_API_KEY = "e9d694deca25694a99bb4b6590725de4"
+ADSPOWER_API_URL = os.environ.get("ADSPOWER_API_URL", "http://127.0.0.1:50325")
+ADSPOWER_API_KEY = os.environ.get("ADSPOWER_API_KEY", "e9d694deca25694a99bb4b6590725de4")
 
 class AdsPowerController:
     @staticmethod
@@ -32,22 +33,22 @@ class AdsPowerController:
         }
         try:
             logger.info(f"Starting AdsPower profile: {user_id} with maximized window...")
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(url, params=params, headers=headers, timeout=30)
-                
-                try:
-                    data = resp.json()
-                except Exception:
-                    logger.error(f"Failed to parse JSON. Status: {resp.status_code}, Body: {resp.text}")
-                    return None
-                
-                if data.get("code") == 0:
-                    ws_endpoint = data["data"]["ws"]["puppeteer"]
-                    logger.info(f"Profile {user_id} started. WS: {ws_endpoint}")
-                    return ws_endpoint
-                else:
-                    logger.error(f"Failed to start profile {user_id}: {data}")
-                    return None
+            client = http_pool.get_client(ADSPOWER_API_URL)
+            resp = await client.get(url, params=params, headers=headers, timeout=30)
+            
+            try:
+                data = resp.json()
+            except Exception:
+                logger.error(f"Failed to parse JSON. Status: {resp.status_code}, Body: {resp.text}")
+                return None
+            
+            if data.get("code") == 0:
+                ws_endpoint = data["data"]["ws"]["puppeteer"]
+                logger.info(f"Profile {user_id} started. WS: {ws_endpoint}")
+                return ws_endpoint
+            else:
+                logger.error(f"Failed to start profile {user_id}: {data}")
+                return None
         except Exception as e:
             logger.error(f"AdsPower API Error: {e}")
             return None
@@ -64,19 +65,55 @@ class AdsPowerController:
         }
         try:
             logger.info(f"Stopping AdsPower profile: {user_id}...")
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(url, headers=headers, timeout=10)
-                data = resp.json()
-                if data.get("code") == 0:
-                    logger.info(f"Profile {user_id} stopped.")
-                    return True
-                else:
-                    logger.warning(f"Failed to stop profile {user_id}: {data}")
-                    return False
+            client = http_pool.get_client(ADSPOWER_API_URL)
+            resp = await client.get(url, headers=headers, timeout=10)
+            data = resp.json()
+            if data.get("code") == 0:
+                logger.info(f"Profile {user_id} stopped.")
+                return True
+            else:
+                logger.warning(f"Failed to stop profile {user_id}: {data}")
+                return False
         except Exception as e:
             logger.error(f"AdsPower API Error: {e}")
             return False
 
+    @staticmethod
+    async def is_profile_active(user_id):
+        """
+        Checks whether the profile browser is still running.
+        Returns None if the status could not be read.
+        """
+        url = f"{ADSPOWER_API_URL}/api/v1/browser/active?user_id={user_id}"
+        headers = {"Authorization": f"Bearer {ADSPOWER_API_KEY}"}
+        try:
+            client = http_pool.get_client(ADSPOWER_API_URL)
+            resp = await client.get(url, headers=headers, timeout=10)
+            data = resp.json()
+            if data.get("code") == 0:
+                return data.get("data", {}).get("status") == "Active"
+            return None
+        except Exception as e:
+            logger.error(f"AdsPower API Error (is_profile_active): {e}")
+            return None
+
+    @staticmethod
+    async def wait_until_stopped(user_id, timeout=5, interval=0.5):
+        """
+        Waits until AdsPower reports the profile as inactive (or timeout).
+        Returns True as soon as the browser is really gone.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            active = await AdsPowerController.is_profile_active(user_id)
+            if active is False:
+                return True
+            if loop.time() >= deadline:
+                logger.warning(f"Profile {user_id} still reported active after {timeout}s.")
+                return False
+            await asyncio.sleep(interval)
+
     @staticmethod
     async def get_profile_details(user_id):
         """
@@ -85,13 +122,13 @@ class AdsPowerController:
         url = f"{ADSPOWER_API_URL}/api/v1/user/list?user_id={user_id}"
         headers = {"Authorization": f"Bearer {ADSPOWER_API_KEY}"}
         try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(url, headers=headers, timeout=10)
-                data = resp.json()
-                if data.get("code") == 0 and "data" in data and "list" in data["data"]:
-                    user_list = data["data"]["list"]
-                    if user_list:
-                        return user_list[0]
+            client = http_pool.get_client(ADSPOWER_API_URL)
+            resp = await client.get(url, headers=headers, timeout=10)
+            data = resp.json()
+            if data.get("code") == 0 and "data" in data and "list" in data["data"]:
+                user_list = data["data"]["list"]
+                if user_list:
+                    return user_list[0]
             return None
         except Exception as e:
             logger.error(f"AdsPower API Error (get_profile_details): {e}")
@@ -110,15 +147,15 @@ class AdsPowerController:
         }
         try:
             logger.info(f"Updating proxy config for profile {user_id}...")
-            async with httpx.AsyncClient() as client:
-                resp = await client.post(url, json=payload, headers=headers, timeout=20)
-                data = resp.json()
-                if data.get("code") == 0:
-                    logger.info(f"Successfully updated proxy for {user_id}")
-                    return True
-                else:
-                    logger.error(f"Failed to update proxy for {user_id}: {data}")
-                    return False
+            client = http_pool.get_client(ADSPOWER_API_URL)
+            resp = await client.post(url, json=payload, headers=headers, timeout=20)
+            data = resp.json()
+            if data.get("code") == 0:
+                logger.info(f"Successfully updated proxy for {user_id}")
+                return True
+            else:
+                logger.error(f"Failed to update proxy for {user_id}: {data}")
+                return False
         except Exception as e:
             logger.error(f"AdsPower API Error (update_proxy_config): {e}")
             return False
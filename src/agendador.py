@@ -1,43 +1,182 @@
-import schedule
-import time
-import subprocess
-import sys
-import os
-from datetime import datetime
-
-# --- CONFIGURAÇÃO ---
-HORARIO_EXECUCAO = "01:00"  # Hora que você quer rodar (Formato 24h)
-SCRIPT_ALVO = "src/batch_runner.py"
-# --------------------
-
-def tarefa():
-    print(f"[{datetime.now().strftime('%H:%M')}] Disparando execução do robô...")
-    
-    # Usa o mesmo interpretador Python atual para rodar o script alvo
-    # Isso garante que ele use as bibliotecas do venv
-    try:
-        subprocess.run([sys.executable, SCRIPT_ALVO], check=True)
-        print("Execução agendada finalizada.")
-    except Exception as e:
-        print(f"Erro ao rodar script agendado: {e}")
-
-# Configura o agendamento
-schedule.every().day.at(HORARIO_EXECUCAO).do(tarefa)
-
-# Se quiser rodar a cada X horas, descomente a linha abaixo:
-# schedule.every(4).hours.do(tarefa) 
-
-print(f"Agendador Ativo! O robo rodara todo dia as {HORARIO_EXECUCAO}")
-print("Mantenha este terminal aberto.")
-
-# Loop infinito para checar o horário
-contador = 0
-while True:
-    schedule.run_pending()
-    time.sleep(60) # Checa a cada minuto
-    contador += 1
-    
-    # A cada 50 minutos mostra um "estou vivo" para dar feedback visual
-    if contador >= 50:
-        print(f"[{datetime.now().strftime('%H:%M')}] Agendador aguardando proxima execucao...")
-        contador = 0
\ No newline at end of file
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sys
+import time
+from datetime import datetime
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import batch_runner
+from src import http_pool
+from src import metrics
+from src import tracing
+from src import screenshots
+from src import token_outbox
+from src import result_writer
+from src.playwright_runtime import runtime as playwright_runtime
+from src.run_journal import RunJournal
+from src.refresh_scheduler import RefreshScheduler, RefreshPlan, format_load_curve
+from src.token_store import get_store
+
+logger = logging.getLogger("Agendador")
+
+# Em vez de rodar todas as contas às 01:00, cada conta é renovada pouco antes do
+# `exp` do último token entregue (SCHEDULER_LEAD), num ritmo espalhado pelo dia.
+# Ajustes em src/refresh_scheduler.py (SCHEDULER_*).
+
+
+class DayRun:
+    """
+    Journal and report of one calendar day. Every day feeds the same executor
+    pipeline (pre-warm look-ahead and adaptive window kept across chunks and
+    days); the report goes out once the day is over and its last account has
+    finished.
+    """
+
+    def __init__(self, executor, scheduler):
+        self.date = datetime.now().strftime("%Y-%m-%d")
+        self.journal = RunJournal()
+        self.executor = executor
+        self.started = time.time()
+        self.accounts = 0
+        self.outstanding = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.scheduler = scheduler
+        self.stats_at_start = dict(scheduler.stats)
+
+    async def open(self):
+        self.journal.start_run([], run_id=f"agendador-{self.date}-{time.strftime('%H%M%S')}")
+        await self.journal.start()
+        screenshots.set_run_id(self.journal.run_id)
+
+    def _settled(self, count=1):
+        self.outstanding -= count
+        if not self.outstanding:
+            self._idle.set()
+
+    async def process(self, chunk, on_finished):
+        pending = {acc['username'] for acc in chunk}
+        self.accounts += len(chunk)
+        self.outstanding += len(chunk)
+        self._idle.clear()
+
+        async def finished(account, outcome):
+            pending.discard(account['username'])
+            try:
+                await on_finished(account, outcome)
+            finally:
+                self._settled()
+
+        self.journal.start_run(chunk, run_id=self.journal.run_id)
+        try:
+            await self.executor.submit(chunk, on_finished=finished, journal=self.journal)
+        except BaseException:
+            self._settled(len(pending))
+            raise
+
+    async def close(self, period):
+        """
+        `period`: executor counters of this day (BatchExecutor.rollover()).
+        """
+        await self._idle.wait()
+        if self.accounts:
+            stats = self.scheduler.stats
+            plan = self.scheduler.plan
+            await batch_runner.send_report(
+                period,
+                time.time() - self.started,
+                title=f"🤖 **Relatório do Agendador ({datetime.strptime(self.date, '%Y-%m-%d').strftime('%d/%m/%Y')})**",
+                extra_lines=[
+                    f"🗓️ Agendador: {self.accounts} contas enviadas "
+                    f"({stats['overdue'] - self.stats_at_start['overdue']} vencidas, "
+                    f"{stats['paced'] - self.stats_at_start['paced']} no ritmo), "
+                    f"{stats['skipped_fresh']} puladas com token ainda válido, "
+                    f"ritmo atual {plan.rate * 3600 if plan else 0:.1f}/h",
+                    f"⏳ Falhas adiadas com espera crescente: {stats['backoff'] - self.stats_at_start['backoff']}, "
+                    f"contas paradas até o dia seguinte (senha/bloqueio): {stats['parked'] - self.stats_at_start['parked']}",
+                ],
+            )
+        await self.journal.close()
+
+
+async def show_plan():
+    accounts = await batch_runner.fetch_active_accounts()
+    expiries = await asyncio.to_thread(get_store().expiries)
+    print(format_load_curve(RefreshPlan(accounts, expiries, time.time())))
+    await http_pool.close_all()
+
+
+async def run_agendador(concurrency_limit=1, max_concurrency=None):
+    max_concurrency = max_concurrency or batch_runner.MAX_CONCURRENCY or concurrency_limit
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows: Ctrl+C cancels the run and the cleanup below still happens
+            pass
+
+    day = None
+
+    async def process_chunk(chunk, on_finished):
+        await day.process(chunk, on_finished)
+
+    scheduler = RefreshScheduler(process_chunk, batch_runner.fetch_active_accounts)
+    metrics_server = await metrics.start_server()
+    await result_writer.start_default_writer()
+    await token_outbox.start_default_sender()
+    closing = set()
+    # One pipeline for the whole process; each day only swaps the journal it records into
+    executor = batch_runner.BatchExecutor(None, concurrency_limit, max_concurrency)
+    try:
+        day = DayRun(executor, scheduler)
+        await day.open()
+        executor.journal = day.journal
+        executor.open()
+        print(f"Agendador ativo! Contas renovadas antes do vencimento do token (concorrência até {max_concurrency}).")
+        print("Mantenha este terminal aberto.")
+
+        async def rollover():
+            nonlocal day
+            while not stop.is_set():
+                await asyncio.sleep(60)
+                if datetime.now().strftime("%Y-%m-%d") != day.date:
+                    previous, day = day, DayRun(executor, scheduler)
+                    await day.open()
+                    task = asyncio.create_task(previous.close(await executor.rollover(day.journal)))
+                    closing.add(task)
+                    task.add_done_callback(closing.discard)
+
+        rollover_task = asyncio.create_task(rollover())
+        try:
+            await scheduler.run(stop)
+        finally:
+            rollover_task.cancel()
+            await asyncio.gather(rollover_task, return_exceptions=True)
+        await asyncio.gather(*closing)
+        await executor.close()
+        await day.close(executor)
+    finally:
+        # No-op after a clean stop; if interrupted, stops profiles pre-warmed but never used
+        await executor.close()
+        await result_writer.stop_default_writer()
+        await token_outbox.stop_default_sender()
+        await screenshots.close()
+        await playwright_runtime.stop()
+        await http_pool.close_all()
+        await metrics.stop_server(metrics_server)
+        tracing.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh each account just before its Livelo token expires")
+    parser.add_argument("--concurrency", type=int, default=1, help="Initial concurrency window")
+    parser.add_argument("--plan", action="store_true", help="Only print the projected load curve")
+    args = parser.parse_args()
+    asyncio.run(show_plan() if args.plan else run_agendador(concurrency_limit=args.concurrency))
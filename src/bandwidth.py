@@ -0,0 +1,181 @@
+import asyncio
+import contextvars
+import logging
+import os
+from urllib.parse import urlsplit
+
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+# Distinct accounts/sessions/domains kept in the report totals; past it the
+# smaller half is dropped (long-lived processes would otherwise grow forever)
+BANDWIDTH_MAX_KEYS = int(os.environ.get("BANDWIDTH_MAX_KEYS", "5000"))
+
+PROXY_BYTES = metrics.Counter(
+    "umx_proxy_bytes_total", "Bytes received by account browsers (CDP encodedDataLength)", labels=("proxy", "resource_type")
+)
+ACCOUNT_BYTES = metrics.Histogram(
+    "umx_account_bytes", "Bytes received per account run",
+    buckets=(100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000, 25_000_000, 50_000_000),
+)
+
+# Meter of the account run executing in the current task
+_current = contextvars.ContextVar("bandwidth_meter", default=None)
+
+# Process-wide totals for the run report (like resource_blocking.totals())
+_totals = {"accounts": 0, "bytes": 0, "by_account": {}, "by_proxy": {}, "by_session": {}, "by_domain": {}, "by_type": {}}
+
+
+def _add(bucket, key, amount):
+    bucket[key] = bucket.get(key, 0) + amount
+
+
+def _add_capped(bucket, key, amount):
+    _add(bucket, key, amount)
+    if len(bucket) > BANDWIDTH_MAX_KEYS:
+        keep = sorted(bucket.items(), key=lambda kv: -kv[1])[:BANDWIDTH_MAX_KEYS // 2]
+        bucket.clear()
+        bucket.update(keep)
+
+
+class BandwidthMeter:
+    """
+    Counts bytes actually received by every page of a context, from the CDP
+    Network.loadingFinished encodedDataLength (compressed size on the wire,
+    headers included), split by domain and resource type. `session` is the
+    sticky proxy session id of the run (scraper._rotate_proxy_session), so the
+    report can tell which session pulled what; the Prometheus counter stays
+    per proxy host (a label per session would never stop growing).
+    """
+
+    def __init__(self, context, account, proxy=None, session=None):
+        self.context = context
+        self.account = account
+        self.proxy = proxy or "direct"
+        self.session = session
+        self.total = 0
+        self.by_domain = {}
+        self.by_type = {}
+        self._requests = {}
+        self._sessions = {}
+        self._attaching = set()
+        self._token = None
+
+    async def start(self):
+        self._token = _current.set(self)
+        self.context.on("page", self._on_page)
+        for page in list(self.context.pages):
+            await self.attach(page)
+        return self
+
+    def _on_page(self, page):
+        task = asyncio.create_task(self.attach(page))
+        self._attaching.add(task)
+        task.add_done_callback(self._attaching.discard)
+
+    async def attach(self, page):
+        if page in self._sessions:
+            return
+        self._sessions[page] = None
+        try:
+            session = await self.context.new_cdp_session(page)
+            session.on("Network.requestWillBeSent", self._on_request)
+            session.on("Network.loadingFinished", self._on_finished)
+            session.on("Network.loadingFailed", self._on_failed)
+            await session.send("Network.enable")
+            self._sessions[page] = session
+        except Exception as e:
+            logger.debug(f"Bandwidth meter could not attach to page: {e}")
+
+    def _on_request(self, params):
+        url = params.get("request", {}).get("url", "")
+        if url.startswith("data:"):
+            return
+        host = urlsplit(url).hostname or "unknown"
+        self._requests[params["requestId"]] = (host, params.get("type", "Other").lower())
+
+    def _on_failed(self, params):
+        # Aborted (resource blocking), cancelled or failed: nothing to count, just forget it
+        self._requests.pop(params.get("requestId"), None)
+
+    def _on_finished(self, params):
+        info = self._requests.pop(params.get("requestId"), None)
+        if not info:
+            return
+        size = int(params.get("encodedDataLength") or 0)
+        host, resource_type = info
+        self.total += size
+        _add(self.by_domain, host, size)
+        _add(self.by_type, resource_type, size)
+
+    async def stop(self):
+        """
+        Detaches from the pages and adds this run to the metrics and report totals.
+        """
+        try:
+            self.context.remove_listener("page", self._on_page)
+        except Exception:
+            pass
+        for task in list(self._attaching):
+            task.cancel()
+        for session in self._sessions.values():
+            if session:
+                try: await session.detach()
+                except Exception: pass
+        if self._token:
+            _current.reset(self._token)
+            self._token = None
+
+        _totals["accounts"] += 1
+        _totals["bytes"] += self.total
+        _add_capped(_totals["by_account"], self.account, self.total)
+        _add(_totals["by_proxy"], self.proxy, self.total)
+        _add_capped(_totals["by_session"], self.session_key, self.total)
+        for host, size in self.by_domain.items():
+            _add_capped(_totals["by_domain"], host, size)
+        for resource_type, size in self.by_type.items():
+            _add(_totals["by_type"], resource_type, size)
+            PROXY_BYTES.inc(size, proxy=self.proxy, resource_type=resource_type)
+        ACCOUNT_BYTES.observe(self.total)
+        return self
+
+    @property
+    def session_key(self):
+        return f"{self.proxy} session {self.session} ({self.account})" if self.session else f"{self.proxy} ({self.account})"
+
+    def summary(self, top=3):
+        domains = sorted(self.by_domain.items(), key=lambda kv: -kv[1])[:top]
+        return f"{self.total // 1024} KB via {self.proxy} (" + ", ".join(f"{h} {b // 1024} KB" for h, b in domains) + ")"
+
+
+async def track(page):
+    """
+    Attaches the current account's meter to a page right away, so its first
+    navigation is counted (the "page" event handler may attach too late).
+    """
+    meter = _current.get()
+    if meter:
+        await meter.attach(page)
+
+
+def totals():
+    return {k: (dict(v) if isinstance(v, dict) else v) for k, v in _totals.items()}
+
+
+def top(bucket, n=5, totals=None):
+    """
+    Largest entries of a bucket, from the live totals or from a totals() snapshot.
+    """
+    return sorted((totals or _totals)[bucket].items(), key=lambda kv: -kv[1])[:n]
+
+
+def reset():
+    """
+    Starts the report totals over (agendador, once per daily report).
+    """
+    for key, value in _totals.items():
+        if isinstance(value, dict):
+            value.clear()
+        else:
+            _totals[key] = 0
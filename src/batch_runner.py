@@ -1,18 +1,34 @@
 
 import asyncio
+import copy
 import logging
 import os
 import sys
-import random
+import time
 
 # Add project root to path to allow 'from src...' imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from supabase import create_client, Client
 from dotenv import load_dotenv
-from src.scraper import get_balance
+from src.scraper import (
+    get_balance, scrape_prepared, update_account_db_multi, classify_outcome, page_check_stats, reset_page_check_stats
+)
 from src.adspower import AdsPowerController
+from src import http_pool
+from src.playwright_runtime import runtime as playwright_runtime
+from src.concurrency import AdaptiveLimiter, TokenBucket
+from src.prewarm import ProfilePrewarmer
+from src.token_refresh import refresh_tokens_fast_path
+from src.run_journal import RunJournal
+from src import result_writer
 import src.clickup as clickup
+from src import metrics
+from src import tracing
+from src import resource_blocking
+from src import bandwidth
+from src import screenshots
+from src import token_outbox
+from src.repository import get_repository
 
 # Configure logging
 logging.basicConfig(
@@ -21,43 +37,79 @@ logging.basicConfig(
 )
 logger = logging.getLogger("BatchRunner")
 
-# Init Supabase
 load_dotenv()
-url: str = os.environ.get("SUPABASE_URL", "")
-key: str = os.environ.get("SUPABASE_KEY", "")
-supabase: Client = create_client(url, key)
-
 
 # Channel ID for Daily Reports (Chat)
 CLICKUP_CHANNEL_ID = os.environ.get("CLICKUP_CHANNEL_ID", "")
 
+# Adaptive concurrency (AIMD) settings
+MAX_CONCURRENCY = int(os.environ.get("MAX_CONCURRENCY", "0"))  # 0 = fixed at concurrency_limit
+MIN_CONCURRENCY = int(os.environ.get("MIN_CONCURRENCY", "1"))
+LAUNCH_RATE = float(os.environ.get("LAUNCH_RATE", "0.5"))  # profile launches per second
+LAUNCH_BURST = int(os.environ.get("LAUNCH_BURST", "1"))
+
+
+async def fetch_active_accounts():
+    return await get_repository().active_accounts()
 
-async def process_account(account, stats, details_log):
+
+async def process_account(account, journal, prepared=None):
+    """
+    One account run, traced as a single span tree (including the pre-warm stage
+    when `prepared` came from the pipeline) that ends after the profile is stopped.
+    """
+    root = prepared.trace if prepared else tracing.start_span(
+        "get_balance", {"profile_id": account.get('adspower_user_id')}
+    )
+    root.set_attribute("account", account['username'])
+    outcome = "ERROR"
+    with tracing.activate(root):
+        try:
+            outcome = await _process_account(account, journal, prepared)
+            return outcome
+        finally:
+            root.end(outcome=outcome)
+
+async def _process_account(account, journal, prepared=None):
     username = account['username']
     adspower_id = account.get('adspower_user_id')
     
     if not adspower_id:
         logger.warning(f"Skipping {username}: No AdsPower ID.")
-        details_log.append(f"❌ {username}: Sem AdsPower ID")
-        stats['failed'] += 1
-        return False
+        journal.record(username, "failed", "ERROR", f"❌ {username}: Sem AdsPower ID")
+        return "ERROR"
 
     logger.info(f"========== Processing: {username} (ID: {adspower_id}) ==========")
+    journal.record(username, "running")
     
     # Fetch Friendly Name for Sheets
     profile_name = username # Default
-    try:
-        profile_name = await AdsPowerController.get_profile_name(adspower_id)
-    except: pass
+    if prepared:
+        profile_name = prepared.profile_name or username
+    else:
+        try:
+            profile_name = await AdsPowerController.get_profile_name(adspower_id)
+        except: pass
     
     try:
-        # Pass adspower_id and latam_password to get_balance logic
-        result = await get_balance(
-            username, 
-            account['password'], 
-            adspower_user_id=adspower_id,
-            latam_password=account.get('latam_password')
-        )
+        if prepared:
+            # Profile already started and attached by the pre-warm stage
+            result = await scrape_prepared(
+                prepared,
+                username,
+                account['password'],
+                latam_password=account.get('latam_password'),
+                phone=account.get('phone')
+            )
+        else:
+            # Pass adspower_id and latam_password to get_balance logic
+            result = await get_balance(
+                username, 
+                account['password'], 
+                adspower_user_id=adspower_id,
+                latam_password=account.get('latam_password'),
+                phone=account.get('phone')
+            )
         
         # Log results
         status_str = "SUCCESS" if result['status'] == 'success' else "FAILED"
@@ -66,9 +118,18 @@ async def process_account(account, stats, details_log):
         
         logger.info(f"RESULT {username}: Livelo={livelo_val}, LATAM={latam_val} - Status: {status_str}")
 
-        if result['status'] == 'success':
-            stats['success'] += 1
-            return True
+        outcome = classify_outcome(result)
+        await update_account_db_multi(
+            username,
+            result['status'],
+            livelo_val=result.get('livelo'),
+            latam_val=result.get('latam'),
+            outcome=outcome,
+            run_id=journal.run_id,
+        )
+        if outcome == "SUCCESS":
+            journal.record(username, "success", outcome)
+            return outcome
         else:
             msg = result.get('message', 'Erro desconhecido')
             screenshot = result.get('error_screenshot')
@@ -87,86 +148,424 @@ async def process_account(account, stats, details_log):
                 else:
                     fail_msg = f"❌ {username}: {msg} - Print: {fname}"
                 
-            details_log.append(fail_msg)
-            stats['failed'] += 1
-            return False
+            journal.record(username, "failed", outcome, fail_msg)
+            return outcome
             
     except Exception as e:
         logger.error(f"CRITICAL ERROR for {username}: {e}")
-        details_log.append(f"❌ {username}: Exception - {str(e)}")
-        stats['failed'] += 1
+        journal.record(username, "failed", "ERROR", f"❌ {username}: Exception - {str(e)}")
         
-        return False
+        return "ERROR"
         
     finally:
+        if prepared:
+            await prepared.close()
         logger.info(f"Closing AdsPower profile: {adspower_id}")
-        await AdsPowerController.stop_profile(adspower_id)
-        logger.info("Waiting 5s for cleanup...")
-        await asyncio.sleep(5)
+        with metrics.phase("stop_profile"):
+            await AdsPowerController.stop_profile(adspower_id)
+        # Release the slot as soon as AdsPower confirms the browser is gone (max 5s)
+        await AdsPowerController.wait_until_stopped(adspower_id, timeout=5)
+
+async def run_batch(concurrency_limit=1, max_concurrency=None, resume_run_id=None, only_failed_run_id=None,
+                    accounts=None, write_batch=None):
+    """
+    Processes all active accounts.
+    `concurrency_limit` is the starting window; with `max_concurrency` (or MAX_CONCURRENCY)
+    above it the window adapts (AIMD) between MIN_CONCURRENCY and that ceiling.
+    `resume_run_id` continues an interrupted run; `only_failed_run_id` re-runs just
+    the accounts that failed in that run (as a new run).
+    `accounts` and `write_batch` replace the Supabase account list and results sink
+    (benchmarks). Returns the BatchExecutor of the run (None if nothing ran).
+    """
+    metrics_server = await metrics.start_server()
+    try:
+        return await _run_batch(
+            concurrency_limit,
+            max_concurrency or MAX_CONCURRENCY or concurrency_limit,
+            resume_run_id,
+            only_failed_run_id,
+            accounts,
+            write_batch,
+        )
+    finally:
+        # Shared Playwright driver and pooled keep-alive connections (AdsPower, Skyvio, ClickUp)
+        await playwright_runtime.stop()
+        await http_pool.close_all()
+        await metrics.stop_server(metrics_server)
+        tracing.shutdown()
 
-async def run_batch(concurrency_limit=1):
+async def _run_batch(concurrency_limit, max_concurrency, resume_run_id, only_failed_run_id, accounts=None, write_batch=None):
     logger.info(">>> Starting Batch Processing Routine (Parallel) <<<")
     
     # 1. Fetch Active Accounts
+    if accounts is None:
+        try:
+            accounts = await fetch_active_accounts()
+        except Exception as e:
+            logger.error(f"Failed to fetch accounts: {e}")
+            return None
+
+    # Durable journal: resume / only-failed selection comes from previous runs
+    journal = RunJournal()
+    if resume_run_id:
+        pending = journal.pending_usernames(resume_run_id)
+        accounts = [acc for acc in accounts if acc['username'] in pending]
+        logger.info(f"Resuming run {resume_run_id}: {len(accounts)} account(s) left.")
+    elif only_failed_run_id:
+        failed = journal.failed_usernames(only_failed_run_id)
+        accounts = [acc for acc in accounts if acc['username'] in failed]
+        logger.info(f"Re-running {len(accounts)} failed account(s) from run {only_failed_run_id}.")
+    run_id = journal.start_run(accounts, run_id=resume_run_id, source_run_id=only_failed_run_id)
+    await journal.start()
+    logger.info(f"Run journal: {run_id} ({journal.path})")
+    screenshots.set_run_id(run_id)
+    await result_writer.start_default_writer(write_batch=write_batch)
+    await token_outbox.start_default_sender()
     try:
-        data = supabase.table("accounts")\
-            .select("*")\
-            .eq("status", "active")\
-            .order("updated_at")\
-            .execute()
-        
-        accounts = data.data
-    except Exception as e:
-        logger.error(f"Failed to fetch accounts: {e}")
-        return
+        return await _process_accounts(accounts, journal, concurrency_limit, max_concurrency)
+    finally:
+        # Final flush of buffered outcomes before the journal closes
+        await result_writer.stop_default_writer()
+        await token_outbox.stop_default_sender()
+        await screenshots.close()
+        await journal.close()
 
-    total = len(accounts)
-    logger.info(f"Found {total} active accounts. Concurrency limit: {concurrency_limit}")
-    
-    # Init Stats
-    stats = {"success": 0, "failed": 0}
-    details_log = []
+
+class BatchExecutor:
+    """
+    Shared state of one run (adaptive limiter, launch bucket, stage counters)
+    and its pipeline: pre-warm stage (startup) -> adaptive slots (scraping).
+    execute() runs a whole account list (run_batch); worker and scheduler modes
+    open() the pipeline once and submit() accounts as they arrive, so the
+    look-ahead and the slots stay busy across chunks instead of draining
+    after each one.
+    """
+
+    def __init__(self, journal, concurrency_limit, max_concurrency):
+        self.journal = journal
+        self.limiter = AdaptiveLimiter(
+            initial=concurrency_limit,
+            floor=min(MIN_CONCURRENCY, concurrency_limit),
+            ceiling=max_concurrency,
+        )
+        # Launch pacing happens in the pre-warm stage, outside the scraping slots
+        self.launch_bucket = TokenBucket(LAUNCH_RATE, burst=LAUNCH_BURST, jitter=1.0)
+        self.refreshed = 0
+        self.prepare_times = []
+        # End-to-end seconds per browser account (startup included)
+        self.account_seconds = []
+        self.lookahead = None
+        # Process-wide report counters frozen by rollover() (None: read them live)
+        self.run_stats = None
+        # Submitted accounts that have not taken a scraping slot yet
+        self.queued = 0
+        self.outstanding = 0
+        self._prewarmer = None
+        self._feeder = None
+        self._tasks = set()
+        self._callbacks = {}
+        self._dropped = set()
+        self._progress = asyncio.Event()
+        # Read at scrape time only
+        metrics.CONCURRENCY_LIMIT.set_function(lambda: self.limiter.limit)
+        metrics.IN_FLIGHT.set_function(lambda: self.limiter.in_flight)
+        metrics.QUEUE_DEPTH.set_function(lambda: self.queued)
+
+    async def execute(self, accounts, on_finished=None):
+        """
+        Runs the fast path and the browser pipeline for `accounts`.
+        `on_finished(account, outcome)` is awaited after each account completes.
+        """
+        self.open()
+        try:
+            await self.submit(accounts, on_finished)
+            await self.drain()
+        finally:
+            await self.close()
+
+    def open(self):
+        """
+        Starts the pipeline; accounts are fed with submit() until close().
+        """
+        if self._prewarmer:
+            return
+        self._prewarmer = ProfilePrewarmer(
+            launch_bucket=self.launch_bucket, skip=lambda acc: acc['username'] in self._dropped
+        )
+        self.lookahead = self._prewarmer.lookahead
+        logger.info(f"Pre-warm look-ahead: {self.lookahead} profile(s)")
+        self._prewarmer.start()
+        self._feeder = asyncio.create_task(self._feed_slots())
+
+    async def submit(self, accounts, on_finished=None, journal=None):
+        """
+        Hands `accounts` to the running pipeline: the browserless fast path runs
+        here, the rest joins the pre-warm queue. Returns once they are queued;
+        `on_finished(account, outcome)` is awaited as each one completes.
+        Their results go to `journal` (default: the executor's).
+        """
+        journal = journal or self.journal
+        self.outstanding += len(accounts)
+        self.queued += len(accounts)
+        for acc in accounts:
+            self._callbacks[acc['username']] = (on_finished, journal)
+
+        # 2. Browserless fast path: refresh_token exchange over plain HTTP
+        refreshed = await refresh_tokens_fast_path(accounts)
+        self.refreshed += len(refreshed)
+        runnable = []
+        for acc in accounts:
+            if acc['username'] in refreshed:
+                journal.record(acc['username'], "success", "REFRESHED")
+                await update_account_db_multi(acc['username'], "success", outcome="REFRESHED", run_id=journal.run_id)
+                self.queued -= 1
+                await self._finished(acc, "REFRESHED")
+            elif not acc.get('adspower_user_id'):
+                self.queued -= 1
+                await self._finished(acc, await process_account(acc, journal))
+            else:
+                runnable.append(acc)
+
+        # 3. Pipeline: pre-warm stage (startup) -> adaptive slots (scraping)
+        self._prewarmer.add(runnable)
+
+    def drop(self, usernames):
+        """
+        Accounts that must not run here anymore (lease taken by another node):
+        the ones not started yet are skipped, running ones are left to finish.
+        """
+        self._dropped.update(usernames)
+
+    async def wait_progress(self, timeout=None):
+        """
+        Waits until an account takes a slot or finishes (or `timeout` seconds).
+        """
+        self._progress.clear()
+        try:
+            await asyncio.wait_for(self._progress.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def drain(self):
+        """
+        Waits for every submitted account to finish.
+        """
+        while self.outstanding:
+            await self.wait_progress()
+
+    async def close(self):
+        """
+        Waits for the running accounts, then stops the pipeline (profiles that
+        were pre-warmed but never used are stopped).
+        """
+        if not self._prewarmer:
+            return
+        await self.drain()
+        self._feeder.cancel()
+        await asyncio.gather(self._feeder, return_exceptions=True)
+        await self._prewarmer.close()
+        self._prewarmer = None
+        self._feeder = None
+
+    async def rollover(self, journal):
+        """
+        Starts a new reporting period on the same pipeline (agendador, once a
+        day): returns a copy holding the counters of the period that ends (the
+        process-wide ones of the report included), for send_report(), and
+        starts them all over with `journal`.
+        """
+        period = copy.copy(self)
+        period.run_stats = await collect_run_stats()
+        reset_run_stats()
+        self.journal = journal
+        self.refreshed = 0
+        self.prepare_times = []
+        self.account_seconds = []
+        return period
+
+    def _journal_of(self, acc):
+        return self._callbacks.get(acc['username'], (None, self.journal))[1]
+
+    async def _finished(self, acc, outcome):
+        metrics.ACCOUNT_OUTCOMES.inc(outcome=outcome)
+        on_finished, _ = self._callbacks.pop(acc['username'], (None, None))
+        self._dropped.discard(acc['username'])
+        try:
+            if on_finished:
+                await on_finished(acc, outcome)
+        finally:
+            self.outstanding -= 1
+            self._progress.set()
+
+    async def _feed_slots(self):
+        while True:
+            # Slot taken only once a profile is ready: the launch stagger runs outside it
+            acc, prepared = await self._prewarmer.get(acquire_slot=self.limiter.acquire)
+            self.queued -= 1
+            self._progress.set()
+            if prepared is None:
+                logger.info(f"Skipping {acc['username']}: dropped before it started.")
+                self._journal_of(acc).record(acc['username'], "skipped", "DROPPED")
+                await self._finished(acc, "DROPPED")
+                continue
+            task = asyncio.create_task(self._run_prepared(acc, prepared))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_prepared(self, acc, prepared):
+        self.prepare_times.append(prepared.prepare_seconds)
+        outcome = "ERROR"
+        started = time.monotonic()
+        try:
+            outcome = await process_account(acc, self._journal_of(acc), prepared=prepared)
+            return outcome
+        finally:
+            elapsed = time.monotonic() - started
+            self.account_seconds.append(elapsed + prepared.prepare_seconds)
+            metrics.ACCOUNT_SECONDS.observe(elapsed + prepared.prepare_seconds, outcome=outcome)
+            await self.limiter.release(outcome, elapsed)
+            await self._finished(acc, outcome)
+
+
+async def _process_accounts(accounts, journal, concurrency_limit, max_concurrency):
+    executor = BatchExecutor(journal, concurrency_limit, max_concurrency)
+    limiter = executor.limiter
+    logger.info(
+        f"Found {len(accounts)} active accounts. Concurrency window: {limiter.limit} "
+        f"(floor {limiter.floor}, ceiling {limiter.ceiling}), launch rate {LAUNCH_RATE}/s"
+    )
     
-    import time
     start_time = time.time()
-    
-    # 2. Parallel Processing with Semaphore
-    semaphore = asyncio.Semaphore(concurrency_limit)
+    await executor.execute(accounts)
+    await send_report(executor, time.time() - start_time)
+    return executor
 
-    async def sem_process_account(acc):
-        async with semaphore:
-            # Small staggered start to avoid API/CPU spikes
-            await asyncio.sleep(random.uniform(1, 3))
-            return await process_account(acc, stats, details_log)
 
-    tasks = [sem_process_account(acc) for acc in accounts]
-    
-    # Run all tasks concurrently
-    await asyncio.gather(*tasks)
+async def collect_run_stats():
+    """
+    Process-wide counters shown in the run report (driver, page checks,
+    deliveries, resource blocking, bandwidth, HTTP pools).
+    """
+    sender = token_outbox.default_sender
+    return {
+        "playwright": playwright_runtime.stats(),
+        "page_checks": page_check_stats(),
+        "delivery": await asyncio.to_thread(sender.summary) if sender else None,
+        "blocking": resource_blocking.totals(),
+        "bandwidth": bandwidth.totals(),
+        "pool_lines": http_pool.format_pool_stats(),
+    }
+
+
+def reset_run_stats():
+    """
+    Starts the counters of collect_run_stats() over (each daily report of the agendador).
+    """
+    playwright_runtime.reset_stats()
+    reset_page_check_stats()
+    if token_outbox.default_sender:
+        token_outbox.default_sender.reset_stats()
+    resource_blocking.reset()
+    bandwidth.reset()
+    http_pool.reset_pool_stats()
 
-    end_time = time.time()
-    duration = end_time - start_time
+
+async def send_report(executor, duration, title="🤖 **Relatório Diário de Execução (Paralelo)**", extra_lines=None):
+    journal = executor.journal
+    limiter = executor.limiter
+    run_stats = executor.run_stats or await collect_run_stats()
     duration_str = f"{int(duration // 60)}m {int(duration % 60)}s"
 
-    # 3. Report Generation
+    # 4. Report Generation (from the journal, so resumed runs report the whole run)
+    await journal.flush()
+    summary = journal.summary()
+
     from datetime import datetime
     date_str = datetime.now().strftime("%d/%m/%Y")
     
     report_lines = []
-    report_lines.append("🤖 **Relatório Diário de Execução (Paralelo)**")
+    report_lines.append(title)
     report_lines.append(f"📅 {date_str}")
     report_lines.append("")
     report_lines.append("📊 **Resumo:**")
     report_lines.append(f"⏱️ Tempo Total: {duration_str}")
-    report_lines.append(f"👥 Contas Analisadas: {total}")
-    report_lines.append(f"✅ Sucesso Total: {stats['success']}")
-    report_lines.append(f"❌ Falhas Finais: {stats['failed']}")
+    report_lines.append(f"👥 Contas Analisadas: {summary['total']}")
+    report_lines.append(f"✅ Sucesso Total: {summary['success']}")
+    report_lines.append(f"❌ Falhas Finais: {summary['failed']}")
+    if summary['pending']:
+        report_lines.append(f"⏸️ Pendentes (retomar com --resume {journal.run_id}): {summary['pending']}")
+    if summary['skipped']:
+        report_lines.append(f"↪️ Repassadas a outro nó (lease perdido): {summary['skipped']}")
+    report_lines.append(f"⚡ Renovadas sem navegador: {executor.refreshed}")
+    conc = limiter.summary()
+    report_lines.append(
+        f"🎚️ Concorrência: inicial {conc['initial']}, final {conc['current']}, pico {conc['peak']} "
+        f"(piso {conc['floor']}, teto {conc['ceiling']}, {conc['changes']} ajustes)"
+    )
+    if executor.prepare_times:
+        avg_prepare = sum(executor.prepare_times) / len(executor.prepare_times)
+        report_lines.append(
+            f"🔥 Pré-aquecimento: {len(executor.prepare_times)} perfis (look-ahead {executor.lookahead}), "
+            f"inicialização média {avg_prepare:.1f}s fora do caminho crítico"
+        )
+
+    pw = run_stats["playwright"]
+    report_lines.append(
+        f"🎭 Driver Playwright: {pw['driver_starts']} início(s) em {pw['driver_startup_seconds']}s "
+        f"para {pw['attachments']} conexões CDP (antes, estimado: ~{pw['per_account_startup_seconds_estimated']}s, um por conta)"
+    )
+
+    checks = run_stats["page_checks"]
+    if checks['checks']:
+        report_lines.append(
+            f"🔎 Detecção WAF/página: {checks['checks']} verificações ({checks['header_hits']} só por cabeçalho), "
+            f"~{checks['avoided_per_account'] // 1024} KB de HTML por conta não trafegados via CDP"
+        )
+
+    delivery = run_stats["delivery"]
+    if delivery:
+        report_lines.append(
+            f"📬 Entrega Skyvio: {delivery['delivered']} entregues, {delivery['unchanged']} sem mudança (não reenviados), "
+            f"{delivery['retries']} novas tentativas, {delivery['failed']} desistidas, {delivery['pending']} na fila"
+        )
+
+    blocked = run_stats["blocking"]
+    if blocked['accounts']:
+        report_lines.append(
+            f"🚧 Bloqueio de recursos ({resource_blocking.RESOURCE_BLOCKING}): {blocked['blocked']} requisições evitadas "
+            f"de {blocked['blocked'] + blocked['allowed']}, ~{blocked['bytes_saved_per_account'] // 1024} KB por conta (estimado)"
+        )
+
+    traffic = run_stats["bandwidth"]
+    if traffic['accounts']:
+        mb = 1024 * 1024
+        report_lines.append(
+            f"📶 Banda (proxy): {traffic['bytes'] / mb:.1f} MB em {traffic['accounts']} contas, "
+            f"média {traffic['bytes'] / traffic['accounts'] / mb:.2f} MB por conta"
+        )
+        report_lines.append("   Contas que mais consomem: " + ", ".join(f"{u} {b / mb:.1f} MB" for u, b in bandwidth.top("by_account", totals=traffic)))
+        report_lines.append("   Domínios que mais consomem: " + ", ".join(f"{h} {b / mb:.1f} MB" for h, b in bandwidth.top("by_domain", totals=traffic)))
+        report_lines.append(
+            f"   Sessões de proxy que mais consomem ({len(traffic['by_session'])} sessões): "
+            + ", ".join(f"{s} {b / mb:.1f} MB" for s, b in bandwidth.top("by_session", totals=traffic))
+        )
+        for proxy, size in bandwidth.top("by_proxy", totals=traffic):
+            logger.info(f"Proxy bandwidth: {proxy} {size / mb:.1f} MB")
+        for resource_type, size in bandwidth.top("by_type", n=10, totals=traffic):
+            logger.info(f"Bandwidth by resource type: {resource_type} {size / mb:.1f} MB")
+
+    # HTTP pool usage (helps sizing HTTP_POOL_* settings)
+    pool_lines = run_stats["pool_lines"]
+    for line in pool_lines:
+        logger.info(f"HTTP pool: {line}")
     
+    report_lines.extend(extra_lines or [])
+
     report_lines.append("")
     report_lines.append("📝 **Detalhamento de Problemas:**")
-    if details_log:
+    if summary['details']:
         # Sort details alphabetically by username for better readability since they finish at different times
-        sorted_details = sorted(details_log)
+        sorted_details = sorted(summary['details'])
         for line in sorted_details:
             report_lines.append(line)
     else:
@@ -187,7 +586,31 @@ async def run_batch(concurrency_limit=1):
         logger.warning("CLICKUP_CHANNEL_ID not set. Report sent only to console.")
 
 if __name__ == "__main__":
-    if not url or not key:
-        logger.error("Supabase credentials missing.")
+    import argparse
+    parser = argparse.ArgumentParser(description="Livelo batch runner")
+    parser.add_argument("--concurrency", type=int, default=1, help="Initial concurrency window")
+    parser.add_argument("--resume", nargs="?", const="latest", metavar="RUN_ID", help="Resume an interrupted run (default: latest)")
+    parser.add_argument("--only-failed", nargs="?", const="latest", metavar="RUN_ID", help="Re-run only failed accounts of a run (default: latest)")
+    args = parser.parse_args()
+
+    try:
+        get_repository()
+    except Exception as e:
+        logger.error(f"Data backend unavailable: {e}")
         exit(1)
-    asyncio.run(run_batch())
+
+    resume_run_id = args.resume
+    only_failed_run_id = args.only_failed
+    if "latest" in (resume_run_id, only_failed_run_id):
+        latest = RunJournal().latest_run_id()
+        if not latest:
+            logger.error("No previous run found in the journal.")
+            exit(1)
+        resume_run_id = latest if resume_run_id == "latest" else resume_run_id
+        only_failed_run_id = latest if only_failed_run_id == "latest" else only_failed_run_id
+
+    asyncio.run(run_batch(
+        concurrency_limit=args.concurrency,
+        resume_run_id=resume_run_id,
+        only_failed_run_id=only_failed_run_id,
+    ))
@@ -0,0 +1,285 @@
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# End-to-end throughput benchmark of the batch orchestrator.
+# Runs run_batch() against local stand-ins (src/fake_adspower.py backed by headless
+# Chromium, src/fake_livelo.py) at several concurrency levels and reports
+# accounts/minute, p50/p95 per-account latency and peak RSS.
+#
+#   pip install -r requirements.txt && playwright install --with-deps chromium
+#   python src/benchmark.py --accounts 20 --max-concurrency 4
+
+
+def serve_stand_ins(adspower_port, livelo_port, options):
+    """
+    Child process: both fake servers on one event loop, so the Chromium
+    processes (and their memory) are not children of the orchestrator.
+    """
+    import uvicorn
+    from src import fake_adspower, fake_livelo
+
+    adspower_app = fake_adspower.create_app(
+        fake_adspower.chromium_executable(),
+        api_latency=options["api_latency"],
+        start_latency=options["start_latency"],
+        start_failure_rate=options["start_failure_rate"],
+        update_failure_rate=options["update_failure_rate"],
+    )
+    livelo_app = fake_livelo.create_app(
+        waf_rate=options["waf_rate"],
+        reset_rate=options["reset_rate"],
+        auth_fail_rate=options["auth_fail_rate"],
+        latency=options["site_latency"],
+    )
+    servers = [
+        uvicorn.Server(uvicorn.Config(adspower_app, host="127.0.0.1", port=adspower_port, log_level="warning")),
+        uvicorn.Server(uvicorn.Config(livelo_app, host="127.0.0.1", port=livelo_port, log_level="warning")),
+    ]
+
+    async def main():
+        await asyncio.gather(*(server.serve() for server in servers))
+
+    asyncio.run(main())
+
+
+def _rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def _descendants(root_pid):
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; the ppid follows the closing paren
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    found, stack = [], [root_pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+
+class RssSampler:
+    """
+    Peak RSS of the orchestrator and of the browsers started by the stand-in.
+    """
+
+    def __init__(self, browsers_root_pid, interval=0.5):
+        self.browsers_root_pid = browsers_root_pid
+        self.interval = interval
+        self.peak_orchestrator_mb = 0.0
+        self.peak_browsers_mb = 0.0
+        self._task = None
+
+    async def _run(self):
+        while True:
+            self.peak_orchestrator_mb = max(self.peak_orchestrator_mb, _rss_mb(os.getpid()))
+            browsers = sum(_rss_mb(pid) for pid in _descendants(self.browsers_root_pid))
+            self.peak_browsers_mb = max(self.peak_browsers_mb, browsers)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+async def wait_for_port(port, timeout=30):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return True
+        except OSError:
+            await asyncio.sleep(0.2)
+    return False
+
+
+async def measure_driver_startup(samples):
+    """
+    Seconds per Playwright driver start+stop, the cost the old path paid on every
+    account (a fresh async_playwright() per get_balance).
+    """
+    from playwright.async_api import async_playwright
+
+    durations = []
+    for _ in range(samples):
+        started = time.monotonic()
+        playwright = await async_playwright().start()
+        await playwright.stop()
+        durations.append(time.monotonic() - started)
+    return statistics.mean(durations) if durations else 0.0
+
+
+async def run_levels(args, stand_in_pid):
+    from src import batch_runner
+    from src.playwright_runtime import runtime as playwright_runtime
+
+    per_account_driver = await measure_driver_startup(args.driver_samples)
+    print(f"Playwright driver start+stop (old per-account path): {per_account_driver:.2f}s measured over {args.driver_samples} sample(s)")
+
+    accounts = [
+        {"username": f"{i:011d}", "password": "bench-password", "adspower_user_id": f"bench{i:04d}"}
+        for i in range(args.accounts)
+    ]
+    results = []
+    for concurrency in args.levels:
+        rows = []
+        sampler = RssSampler(stand_in_pid)
+        sampler.start()
+        driver_before = playwright_runtime.stats()["driver_startup_seconds"]
+        started = time.monotonic()
+        executor = await batch_runner.run_batch(
+            concurrency_limit=concurrency,
+            max_concurrency=concurrency,
+            accounts=accounts,
+            write_batch=rows.extend,
+        )
+        duration = time.monotonic() - started
+        await sampler.stop()
+
+        outcomes = {}
+        for row in rows:
+            outcomes[row["outcome"]] = outcomes.get(row["outcome"], 0) + 1
+        latencies = sorted(executor.account_seconds) if executor else []
+        result = {
+            "concurrency": concurrency,
+            "accounts": len(accounts),
+            "seconds": round(duration, 1),
+            "accounts_per_minute": round(len(accounts) / duration * 60, 2),
+            "p50_seconds": round(percentile(latencies, 50), 2) if latencies else None,
+            "p95_seconds": round(percentile(latencies, 95), 2) if latencies else None,
+            "peak_rss_orchestrator_mb": round(sampler.peak_orchestrator_mb, 1),
+            "peak_rss_browsers_mb": round(sampler.peak_browsers_mb, 1),
+            "outcomes": outcomes,
+            # Driver startup per run: measured old path (one per account) vs the shared driver
+            "driver_startup_seconds_old_path": round(per_account_driver * len(accounts), 2),
+            "driver_startup_seconds_shared": round(playwright_runtime.stats()["driver_startup_seconds"] - driver_before, 2),
+        }
+        results.append(result)
+        print(
+            f"c={concurrency:<3} {result['accounts_per_minute']:>7} acc/min  "
+            f"p50 {result['p50_seconds']}s  p95 {result['p95_seconds']}s  "
+            f"RSS {result['peak_rss_orchestrator_mb']}MB + browsers {result['peak_rss_browsers_mb']}MB  "
+            f"driver {result['driver_startup_seconds_shared']}s (old path {result['driver_startup_seconds_old_path']}s)  {outcomes}",
+            flush=True,
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch throughput benchmark against local AdsPower/Livelo stand-ins")
+    parser.add_argument("--accounts", type=int, default=20)
+    parser.add_argument("--max-concurrency", type=int, default=4, help="Runs concurrency 1..N")
+    parser.add_argument("--levels", help="Explicit comma-separated concurrency levels (overrides --max-concurrency)")
+    parser.add_argument("--launch-rate", type=float, default=5.0, help="LAUNCH_RATE for the run (profiles/s)")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="Fake AdsPower API latency (s)")
+    parser.add_argument("--start-latency", type=float, default=0.5, help="Extra fake browser/start latency (s)")
+    parser.add_argument("--start-failure-rate", type=float, default=0.0)
+    parser.add_argument("--update-failure-rate", type=float, default=0.0)
+    parser.add_argument("--site-latency", type=float, default=0.0, help="Fake Livelo response latency (s)")
+    parser.add_argument("--waf-rate", type=float, default=0.05)
+    parser.add_argument("--reset-rate", type=float, default=0.05)
+    parser.add_argument("--auth-fail-rate", type=float, default=0.05)
+    parser.add_argument("--adspower-port", type=int, default=50399)
+    parser.add_argument("--livelo-port", type=int, default=8799)
+    parser.add_argument("--driver-samples", type=int, default=5, help="Fresh Playwright driver starts timed for the old-path figure")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this file")
+    args = parser.parse_args()
+    args.levels = [int(c) for c in args.levels.split(",")] if args.levels else list(range(1, args.max_concurrency + 1))
+    json_path = os.path.abspath(args.json_path) if args.json_path else None
+
+    # Everything the orchestrator reads at import time points at the stand-ins / a scratch dir
+    work_dir = tempfile.mkdtemp(prefix="umx-bench-")
+    livelo = f"http://127.0.0.1:{args.livelo_port}"
+    os.environ.update({
+        "ADSPOWER_API_URL": f"http://127.0.0.1:{args.adspower_port}",
+        "LIVELO_HOME_URL": f"{livelo}/",
+        "LIVELO_LOGIN_HOST": f"127.0.0.1:{args.livelo_port}/acesso",
+        "LIVELO_DOMAIN": "127.0.0.1",
+        "SKYVIO_TOKENS_URL": f"{livelo}/api/livelo/tokens/receive/",
+        "LIVELO_TOKEN_URL": "",
+        "RUN_JOURNAL_PATH": os.path.join(work_dir, "run_journal.db"),
+        "TOKEN_STORE_PATH": os.path.join(work_dir, "tokens.db"),
+        "TOKEN_OUTBOX_PATH": os.path.join(work_dir, "token_outbox.db"),
+        "DATA_BACKEND": "sqlite",
+        "DATA_SQLITE_PATH": os.path.join(work_dir, "local.db"),
+        "LAUNCH_RATE": str(args.launch_rate),
+        "LAUNCH_BURST": "1",
+        "MAX_CONCURRENCY": "0",
+        "METRICS_PORT": "0",
+        "CLICKUP_CHANNEL_ID": "",
+    })
+    if not os.environ.get("ENCRYPTION_KEY"):
+        from cryptography.fernet import Fernet
+        os.environ["ENCRYPTION_KEY"] = Fernet.generate_key().decode()
+    # Screenshots of failed accounts land in the scratch dir too
+    os.chdir(work_dir)
+
+    options = {k: getattr(args, k) for k in (
+        "api_latency", "start_latency", "start_failure_rate", "update_failure_rate",
+        "site_latency", "waf_rate", "reset_rate", "auth_fail_rate",
+    )}
+    stand_in = multiprocessing.Process(
+        target=serve_stand_ins, args=(args.adspower_port, args.livelo_port, options), name="stand-ins", daemon=True
+    )
+    stand_in.start()
+
+    async def run():
+        for port in (args.adspower_port, args.livelo_port):
+            if not await wait_for_port(port):
+                raise RuntimeError(f"Stand-in on port {port} did not come up")
+        return await run_levels(args, stand_in.pid)
+
+    try:
+        print(f"=== Batch benchmark: {args.accounts} accounts, concurrency {args.levels} (work dir {work_dir}) ===")
+        results = asyncio.run(run())
+    finally:
+        stand_in.terminate()
+        stand_in.join(10)
+
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -1,7 +1,7 @@
 
-import httpx
 import logging
 import os
+from src import http_pool
 
 logger = logging.getLogger(__name__)
 
@@ -33,14 +33,14 @@ async def send_message(list_id, message_text):
     }
     
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(url, json=payload, headers=headers)
-            if resp.status_code == 200:
-                logger.info("ClickUp message sent successfully.")
-                return True
-            else:
-                logger.error(f"ClickUp Message Error: {resp.status_code} - {resp.text}")
-                return False
+        client = http_pool.get_client(url)
+        resp = await client.post(url, json=payload, headers=headers)
+        if resp.status_code == 200:
+            logger.info("ClickUp message sent successfully.")
+            return True
+        else:
+            logger.error(f"ClickUp Message Error: {resp.status_code} - {resp.text}")
+            return False
     except Exception as e:
         logger.error(f"ClickUp Message Exception: {e}")
         return False
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import os
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+# Outcomes that mean "slow down": the WAF noticed us or AdsPower/host is struggling
+BACKOFF_OUTCOMES = {"WAF_BLOCK", "PROFILE_START_FAILED"}
+
+
+def host_saturated(max_load_per_cpu=None):
+    """
+    True when the 1-minute load average per CPU is above the threshold.
+    Always False where load average is not available (Windows).
+    """
+    if max_load_per_cpu is None:
+        max_load_per_cpu = float(os.environ.get("MAX_LOAD_PER_CPU", "1.5"))
+    try:
+        load1 = os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return False
+    return load1 / (os.cpu_count() or 1) > max_load_per_cpu
+
+
+class TokenBucket:
+    """
+    Launch-rate limiter: at most `rate` launches per second with bursts up to `burst`.
+    Taken right before a profile is launched, so spacing launches never holds a slot
+    for longer than the rate actually requires.
+    """
+
+    def __init__(self, rate, burst=1, jitter=0.0):
+        self.rate = rate
+        self.burst = burst
+        self.jitter = jitter
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def take(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    break
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+        if self.jitter:
+            # Small human-like spread between launches
+            await asyncio.sleep(random.uniform(0, self.jitter))
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency window.
+    - Additive increase: +1 slot after a full window of healthy completions
+      (success rate above `min_success_rate`, latency within `latency_tolerance`
+      of the best observed EWMA, host not saturated).
+    - Multiplicative decrease: window * `backoff_factor` on WAF blocks, AdsPower
+      start failures or host saturation, at most once per `cooldown` seconds.
+    """
+
+    def __init__(self, initial=1, floor=1, ceiling=None, backoff_factor=0.5,
+                 min_success_rate=0.8, latency_tolerance=1.5, cooldown=60.0):
+        self.floor = max(1, floor)
+        self.ceiling = max(self.floor, ceiling or initial)
+        self.limit = min(max(initial, self.floor), self.ceiling)
+        self.initial = self.limit
+        self.backoff_factor = backoff_factor
+        self.min_success_rate = min_success_rate
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+
+        self.in_flight = 0
+        self.peak = self.limit
+        self.history = []  # (elapsed seconds, new limit, reason)
+        self._cond = asyncio.Condition()
+        self._window_results = []
+        self._latency_ewma = None
+        self._latency_best = None
+        self._last_backoff = 0.0
+        self._started = time.monotonic()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self, outcome, latency=None):
+        async with self._cond:
+            self.in_flight -= 1
+            self._record(outcome, latency)
+            self._cond.notify_all()
+
+    def _record(self, outcome, latency):
+        if latency is not None and outcome == "SUCCESS":
+            self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+            self._latency_best = self._latency_ewma if self._latency_best is None else min(self._latency_best, self._latency_ewma)
+
+        if outcome in BACKOFF_OUTCOMES:
+            self._decrease(outcome)
+            return
+        if host_saturated():
+            self._decrease("HOST_SATURATED")
+            return
+
+        self._window_results.append(outcome == "SUCCESS")
+        if len(self._window_results) < self.limit:
+            return
+
+        success_rate = sum(self._window_results) / len(self._window_results)
+        self._window_results = []
+        latency_ok = (
+            self._latency_best is None
+            or self._latency_ewma <= self._latency_best * self.latency_tolerance
+        )
+        if success_rate >= self.min_success_rate and latency_ok and self.limit < self.ceiling:
+            self._set_limit(self.limit + 1, f"saudável ({success_rate:.0%} sucesso)")
+
+    def _decrease(self, reason):
+        now = time.monotonic()
+        self._window_results = []
+        if now - self._last_backoff < self.cooldown:
+            return
+        self._last_backoff = now
+        new_limit = max(self.floor, int(self.limit * self.backoff_factor))
+        if new_limit != self.limit:
+            self._set_limit(new_limit, reason)
+
+    def _set_limit(self, new_limit, reason):
+        logger.info(f"Concurrency window {self.limit} -> {new_limit} ({reason})")
+        self.limit = new_limit
+        self.peak = max(self.peak, new_limit)
+        self.history.append((round(time.monotonic() - self._started), new_limit, reason))
+
+    def summary(self):
+        return {
+            "initial": self.initial,
+            "floor": self.floor,
+            "ceiling": self.ceiling,
+            "current": self.limit,
+            "peak": self.peak,
+            "changes": len(self.history),
+        }
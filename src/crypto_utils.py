@@ -1,16 +1,50 @@
+import hashlib
+import hmac
 import os
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Get key from environment
-ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY")
+# Get keys from environment. During a rotation ENCRYPTION_KEYS lists the new
+# key first and the old ones after it: new values use the first key, existing
+# values decrypt with any of them (src/rotate_keys.py re-encrypts the accounts).
+ENCRYPTION_KEYS = [k.strip() for k in os.getenv("ENCRYPTION_KEYS", "").split(",") if k.strip()]
+ENCRYPTION_KEY = ENCRYPTION_KEYS[0] if ENCRYPTION_KEYS else os.getenv("ENCRYPTION_KEY")
+if not ENCRYPTION_KEYS and ENCRYPTION_KEY:
+    ENCRYPTION_KEYS = [ENCRYPTION_KEY]
+# Secret of the import fingerprints. Kept apart from the encryption keys so a
+# rotation does not make every stored fingerprint look changed. Fingerprints
+# keyed by any of the encryption keys (the default when unset) still match.
+IMPORT_FINGERPRINT_KEY = os.getenv("IMPORT_FINGERPRINT_KEY")
+
+_fernet = None
+_primary_fernet = None
+_fingerprint_keys = None
+
+
+class DecryptionError(ValueError):
+    """Value is not a token of any configured key (wrong key, plain text or corrupted)."""
+
 
 def get_fernet():
-    if not ENCRYPTION_KEY:
-        raise ValueError("ENCRYPTION_KEY not found in .env file.")
-    return Fernet(ENCRYPTION_KEY.encode())
+    # Built once per process (key parsing is not free when called per value)
+    global _fernet
+    if _fernet is None:
+        if not ENCRYPTION_KEYS:
+            raise ValueError("ENCRYPTION_KEY not found in .env file.")
+        fernets = [Fernet(k.encode()) for k in ENCRYPTION_KEYS]
+        _fernet = MultiFernet(fernets) if len(fernets) > 1 else fernets[0]
+    return _fernet
+
+def get_primary_fernet():
+    """Cipher of the current key only (tells rotated values from old ones)."""
+    global _primary_fernet
+    if _primary_fernet is None:
+        if not ENCRYPTION_KEYS:
+            raise ValueError("ENCRYPTION_KEY not found in .env file.")
+        _primary_fernet = Fernet(ENCRYPTION_KEYS[0].encode())
+    return _primary_fernet
 
 def encrypt_password(password: str) -> str:
     """Encrypts a plain text password to a base64 string."""
@@ -26,7 +60,54 @@ def decrypt_password(encrypted_password: str) -> str:
     f = get_fernet()
     try:
         return f.decrypt(encrypted_password.encode()).decode()
-    except Exception:
-        # If it's already plain text or corrupted, returning as is (for migration safety)
-        # However, for production we should probably log an error
-        return encrypted_password
+    except InvalidToken:
+        # Never hand the ciphertext back as if it were the password
+        raise DecryptionError("Value cannot be decrypted with the configured ENCRYPTION_KEYS") from None
+
+def encrypt_many(values):
+    """Encrypts a list of values (None/empty stay None); used as a process-pool task."""
+    return [encrypt_password(v) for v in values]
+
+def rotate_many(values):
+    """
+    Re-encrypts a list of values with the current key; used as a process-pool task.
+    Each result is None (empty or already on the current key), the new token,
+    or a DecryptionError when no configured key opens the value.
+    """
+    current, every = get_primary_fernet(), get_fernet()
+    results = []
+    for value in values:
+        if not value:
+            results.append(None)
+            continue
+        token = value.encode()
+        try:
+            current.decrypt(token)
+            results.append(None)
+            continue
+        except InvalidToken:
+            pass
+        try:
+            results.append(current.encrypt(every.decrypt(token)).decode())
+        except InvalidToken:
+            results.append(DecryptionError("Value cannot be decrypted with the configured ENCRYPTION_KEYS"))
+    return results
+
+def _get_fingerprint_keys():
+    global _fingerprint_keys
+    if _fingerprint_keys is None:
+        secrets = ([IMPORT_FINGERPRINT_KEY] if IMPORT_FINGERPRINT_KEY else []) + ENCRYPTION_KEYS
+        if not secrets:
+            raise ValueError("ENCRYPTION_KEY not found in .env file.")
+        _fingerprint_keys = [hashlib.sha256(b"fingerprint:" + s.encode()).digest() for s in secrets]
+    return _fingerprint_keys
+
+def fingerprints(*values) -> list:
+    """
+    Keyed digests (HMAC-SHA256) of plain values, used to detect unchanged rows
+    without decrypting; without the key they cannot be used to guess the
+    passwords behind them. The first one is current, the others (one per
+    encryption key) only match values stored before a key change.
+    """
+    message = "\x1f".join("" if v is None else str(v) for v in values).encode()
+    return [hmac.new(key, message, hashlib.sha256).hexdigest() for key in _get_fingerprint_keys()]
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import os
+import random
+import shutil
+import tempfile
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+
+logger = logging.getLogger(__name__)
+
+# Local stand-in for the AdsPower local API used by src/benchmark.py.
+# browser/start launches a real headless Chromium with remote debugging, so the
+# scraper attaches over CDP exactly as it does with AdsPower.
+
+CHROMIUM_ARGS = [
+    "--headless=new",
+    "--remote-debugging-port=0",
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--disable-dev-shm-usage",
+    "--no-sandbox",
+    "--window-size=1920,1080",
+]
+
+
+def chromium_executable():
+    """
+    CHROMIUM_PATH, or the Chromium installed by `playwright install chromium`.
+    """
+    if os.environ.get("CHROMIUM_PATH"):
+        return os.environ["CHROMIUM_PATH"]
+    from playwright.sync_api import sync_playwright
+    with sync_playwright() as p:
+        return p.chromium.executable_path
+
+
+async def _read_devtools_endpoint(user_data_dir, proc, timeout=20):
+    """
+    Chromium writes "<port>\\n<browser path>" to DevToolsActivePort once CDP is listening.
+    """
+    path = os.path.join(user_data_dir, "DevToolsActivePort")
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        if proc.returncode is not None:
+            return None
+        try:
+            with open(path) as f:
+                lines = f.read().split()
+            if len(lines) >= 2:
+                return f"ws://127.0.0.1:{lines[0]}{lines[1]}"
+        except OSError:
+            pass
+        await asyncio.sleep(0.05)
+    return None
+
+
+def create_app(executable, api_latency=0.0, start_latency=0.0, start_failure_rate=0.0, update_failure_rate=0.0):
+    browsers = {}  # user_id -> (process, user_data_dir)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        for user_id in list(browsers):
+            await stop_browser(user_id)
+
+    app = FastAPI(lifespan=lifespan)
+
+    async def delay(seconds):
+        if seconds:
+            await asyncio.sleep(seconds * random.uniform(0.5, 1.5))
+
+    async def stop_browser(user_id):
+        entry = browsers.pop(user_id, None)
+        if not entry:
+            return
+        proc, user_data_dir = entry
+        if proc.returncode is None:
+            proc.terminate()
+            try:
+                await asyncio.wait_for(proc.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+        shutil.rmtree(user_data_dir, ignore_errors=True)
+
+    @app.get("/api/v1/browser/start")
+    async def start(user_id: str):
+        await delay(start_latency)
+        if random.random() < start_failure_rate:
+            return {"code": -1, "msg": "fake start failure"}
+        await stop_browser(user_id)
+        user_data_dir = tempfile.mkdtemp(prefix=f"fake-adspower-{user_id}-")
+        proc = await asyncio.create_subprocess_exec(
+            executable, *CHROMIUM_ARGS, f"--user-data-dir={user_data_dir}", "about:blank",
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        browsers[user_id] = (proc, user_data_dir)
+        ws = await _read_devtools_endpoint(user_data_dir, proc)
+        if not ws:
+            await stop_browser(user_id)
+            return {"code": -1, "msg": "chromium did not start"}
+        return {"code": 0, "data": {"ws": {"puppeteer": ws}}}
+
+    @app.get("/api/v1/browser/stop")
+    async def stop(user_id: str):
+        await delay(api_latency)
+        await stop_browser(user_id)
+        return {"code": 0, "msg": "success"}
+
+    @app.get("/api/v1/browser/active")
+    async def active(user_id: str):
+        await delay(api_latency)
+        entry = browsers.get(user_id)
+        running = entry is not None and entry[0].returncode is None
+        return {"code": 0, "data": {"status": "Active" if running else "Inactive"}}
+
+    @app.get("/api/v1/user/list")
+    async def user_list(user_id: str):
+        await delay(api_latency)
+        return {"code": 0, "data": {"list": [{
+            "user_id": user_id,
+            "name": f"bench-{user_id}",
+            "user_proxy_config": {"proxy_soft": "other", "proxy_host": "pr.oxylabs.io", "proxy_user": "customer-bench"},
+        }]}}
+
+    @app.post("/api/v1/user/update")
+    async def user_update(request: Request):
+        await delay(api_latency)
+        await request.body()
+        if random.random() < update_failure_rate:
+            return {"code": -1, "msg": "fake update failure"}
+        return {"code": 0, "msg": "success"}
+
+    app.state.browsers = browsers
+    return app
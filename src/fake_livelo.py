@@ -0,0 +1,131 @@
+import asyncio
+import base64
+import json
+import time
+import zlib
+from urllib.parse import parse_qs
+
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+
+# Local stand-in for the Livelo site (and the Skyvio token endpoint) used by
+# src/benchmark.py. Each username gets a fixed scenario, so runs are repeatable.
+
+HOME_HTML = """<!doctype html>
+<html><head><title>Livelo | Programa de Pontos</title></head>
+<body>
+  <header>
+    {header}
+  </header>
+  <div id="cookie-banner" style="position:fixed;bottom:0;width:100%;background:#eee">
+    Usamos cookies. <button id="cookies-politics-button"
+      onclick="document.getElementById('cookie-banner').remove()">Autorizar</button>
+  </div>
+  <main><h1>Troque seus pontos</h1></main>
+</body></html>"""
+
+LOGIN_BUTTON = """<button id="l-header__button_login" onclick="location.href='/acesso/login'">Fazer login</button>"""
+
+LOGIN_HTML = """<!doctype html>
+<html><head><title>Livelo - Acesso</title></head>
+<body>
+  <form method="post" action="/acesso/login">
+    <input id="username" name="username">
+    <input id="password" name="password" type="password">
+    {error}
+    <button id="btn-submit" type="submit" disabled>Entrar</button>
+  </form>
+  <script>
+    const check = () => {{
+      document.getElementById('btn-submit').disabled =
+        !(document.getElementById('username').value && document.getElementById('password').value);
+    }};
+    document.getElementById('username').addEventListener('input', check);
+    document.getElementById('password').addEventListener('input', check);
+  </script>
+</body></html>"""
+
+WAF_HTML = """<html><head><title>Access Denied</title></head>
+<body><h1>Access Denied</h1>
+You don't have permission to access "http://www.livelo.com.br/" on this server.<p>
+Reference #18.{ref}</body></html>"""
+
+RESET_HTML = """<!doctype html>
+<html><head><title>Livelo - Redefinir senha</title></head>
+<body><h1>Redefinir senha</h1><p>Por segurança, crie uma nova senha.</p></body></html>"""
+
+
+def _fake_jwt(username, ttl):
+    def b64(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+    return f"{b64({'alg': 'none'})}.{b64({'sub': username, 'exp': int(time.time()) + ttl})}.sig"
+
+
+def scenario_for(username, waf_rate=0.0, reset_rate=0.0, auth_fail_rate=0.0):
+    """
+    Deterministic outcome for an account: "waf", "reset", "auth_failed" or "success".
+    """
+    point = (zlib.crc32(username.encode()) % 10000) / 10000
+    for name, rate in (("waf", waf_rate), ("reset", reset_rate), ("auth_failed", auth_fail_rate)):
+        if point < rate:
+            return name
+        point -= rate
+    return "success"
+
+
+def create_app(waf_rate=0.0, reset_rate=0.0, auth_fail_rate=0.0, latency=0.0):
+    app = FastAPI()
+    app.state.tokens_received = 0
+
+    async def delay():
+        if latency:
+            await asyncio.sleep(latency)
+
+    @app.get("/")
+    async def home(request: Request):
+        await delay()
+        header = "<span>Olá!</span>" if request.cookies.get("access_token") else LOGIN_BUTTON
+        return HTMLResponse(HOME_HTML.format(header=header))
+
+    @app.get("/acesso/login")
+    async def login_page(error: int = 0):
+        await delay()
+        message = '<div class="error-message">Usuário ou senha incorretos</div>' if error else ""
+        return HTMLResponse(LOGIN_HTML.format(error=message))
+
+    @app.post("/acesso/login")
+    async def login(request: Request):
+        await delay()
+        form = parse_qs((await request.body()).decode())
+        username = form.get("username", [""])[0]
+        scenario = scenario_for(username, waf_rate, reset_rate, auth_fail_rate)
+        if scenario == "waf":
+            return HTMLResponse(
+                WAF_HTML.format(ref=zlib.crc32(username.encode())),
+                status_code=403,
+                headers={"Server": "AkamaiGHost"},
+            )
+        if scenario == "reset":
+            return RedirectResponse("/acesso/reset-credentials", status_code=303)
+        if scenario == "auth_failed":
+            return RedirectResponse("/acesso/login?error=1", status_code=303)
+        response = RedirectResponse("/", status_code=303)
+        response.set_cookie("access_token", _fake_jwt(username, 3600))
+        response.set_cookie("refresh_token", _fake_jwt(username, 30 * 86400))
+        return response
+
+    @app.get("/acesso/reset-credentials")
+    async def reset_page():
+        await delay()
+        return HTMLResponse(RESET_HTML)
+
+    # Skyvio stand-in (SKYVIO_TOKENS_URL)
+    @app.post("/api/livelo/tokens/receive/")
+    async def receive_tokens(request: Request):
+        payload = await request.json()
+        if not payload.get("access_token") or not payload.get("refresh_token"):
+            return JSONResponse({"detail": "missing tokens"}, status_code=400)
+        app.state.tokens_received += 1
+        return {"ok": True}
+
+    return app
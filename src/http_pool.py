@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import os
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Pool sizing (can be tuned via .env without touching code)
+HTTP_POOL_MAX_CONNECTIONS = int(os.environ.get("HTTP_POOL_MAX_CONNECTIONS", "50"))
+HTTP_POOL_MAX_KEEPALIVE = int(os.environ.get("HTTP_POOL_MAX_KEEPALIVE", "20"))
+HTTP_POOL_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_POOL_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_POOL_TIMEOUT = float(os.environ.get("HTTP_POOL_TIMEOUT", "30"))
+HTTP2_ENABLED = os.environ.get("HTTP2_ENABLED", "1") not in ("0", "false", "False")
+
+# origin -> (event loop, client)
+_clients = {}
+_stats = {}
+
+
+class _PooledTransport(httpx.AsyncHTTPTransport):
+    """
+    AsyncHTTPTransport that records how long each request waited for a pooled
+    connection, using the httpcore trace hook.
+    Wait = time until the request headers go out, minus the time spent opening
+    a brand-new connection (TCP + TLS), so only pool contention is counted.
+    """
+
+    def __init__(self, origin, **kwargs):
+        super().__init__(**kwargs)
+        self.origin = origin
+
+    async def handle_async_request(self, request):
+        stats = _stats[self.origin]
+        started = time.perf_counter()
+        marks = {"connect": 0.0}
+
+        async def trace(event_name, info):
+            now = time.perf_counter()
+            if event_name.endswith("connect_tcp.started") or event_name.endswith("start_tls.started"):
+                marks["opened_at"] = now
+            elif event_name.endswith("connect_tcp.complete") or event_name.endswith("start_tls.complete"):
+                marks["connect"] += now - marks.pop("opened_at", now)
+                if event_name.endswith("connect_tcp.complete"):
+                    stats["new_connections"] += 1
+            elif event_name.endswith("send_request_headers.started") and "sent_at" not in marks:
+                marks["sent_at"] = now
+
+        request.extensions = {**request.extensions, "trace": trace}
+        stats["requests"] += 1
+        try:
+            return await super().handle_async_request(request)
+        except Exception:
+            stats["errors"] += 1
+            raise
+        finally:
+            if "sent_at" in marks:
+                wait = max(0.0, marks["sent_at"] - started - marks["connect"])
+                stats["wait_total"] += wait
+                stats["wait_max"] = max(stats["wait_max"], wait)
+
+
+def _origin(base_url):
+    parts = urlsplit(base_url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    return f"{parts.scheme}://{parts.hostname}:{port}"
+
+
+def _build_client(origin):
+    limits = httpx.Limits(
+        max_connections=HTTP_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_POOL_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT, pool=HTTP_POOL_TIMEOUT)
+    # HTTP/2 is only negotiated over TLS (ALPN); plain http hosts like the local
+    # AdsPower API simply stay on keep-alive HTTP/1.1.
+    http2 = HTTP2_ENABLED and origin.startswith("https://")
+    _stats.setdefault(origin, {
+        "requests": 0,
+        "errors": 0,
+        "new_connections": 0,
+        "wait_total": 0.0,
+        "wait_max": 0.0,
+    })
+    transport = _PooledTransport(origin, limits=limits, http2=http2)
+    return httpx.AsyncClient(transport=transport, timeout=timeout)
+
+
+def get_client(base_url):
+    """
+    Returns the shared AsyncClient for the host of `base_url`.
+    One connection pool per origin (scheme://host:port), reused for the whole process.
+    """
+    origin = _origin(base_url)
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(origin)
+    if entry:
+        client_loop, client = entry
+        if client_loop is loop and not client.is_closed:
+            return client
+        # Client belongs to a previous asyncio.run(); it cannot be reused on this loop.
+        logger.debug(f"Discarding stale HTTP client for {origin}")
+
+    client = _build_client(origin)
+    _clients[origin] = (loop, client)
+    logger.info(f"HTTP pool created for {origin}")
+    return client
+
+
+def pool_stats():
+    """
+    Snapshot of every pool: in-use/idle connections, requests and pool wait times.
+    """
+    snapshot = {}
+    for origin, stats in _stats.items():
+        in_use = idle = 0
+        entry = _clients.get(origin)
+        if entry and not entry[1].is_closed:
+            pool = getattr(entry[1]._transport, "_pool", None)
+            for conn in getattr(pool, "connections", []):
+                if conn.is_idle():
+                    idle += 1
+                else:
+                    in_use += 1
+        requests = stats["requests"]
+        snapshot[origin] = {
+            "in_use": in_use,
+            "idle": idle,
+            "requests": requests,
+            "errors": stats["errors"],
+            "new_connections": stats["new_connections"],
+            "avg_wait_ms": round(stats["wait_total"] / requests * 1000, 2) if requests else 0.0,
+            "max_wait_ms": round(stats["wait_max"] * 1000, 2),
+        }
+    return snapshot
+
+
+def reset_pool_stats():
+    """
+    Starts the request/wait counters over; pools and their connections stay.
+    """
+    for stats in _stats.values():
+        stats.update(requests=0, errors=0, new_connections=0, wait_total=0.0, wait_max=0.0)
+
+
+def format_pool_stats():
+    """
+    Human readable one-line-per-host summary (used in logs and run reports).
+    """
+    lines = []
+    for origin, s in pool_stats().items():
+        lines.append(
+            f"{origin}: {s['requests']} req, {s['new_connections']} conexões novas, "
+            f"em uso {s['in_use']}/ociosas {s['idle']}, espera média {s['avg_wait_ms']}ms (máx {s['max_wait_ms']}ms)"
+        )
+    return lines
+
+
+async def close_all():
+    """
+    Closes every pooled client. Safe to call multiple times (shutdown hooks).
+    """
+    for origin, (loop, client) in list(_clients.items()):
+        try:
+            if loop is asyncio.get_running_loop() and not client.is_closed:
+                await client.aclose()
+        except Exception as e:
+            logger.warning(f"Error closing HTTP client for {origin}: {e}")
+    _clients.clear()
@@ -1,128 +1,338 @@
+import argparse
 import csv
 import os
 import sys
 import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from supabase import create_client, Client
-from src.crypto_utils import encrypt_password
+from src.crypto_utils import encrypt_many, fingerprints
+from src.repository import get_repository
+from src import http_pool
 
 # Load environment variables
 load_dotenv()
 
-# Supabase setup
-url: str = os.environ.get("SUPABASE_URL", "")
-key: str = os.environ.get("SUPABASE_KEY", "")
+# Rows parsed, resolved and written per bulk upsert
+IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", "1000"))
+# How many examples of each change the dry-run diff lists
+DIFF_EXAMPLES = 10
+# Processes encrypting changed secrets; small batches are encrypted inline
+IMPORT_WORKERS = int(os.environ.get("IMPORT_WORKERS", str(os.cpu_count() or 1)))
+IMPORT_PARALLEL_MIN = int(os.environ.get("IMPORT_PARALLEL_MIN", "200"))
 
-if not url or not key:
-    print("Error: SUPABASE_URL and SUPABASE_KEY must be set in .env")
-    exit(1)
 
-supabase: Client = create_client(url, key)
+class PhaseTimer:
+    def __init__(self):
+        self.seconds = {}
 
-async def import_accounts(csv_path: str):
-    if not os.path.exists(csv_path):
-        print(f"Error: File {csv_path} not found.")
-        return
+    def add(self, phase, started):
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + time.perf_counter() - started
 
-    print(f"Reading {csv_path}...")
-    
-    count = 0
-    updated = 0
-    errors = 0
-    
-    with open(csv_path, mode='r', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        # Skip header if it exists and looks like a header
-        # We can peek or just assume user knows.
-        # Let's just read and check if first row is header-like
-        rows = list(reader)
-        
-        start_index = 0
-        if rows and len(rows) > 0:
-            if "username" in rows[0][0].lower():
-                print("Header detected, skipping first row.")
-                start_index = 1
-        
-        for row_num, row in enumerate(rows[start_index:]):
+    def report(self):
+        return ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.seconds.items())
+
+
+def read_rows(csv_path, stats, chunk_size):
+    """
+    Streams valid (username, password, adspower_id, latam_password, phone) tuples in chunks.
+    Format: username,password,adspower_id,latam_password,phone (header optional;
+    phone is the number that receives the LATAM 2FA SMS, see src/sms_hub.py).
+    """
+    chunk = []
+    with open(csv_path, mode='r', encoding='utf-8', newline='') as f:
+        for row_num, row in enumerate(csv.reader(f), start=1):
             if not row: # Skip empty rows
                 continue
-
-            # Format: username,password,adspower_id,latam_password
+            if row_num == 1 and "username" in row[0].lower():
+                print("Header detected, skipping first row.")
+                continue
             if len(row) < 2:
-                print(f"Warning: Row {row_num + 1} has less than 2 columns, skipping.")
-                errors += 1
+                print(f"Warning: Row {row_num} has less than 2 columns, skipping.")
+                stats["invalid"] += 1
                 continue
 
             username = row[0].strip()
-            
-            # 1. Sanitization (Zero Pad)
+            # Sanitization (Zero Pad)
             if username.isdigit() and len(username) < 11:
                 username = username.zfill(11)
-            
             password = row[1].strip()
-            adspower_id = row[2].strip() if len(row) > 2 else None
-            latam_password = row[3].strip() if len(row) > 3 else None
-            
+            adspower_id = (row[2].strip() if len(row) > 2 else None) or None
+            latam_password = (row[3].strip() if len(row) > 3 else None) or None
+            phone = (row[4].strip() if len(row) > 4 else None) or None
+
             if not username or not password:
-                print(f"Warning: Row {row_num + 1} has empty username or password, skipping.")
-                errors += 1
+                print(f"Warning: Row {row_num} has empty username or password, skipping.")
+                stats["invalid"] += 1
                 continue
-                
-            try:
-                # 2. AdsPower ID Conflict Resolution (Smart Fix)
-                if adspower_id:
-                    # Check who currently owns this ID
-                    owner_check = supabase.table("accounts").select("username").eq("adspower_user_id", adspower_id).execute()
-                    if owner_check.data:
-                        owner_username = owner_check.data[0]['username']
-                        
-                        if owner_username != username:
-                            # Conflict detected!
-                            # Check if the CSV username already exists in DB
-                            target_check = supabase.table("accounts").select("username").eq("username", username).execute()
-                            
-                            if not target_check.data:
-                                # Scenario A: Same person, CPF corrected/changed. Rename old record.
-                                print(f"♻️ Renaming account {owner_username} to {username} based on AdsPower ID...")
-                                supabase.table("accounts").update({"username": username}).eq("username", owner_username).execute()
-                            else:
-                                # Scenario B: ID Transfer/Conflict. Free the ID from the old owner.
-                                print(f"⚠️ Unlinking AdsPower ID {adspower_id} from obsolete account {owner_username}...")
-                                supabase.table("accounts").update({"adspower_user_id": None}).eq("username", owner_username).execute()
-
-                # 3. Persistence (Upsert)
-                data = {
-                    "username": username,
-                    "password": encrypt_password(password),
-                    "status": "active",
-                    "updated_at": "now()"
-                }
-                if adspower_id:
-                    data["adspower_user_id"] = adspower_id
-                if latam_password:
-                    data["latam_password"] = encrypt_password(latam_password)
-                
-                # Upsert ensures passwords and IDs are updated from CSV
-                response = supabase.table("accounts").upsert(data, on_conflict="username").execute()
-                
-                if response.data:
-                    count += 1
-                    print(f"✅ Processed: {username} (AdsPower: {adspower_id if adspower_id else 'N/A'})")
-                else:
-                    updated += 1
-                    
-            except Exception as e:
-                print(f"❌ Error processing {username}: {e}")
-                errors += 1
-                
-    print(f"Import complete.")
-    print(f"Processed: {count + updated}")
-    print(f"Errors: {errors}")
+
+            chunk.append((username, password, adspower_id, latam_password, phone))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+class SecretEncryptor:
+    """
+    Encrypts the changed secrets of a batch, split across a process pool
+    (Fernet is CPU-bound and holds the GIL); each worker keeps its own cipher.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = max(1, workers or IMPORT_WORKERS)
+        self._pool = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        self.values = 0
+        self.seconds = 0.0
+
+    async def encrypt(self, values):
+        started = time.perf_counter()
+        if self._pool is None or len(values) < IMPORT_PARALLEL_MIN:
+            encrypted = encrypt_many(values)
+        else:
+            loop = asyncio.get_running_loop()
+            size = -(-len(values) // self.workers)
+            parts = await asyncio.gather(*(
+                loop.run_in_executor(self._pool, encrypt_many, values[i:i + size])
+                for i in range(0, len(values), size)
+            ))
+            encrypted = [v for part in parts for v in part]
+        self.values += len(values)
+        self.seconds += time.perf_counter() - started
+        return encrypted
+
+    def report(self):
+        rate = self.values / self.seconds if self.seconds else 0.0
+        return f"{self.values} value(s) in {self.seconds:.2f}s ({rate:.0f}/s, {self.workers} worker(s))"
+
+    def close(self):
+        if self._pool:
+            self._pool.shutdown()
+
+
+class ImportPlan:
+    """
+    In-memory copy of the username <-> adspower_user_id mapping, updated row by
+    row exactly like the old one-query-per-row importer, so the AdsPower conflict
+    rules (rename on a corrected CPF, unlink on an ID transfer) give the same
+    result. Writes are collected and flushed as bulk operations.
+
+    Rows whose keyed fingerprint matches the one stored by the previous import
+    (same account active, same AdsPower ID) are skipped: no encryption, no
+    write, `updated_at` (the batch order) untouched. A match under an older
+    key (before a key rotation) only gets its fingerprint re-keyed.
+    """
+
+    def __init__(self, accounts, track_fingerprints=True):
+        self.existing = {a["username"] for a in accounts}
+        self.owner_of = {a["adspower_user_id"]: a["username"] for a in accounts if a.get("adspower_user_id")}
+        self.id_of = {a["username"]: a["adspower_user_id"] for a in accounts if a.get("adspower_user_id")}
+        self.track_fingerprints = track_fingerprints
+        # Inactive accounts are always rewritten (the import reactivates them)
+        self.fingerprint_of = {
+            a["username"]: a["import_fingerprint"] for a in accounts
+            if a.get("import_fingerprint") and a.get("status", "active") == "active"
+        }
+        self.renames = []
+        self.unlinks = []
+        self.pending = {}
+        # Unchanged accounts whose stored fingerprint was made with an older key
+        self.restamp = {}
+        self.diff = {"new": [], "changed": [], "unchanged": [], "renamed": [], "unlinked": []}
+
+    def _unlink(self, username):
+        adspower_id = self.id_of.pop(username, None)
+        if adspower_id and self.owner_of.get(adspower_id) == username:
+            del self.owner_of[adspower_id]
+
+    def conflict(self, username, adspower_id):
+        """
+        Account currently holding `adspower_id` when it is not `username`, else None.
+        """
+        owner = self.owner_of.get(adspower_id) if adspower_id else None
+        return owner if owner and owner != username else None
+
+    def resolve(self, owner, username, adspower_id):
+        if username not in self.existing:
+            # Same person, CPF corrected/changed: rename the old record
+            self.renames.append((owner, username))
+            self.diff["renamed"].append(f"{owner} -> {username}")
+            self.existing.discard(owner)
+            self.existing.add(username)
+            self.fingerprint_of.pop(owner, None)
+            self.restamp.pop(owner, None)
+            self.id_of[username] = self.id_of.pop(owner, adspower_id)
+            self.owner_of[adspower_id] = username
+        else:
+            # ID transferred: free it from the obsolete account
+            self.unlinks.append(owner)
+            self.diff["unlinked"].append(f"{adspower_id} from {owner}")
+            self._unlink(owner)
+
+    def stage(self, username, password, adspower_id, latam_password, phone=None):
+        # Phone only enters the digest when given, so rows without it keep their old fingerprint
+        values = (username, password, adspower_id, latam_password) + ((phone,) if phone else ())
+        candidates = fingerprints(*values) if self.track_fingerprints else []
+        fp = candidates[0] if candidates else None
+        stored = self.fingerprint_of.get(username)
+        if (stored and stored in candidates
+                and (not adspower_id or self.id_of.get(username) == adspower_id)):
+            self.diff["unchanged"].append(username)
+            if stored != fp:
+                self.restamp[username] = fp
+                self.fingerprint_of[username] = fp
+            return
+        self.diff["changed" if username in self.existing else "new"].append(username)
+        self.existing.add(username)
+        if adspower_id:
+            self._unlink(username)
+            self.owner_of[adspower_id] = username
+            self.id_of[username] = adspower_id
+        # A username repeated in the CSV: the later row wins, like sequential upserts
+        row = self.pending.setdefault(username, {"username": username, "status": "active"})
+        row["_password"] = password
+        if adspower_id:
+            row["adspower_user_id"] = adspower_id
+        if latam_password:
+            row["_latam_password"] = latam_password
+        if phone:
+            row["phone"] = phone
+        if fp:
+            row["import_fingerprint"] = fp
+            self.fingerprint_of[username] = fp
+
+
+async def write_batch(repo, plan, stats, timer, encryptor):
+    """
+    Renames, one bulk unlink, then the staged rows as bulk upserts grouped by
+    column set (rows without an AdsPower ID / LATAM password / phone keep the stored value).
+    """
+    renames, unlinks, pending, restamp = plan.renames, plan.unlinks, plan.pending, plan.restamp
+    plan.renames, plan.unlinks, plan.pending, plan.restamp = [], [], {}, {}
+
+    started = time.perf_counter()
+    rows = [dict(row) for row in pending.values()]
+    secrets = [(row, field) for row in rows for field in ("_password", "_latam_password") if field in row]
+    encrypted = await encryptor.encrypt([row[field] for row, field in secrets])
+    for (row, field), value in zip(secrets, encrypted):
+        del row[field]
+        row[field[1:]] = value
+    for row in rows:
+        row["updated_at"] = "now()"
+    timer.add("encrypt", started)
+
+    started = time.perf_counter()
+    for owner, username in renames:
+        print(f"♻️ Renaming account {owner} to {username} based on AdsPower ID...")
+        await repo.update_account(owner, {"username": username})
+    if unlinks:
+        print(f"⚠️ Unlinking AdsPower IDs from {len(unlinks)} obsolete account(s)...")
+        await repo.update_accounts(unlinks, {"adspower_user_id": None})
+    if restamp:
+        # Fingerprint only: updated_at stays as it is
+        await repo.upsert_accounts([{"username": u, "import_fingerprint": fp} for u, fp in restamp.items()])
+        stats["restamped"] += len(restamp)
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    for group in groups.values():
+        await repo.upsert_accounts(group)
+    timer.add("write", started)
+    stats["written"] += len(rows)
+
+
+async def import_accounts(csv_path: str, dry_run=False, chunk_size=None):
+    if not os.path.exists(csv_path):
+        print(f"Error: File {csv_path} not found.")
+        return
+
+    chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+    repo = get_repository()
+    timer = PhaseTimer()
+    stats = {"rows": 0, "invalid": 0, "written": 0, "restamped": 0}
+    total_started = time.perf_counter()
+
+    # 1. Existing username/AdsPower mapping and import fingerprints, loaded once
+    started = time.perf_counter()
+    try:
+        accounts = await repo.find_accounts("username,adspower_user_id,status,import_fingerprint")
+        plan = ImportPlan(accounts)
+    except Exception as e:
+        # Table without the column yet: import everything, like before
+        print(f"Warning: import_fingerprint not available ({e}); change detection disabled.")
+        accounts = await repo.find_accounts("username,adspower_user_id")
+        plan = ImportPlan(accounts, track_fingerprints=False)
+    timer.add("load", started)
+    print(f"Loaded {len(accounts)} existing account(s).")
+    encryptor = None if dry_run else SecretEncryptor()
+
+    print(f"Reading {csv_path}{' (dry run)' if dry_run else ''}...")
+    chunks = read_rows(csv_path, stats, chunk_size)
+    try:
+        await _import_chunks(repo, plan, chunks, stats, timer, encryptor, dry_run)
+    finally:
+        if encryptor:
+            encryptor.close()
+
+    diff = plan.diff
+    print(f"Import {'dry run ' if dry_run else ''}complete in {time.perf_counter() - total_started:.2f}s ({timer.report()}).")
+    print(f"Rows: {stats['rows']} valid, {stats['invalid']} invalid")
+    for kind, label in (("new", "New"), ("changed", "Changed"), ("renamed", "Renamed"), ("unlinked", "AdsPower ID unlinked")):
+        examples = ", ".join(diff[kind][:DIFF_EXAMPLES]) + (" ..." if len(diff[kind]) > DIFF_EXAMPLES else "")
+        print(f"{label}: {len(diff[kind])}" + (f" ({examples})" if examples else ""))
+    print(f"Unchanged (skipped): {len(diff['unchanged'])}"
+          + (f", {stats['restamped']} fingerprint(s) re-keyed" if stats["restamped"] else ""))
+    if not dry_run:
+        print(f"Written: {stats['written']}")
+        print(f"Encryption: {encryptor.report()}")
+
+
+async def _import_chunks(repo, plan, chunks, stats, timer, encryptor, dry_run):
+    while True:
+        # 2. Parse + validate one chunk
+        started = time.perf_counter()
+        chunk = next(chunks, None)
+        timer.add("parse", started)
+        if chunk is None:
+            break
+
+        # 3. Resolve conflicts in memory
+        for username, password, adspower_id, latam_password, phone in chunk:
+            stats["rows"] += 1
+            owner = plan.conflict(username, adspower_id)
+            if owner and owner in plan.pending and not dry_run:
+                # The fix touches a staged row: write the batch first to keep the row order
+                await write_batch(repo, plan, stats, timer, encryptor)
+            started = time.perf_counter()
+            if owner:
+                plan.resolve(owner, username, adspower_id)
+            plan.stage(username, password, adspower_id, latam_password, phone)
+            timer.add("resolve", started)
+
+        # 4. Bulk write
+        if dry_run:
+            plan.renames, plan.unlinks, plan.pending, plan.restamp = [], [], {}, {}
+        else:
+            await write_batch(repo, plan, stats, timer, encryptor)
+            print(f"✅ {stats['written']} account(s) written so far...")
+
 
 if __name__ == "__main__":
-    csv_file = sys.argv[1] if len(sys.argv) > 1 else "contas.csv"
-    asyncio.run(import_accounts(csv_file))
+    parser = argparse.ArgumentParser(description="Import accounts from a CSV (username,password,adspower_id,latam_password,phone)")
+    parser.add_argument("csv_file", nargs="?", default="contas.csv")
+    parser.add_argument("--dry-run", action="store_true", help="Only print what would change")
+    parser.add_argument("--chunk-size", type=int, default=None, help=f"Rows per bulk write (default {IMPORT_CHUNK_SIZE})")
+    args = parser.parse_args()
+
+    async def main():
+        try:
+            await import_accounts(args.csv_file, dry_run=args.dry_run, chunk_size=args.chunk_size)
+        finally:
+            await http_pool.close_all()
+
+    asyncio.run(main())
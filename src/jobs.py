@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import uuid
+
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+# Browser flows run at most this many at a time behind the API
+API_WORKERS = int(os.environ.get("API_WORKERS", "2"))
+# Jobs waiting for a worker; beyond this, submissions get 429
+API_QUEUE_MAX = int(os.environ.get("API_QUEUE_MAX", "50"))
+# A successful result is returned to new submissions for this long (seconds)
+API_RESULT_TTL = float(os.environ.get("API_RESULT_TTL", "600"))
+# Finished jobs stay queryable for this long (seconds)
+API_JOB_RETENTION = float(os.environ.get("API_JOB_RETENTION", "3600"))
+
+JOBS_SUBMITTED = metrics.Counter(
+    "umx_api_jobs_total", "POST /check submissions by how they were served", labels=("result",)
+)
+JOBS_QUEUED = metrics.Gauge("umx_api_jobs_queued", "API jobs waiting for a worker")
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__("job queue full")
+        self.retry_after = retry_after
+
+
+def _key(username, password):
+    # Coalescing / cache key: a request with another password never shares a result
+    return hashlib.sha256(f"{username}\0{password}".encode()).hexdigest()
+
+
+class Job:
+    def __init__(self, username, password, key):
+        self.id = uuid.uuid4().hex
+        self.username = username
+        self.key = key
+        self.status = "queued"
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.requests = 1
+        self._password = password
+        self._done = asyncio.Event()
+
+    async def wait(self, timeout):
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "username": self.username,
+            "status": self.status,
+            "requests": self.requests,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+        }
+
+
+class JobQueue:
+    """
+    Background execution of /check requests.
+
+    submit() returns at once with a Job: a bounded queue feeds `workers` tasks
+    that run `runner(username, password)`. A request for a username/password
+    that is already queued or running joins that job (single-flight); one that
+    succeeded less than `result_ttl` seconds ago gets the finished job back.
+    When the queue is full, QueueFull is raised (the API answers 429).
+    """
+
+    def __init__(self, runner, workers=None, max_queued=None, result_ttl=None, retention=None):
+        self.runner = runner
+        self.workers = workers or API_WORKERS
+        self.result_ttl = API_RESULT_TTL if result_ttl is None else result_ttl
+        self.retention = API_JOB_RETENTION if retention is None else retention
+        self._queue = asyncio.Queue(maxsize=max_queued or API_QUEUE_MAX)
+        self._jobs = {}
+        self._active = {}
+        self._cache = {}
+        self._tasks = []
+        self._durations = []
+        JOBS_QUEUED.set_function(self._queue.qsize)
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _prune(self, now):
+        for key, job in list(self._cache.items()):
+            if now - job.finished_at > self.result_ttl:
+                del self._cache[key]
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at and now - job.finished_at > self.retention:
+                del self._jobs[job_id]
+
+    def submit(self, username, password):
+        """
+        Returns (job, how) where how is "queued", "coalesced" or "cached".
+        """
+        now = time.time()
+        self._prune(now)
+        key = _key(username, password)
+
+        job = self._cache.get(key)
+        if job:
+            JOBS_SUBMITTED.inc(result="cached")
+            return job, "cached"
+        job = self._active.get(key)
+        if job:
+            job.requests += 1
+            JOBS_SUBMITTED.inc(result="coalesced")
+            return job, "coalesced"
+
+        job = Job(username, password, key)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            JOBS_SUBMITTED.inc(result="rejected")
+            raise QueueFull(self.retry_after())
+        self._jobs[job.id] = job
+        self._active[key] = job
+        JOBS_SUBMITTED.inc(result="queued")
+        return job, "queued"
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def retry_after(self):
+        """
+        Seconds until a queue slot is likely free (median run time, at least 5s).
+        """
+        if not self._durations:
+            return 30
+        recent = sorted(self._durations[-50:])
+        return max(5, int(recent[len(recent) // 2] * self._queue.qsize() / self.workers))
+
+    async def _worker(self, index):
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            password, job._password = job._password, None
+            try:
+                job.result = await self.runner(job.username, password)
+                job.status = "done" if job.result.get("status") == "success" else "error"
+            except Exception as e:
+                logger.error(f"API job {job.id} ({job.username}) failed: {e}")
+                job.result = {"status": "error", "message": str(e)}
+                job.status = "error"
+            finally:
+                job.finished_at = time.time()
+                self._durations.append(job.finished_at - job.started_at)
+                del self._durations[:-200]
+                self._active.pop(job.key, None)
+                if job.status == "done":
+                    self._cache[job.key] = job
+                job._done.set()
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize(),
+            "running": sum(1 for j in self._active.values() if j.status == "running"),
+            "cached": len(self._cache),
+        }
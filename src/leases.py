@@ -0,0 +1,240 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# postgresql://... for multi-node (e.g. the Supabase Postgres), otherwise a local SQLite file
+LEASE_DB_URL = os.environ.get("LEASE_DB_URL", "data/leases.db")
+# A claimed account is stolen by other nodes after this many attempts expire
+MAX_LEASE_ATTEMPTS = int(os.environ.get("MAX_LEASE_ATTEMPTS", "3"))
+
+
+class SQLiteLeaseStore:
+    """
+    Lease table in a local SQLite file. Good for several worker processes on the
+    same box (and for tests); BEGIN IMMEDIATE serialises concurrent claims.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS account_leases (
+                run_key TEXT NOT NULL,
+                username TEXT NOT NULL,
+                node_id TEXT,
+                lease_expires_at REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                outcome TEXT,
+                done_at REAL,
+                PRIMARY KEY (run_key, username)
+            )
+        """)
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+                self._conn.execute("COMMIT")
+                return result
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def seed(self, run_key, usernames):
+        self._transaction(lambda c: c.executemany(
+            "INSERT OR IGNORE INTO account_leases (run_key, username) VALUES (?, ?)",
+            [(run_key, u) for u in usernames]
+        ))
+
+    def claim(self, run_key, node_id, limit, ttl):
+        def fn(c):
+            now = time.time()
+            rows = c.execute(
+                """
+                SELECT username FROM account_leases
+                WHERE run_key = ? AND done_at IS NULL AND attempts < ?
+                  AND (lease_expires_at IS NULL OR lease_expires_at < ?)
+                ORDER BY attempts, username LIMIT ?
+                """,
+                (run_key, MAX_LEASE_ATTEMPTS, now, limit)
+            ).fetchall()
+            usernames = [r[0] for r in rows]
+            c.executemany(
+                "UPDATE account_leases SET node_id = ?, lease_expires_at = ?, attempts = attempts + 1 WHERE run_key = ? AND username = ?",
+                [(node_id, now + ttl, run_key, u) for u in usernames]
+            )
+            return usernames
+        return self._transaction(fn)
+
+    def renew(self, run_key, node_id, usernames, ttl):
+        def fn(c):
+            c.executemany(
+                "UPDATE account_leases SET lease_expires_at = ? WHERE run_key = ? AND username = ? AND node_id = ? AND done_at IS NULL",
+                [(time.time() + ttl, run_key, u, node_id) for u in usernames]
+            )
+            placeholders = ",".join("?" * len(usernames))
+            rows = c.execute(
+                f"SELECT username FROM account_leases WHERE run_key = ? AND node_id = ? AND done_at IS NULL AND username IN ({placeholders})",
+                (run_key, node_id, *usernames)
+            ).fetchall()
+            return {r[0] for r in rows}
+        if not usernames:
+            return set()
+        return self._transaction(fn)
+
+    def release(self, run_key, node_id, username, outcome=None, done=True):
+        self._transaction(lambda c: c.execute(
+            """
+            UPDATE account_leases SET
+                outcome = ?,
+                done_at = CASE WHEN ? THEN ? ELSE NULL END,
+                node_id = CASE WHEN ? THEN node_id ELSE NULL END,
+                lease_expires_at = NULL
+            WHERE run_key = ? AND username = ? AND node_id = ?
+            """,
+            (outcome, done, time.time(), done, run_key, username, node_id)
+        ))
+
+    def progress(self, run_key):
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT COUNT(*),
+                       SUM(CASE WHEN done_at IS NOT NULL THEN 1 ELSE 0 END),
+                       SUM(CASE WHEN done_at IS NULL AND attempts >= ? AND (lease_expires_at IS NULL OR lease_expires_at < ?) THEN 1 ELSE 0 END)
+                FROM account_leases WHERE run_key = ?
+                """,
+                (MAX_LEASE_ATTEMPTS, time.time(), run_key)
+            ).fetchone()
+        total, done, exhausted = row[0], row[1] or 0, row[2] or 0
+        return {"total": total, "done": done, "exhausted": exhausted, "open": total - done - exhausted}
+
+
+class PostgresLeaseStore:
+    """
+    Lease table in Postgres, shared by every node. Claims use
+    FOR UPDATE SKIP LOCKED so concurrent nodes never block or double-claim.
+    """
+
+    def __init__(self, dsn):
+        import psycopg2
+        self._lock = threading.Lock()
+        self._conn = psycopg2.connect(dsn)
+        self._conn.autocommit = False
+        with self._conn.cursor() as cur:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS account_leases (
+                    run_key TEXT NOT NULL,
+                    username TEXT NOT NULL,
+                    node_id TEXT,
+                    lease_expires_at TIMESTAMPTZ,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    outcome TEXT,
+                    done_at TIMESTAMPTZ,
+                    PRIMARY KEY (run_key, username)
+                )
+            """)
+        self._conn.commit()
+
+    def _transaction(self, fn):
+        with self._lock:
+            try:
+                with self._conn.cursor() as cur:
+                    result = fn(cur)
+                self._conn.commit()
+                return result
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def seed(self, run_key, usernames):
+        from psycopg2.extras import execute_values
+        self._transaction(lambda cur: execute_values(
+            cur,
+            "INSERT INTO account_leases (run_key, username) VALUES %s ON CONFLICT DO NOTHING",
+            [(run_key, u) for u in usernames]
+        ))
+
+    def claim(self, run_key, node_id, limit, ttl):
+        def fn(cur):
+            cur.execute(
+                """
+                UPDATE account_leases SET
+                    node_id = %s,
+                    lease_expires_at = now() + make_interval(secs => %s),
+                    attempts = attempts + 1
+                WHERE (run_key, username) IN (
+                    SELECT run_key, username FROM account_leases
+                    WHERE run_key = %s AND done_at IS NULL AND attempts < %s
+                      AND (lease_expires_at IS NULL OR lease_expires_at < now())
+                    ORDER BY attempts, username
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING username
+                """,
+                (node_id, ttl, run_key, MAX_LEASE_ATTEMPTS, limit)
+            )
+            return [r[0] for r in cur.fetchall()]
+        return self._transaction(fn)
+
+    def renew(self, run_key, node_id, usernames, ttl):
+        if not usernames:
+            return set()
+
+        def fn(cur):
+            cur.execute(
+                """
+                UPDATE account_leases SET lease_expires_at = now() + make_interval(secs => %s)
+                WHERE run_key = %s AND node_id = %s AND done_at IS NULL AND username = ANY(%s)
+                RETURNING username
+                """,
+                (ttl, run_key, node_id, list(usernames))
+            )
+            return {r[0] for r in cur.fetchall()}
+        return self._transaction(fn)
+
+    def release(self, run_key, node_id, username, outcome=None, done=True):
+        self._transaction(lambda cur: cur.execute(
+            """
+            UPDATE account_leases SET
+                outcome = %s,
+                done_at = CASE WHEN %s THEN now() ELSE NULL END,
+                node_id = CASE WHEN %s THEN node_id ELSE NULL END,
+                lease_expires_at = NULL
+            WHERE run_key = %s AND username = %s AND node_id = %s
+            """,
+            (outcome, done, done, run_key, username, node_id)
+        ))
+
+    def progress(self, run_key):
+        def fn(cur):
+            cur.execute(
+                """
+                SELECT COUNT(*),
+                       COUNT(*) FILTER (WHERE done_at IS NOT NULL),
+                       COUNT(*) FILTER (WHERE done_at IS NULL AND attempts >= %s
+                                        AND (lease_expires_at IS NULL OR lease_expires_at < now()))
+                FROM account_leases WHERE run_key = %s
+                """,
+                (MAX_LEASE_ATTEMPTS, run_key)
+            )
+            return cur.fetchone()
+        total, done, exhausted = self._transaction(fn)
+        return {"total": total, "done": done, "exhausted": exhausted, "open": total - done - exhausted}
+
+
+def open_lease_store(url=None):
+    url = url or LEASE_DB_URL
+    if url.startswith(("postgres://", "postgresql://")):
+        return PostgresLeaseStore(url)
+    return SQLiteLeaseStore(url)
@@ -0,0 +1,137 @@
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.benchmark import percentile, wait_for_port
+
+# Local load test of webhook_server.py /sms ingestion.
+# Serves the real app in a child process (single core, one event loop) with the
+# Supabase insert replaced by a sink that sleeps --db-latency per batch, fires
+# SMS bursts at it and reports achieved rate, ack latency p50/p95/p99 and how
+# long storage took to catch up.
+#
+#   python src/load_test_sms.py --messages 5000 --rate 500
+
+
+def serve_webhook(port, db_latency):
+    """
+    Child process: the webhook app with a storage sink instead of Supabase.
+    """
+    import uvicorn
+    from src import webhook_server
+
+    def sink(rows):
+        time.sleep(db_latency)
+
+    webhook_server.ingestor.write_batch = sink
+    uvicorn.run(webhook_server.app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+
+async def fire(url, messages, rate, connections):
+    import httpx
+
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    semaphore = asyncio.Semaphore(connections)
+
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        async def send(i):
+            nonlocal errors
+            payload = {
+                "from_number": "LATAM",
+                "to_number": f"119{i % 100000:08d}",
+                "text": f"{100000 + i % 900000} é o seu código de verificação na LATAM Airlines.",
+            }
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(f"{url}/sms", json=payload)
+                    if response.status_code != 200:
+                        errors += 1
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        tasks = []
+        for i in range(messages):
+            if rate:
+                # Open-loop schedule: message i goes out at i / rate
+                delay = started + i / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(i)))
+        await asyncio.gather(*tasks)
+        duration = time.perf_counter() - started
+
+        # Wait until the background flush has written everything
+        drain_started = time.perf_counter()
+        stats = {}
+        while time.perf_counter() - drain_started < 60:
+            stats = (await client.get(f"{url}/")).json()
+            if stats.get("stored", 0) + stats.get("dropped", 0) + stats.get("overflow", 0) >= stats.get("received", 0):
+                break
+            await asyncio.sleep(0.05)
+        drain = time.perf_counter() - drain_started
+
+    latencies.sort()
+    return {
+        "messages": messages,
+        "errors": errors,
+        "seconds": round(duration, 2),
+        "achieved_rate": round(messages / duration, 1),
+        "ack_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "ack_p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "ack_p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "drain_seconds": round(drain, 2),
+        "server": {k: stats.get(k) for k in ("received", "stored", "flushes", "dropped", "overflow")},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the webhook /sms ingestion path")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--rate", type=float, default=500, help="Target SMS/s (0 = as fast as possible)")
+    parser.add_argument("--connections", type=int, default=50, help="Concurrent client connections")
+    parser.add_argument("--db-latency", type=float, default=0.05, help="Simulated storage latency per batch (s)")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--json", dest="json_path", help="Also write the result to this file")
+    args = parser.parse_args()
+
+    server = multiprocessing.Process(target=serve_webhook, args=(args.port, args.db_latency), name="webhook", daemon=True)
+    server.start()
+
+    async def run():
+        if not await wait_for_port(args.port):
+            raise RuntimeError(f"Webhook server on port {args.port} did not come up")
+        return await fire(f"http://127.0.0.1:{args.port}", args.messages, args.rate, args.connections)
+
+    try:
+        print(f"=== /sms load test: {args.messages} SMS at {args.rate or 'max'}/s, {args.connections} connections ===")
+        result = asyncio.run(run())
+    finally:
+        server.terminate()
+        server.join(10)
+
+    print(
+        f"{result['achieved_rate']} SMS/s  ack p50 {result['ack_p50_ms']}ms  p95 {result['ack_p95_ms']}ms  "
+        f"p99 {result['ack_p99_ms']}ms  errors {result['errors']}  storage caught up in {result['drain_seconds']}s  "
+        f"{result['server']}"
+    )
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
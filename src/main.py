@@ -1,18 +1,39 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from src.scraper import get_balance
-import os
-from supabase import create_client, Client
+from src.scraper import get_balance, classify_outcome
+from src import metrics
+from src import tracing
+from src import screenshots
+from src import token_outbox
+from src import http_pool
+from src.jobs import JobQueue, QueueFull
+from src.repository import get_repository
+from src.playwright_runtime import runtime as playwright_runtime
+import time
 
-app = FastAPI()
 
-# Supabase setup
-url: str = os.environ.get("SUPABASE_URL", "")
-key: str = os.environ.get("SUPABASE_KEY", "")
-supabase: Client = None
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Skyvio deliveries go through the persistent outbox in the background
+    await token_outbox.start_default_sender()
+    await jobs.start()
+    yield
+    await jobs.close()
+    await token_outbox.stop_default_sender()
+    # Shutdown: shared Playwright driver and pooled HTTP connections
+    await playwright_runtime.stop()
+    await http_pool.close_all()
+    await screenshots.close()
+    tracing.shutdown()
 
-if url and key:
-    supabase = create_client(url, key)
+
+app = FastAPI(lifespan=lifespan)
+
+# Requests currently running a browser flow
+in_flight = 0
+metrics.IN_FLIGHT.set_function(lambda: in_flight)
 
 class LoginRequest(BaseModel):
     username: str
@@ -22,20 +43,67 @@ class LoginRequest(BaseModel):
 async def root():
     return {"message": "Livelo Scraper Service Running"}
 
-@app.post("/check")
-async def check_balance(request: LoginRequest):
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+async def run_check(username, password):
+    """
+    One browser flow, run by a JobQueue worker.
+    """
+    global in_flight
     adspower_id = None
-    if supabase:
-        try:
-            resp = supabase.table("accounts").select("adspower_user_id").eq("username", request.username).execute()
-            if resp.data:
-                adspower_id = resp.data[0].get("adspower_user_id")
-        except Exception as e:
-            print(f"DB Error in API: {e}")
-
-    result = await get_balance(request.username, request.password, adspower_user_id=adspower_id)
-    
-    if result.get("status") == "error":
-        raise HTTPException(status_code=500, detail=result.get("message"))
-        
+    try:
+        rows = await get_repository().find_accounts("adspower_user_id", username=username)
+        if rows:
+            adspower_id = rows[0].get("adspower_user_id")
+    except Exception as e:
+        print(f"DB Error in API: {e}")
+
+    started = time.monotonic()
+    in_flight += 1
+    try:
+        # The API receives the password in plain text (accounts table values are encrypted)
+        result = await get_balance(username, password, adspower_user_id=adspower_id, password_encrypted=False)
+    finally:
+        in_flight -= 1
+    outcome = classify_outcome(result)
+    metrics.ACCOUNT_OUTCOMES.inc(outcome=outcome)
+    metrics.ACCOUNT_SECONDS.observe(time.monotonic() - started, outcome=outcome)
     return result
+
+# Bounded worker pool with single-flight per username/password and a result cache
+jobs = JobQueue(run_check)
+
+@app.post("/check", status_code=202)
+async def check_balance(request: LoginRequest):
+    """
+    Queues a balance check and returns its job id right away.
+    Poll GET /check/{job_id} for the result.
+    """
+    try:
+        job, how = jobs.submit(request.username, request.password)
+    except QueueFull as e:
+        return JSONResponse(
+            {"detail": "Fila cheia, tente novamente mais tarde.", **jobs.stats()},
+            status_code=429,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    return {"job_id": job.id, "status": job.status, "served": how}
+
+@app.get("/check/{job_id}")
+async def check_status(job_id: str, wait: float = 0):
+    """
+    Job status and, once finished, its result. `wait` (seconds, up to 30)
+    holds the request until the job finishes.
+    """
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if wait and job.finished_at is None:
+        await job.wait(min(wait, 30.0))
+    return job.to_dict()
+
+@app.get("/jobs")
+async def jobs_stats():
+    return jobs.stats()
@@ -0,0 +1,210 @@
+import asyncio
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from src import tracing
+
+logger = logging.getLogger(__name__)
+
+# Port for the /metrics endpoint of the batch process (0 disables it)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9108"))
+
+# Seconds; covers fast API calls up to multi-minute logins
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(n, "") for n in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, k)} {v}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """
+    Gauge set explicitly or read from a callback at scrape time (no cost in between).
+    """
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, fn, **labels):
+        self._functions[self._key(labels)] = fn
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, fn in list(self._functions.items()):
+            try:
+                values[key] = fn()
+            except Exception:
+                pass
+        return [f"{self.name}{_format_labels(self.label_names, k)} {v}" for k, v in values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _samples(self):
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+_registry = []
+
+# --- Metrics of the scraping flow ---
+PHASE_SECONDS = Histogram("umx_phase_seconds", "Duration of each account phase", labels=("phase",))
+PHASE_ERRORS = Counter("umx_phase_errors_total", "Phases that raised", labels=("phase",))
+ACCOUNT_SECONDS = Histogram("umx_account_seconds", "End-to-end duration of an account run", labels=("outcome",))
+ACCOUNT_OUTCOMES = Counter("umx_account_outcomes_total", "Account runs by outcome class", labels=("outcome",))
+CONCURRENCY_LIMIT = Gauge("umx_concurrency_limit", "Current adaptive concurrency window")
+IN_FLIGHT = Gauge("umx_accounts_in_flight", "Accounts currently being scraped")
+QUEUE_DEPTH = Gauge("umx_accounts_queued", "Accounts waiting to start")
+
+
+@contextmanager
+def phase(name):
+    """
+    Times a phase into umx_phase_seconds{phase=name}. Works around awaits too.
+    Inside a sampled trace the phase is also recorded as a span.
+    """
+    started = time.perf_counter()
+    try:
+        with tracing.span(name) as span:
+            yield span
+    except BaseException:
+        PHASE_ERRORS.inc(phase=name)
+        raise
+    finally:
+        PHASE_SECONDS.observe(time.perf_counter() - started, phase=name)
+
+
+def render():
+    """
+    Prometheus text exposition format (0.0.4).
+    """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+async def _handle(reader, writer):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # Drain headers
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass
+        path = request_line.split(b" ")[1] if request_line.count(b" ") >= 2 else b"/"
+        if path.split(b"?")[0] == b"/metrics":
+            status, body = "200 OK", render().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {CONTENT_TYPE}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+    except Exception:
+        pass
+    finally:
+        writer.close()
+
+
+async def start_server(port=None, host="0.0.0.0"):
+    """
+    Minimal /metrics HTTP endpoint for processes without a web framework (batch/worker).
+    Returns the asyncio server, or None when disabled or the port is busy.
+    """
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+    try:
+        server = await asyncio.start_server(_handle, host, port)
+    except OSError as e:
+        logger.warning(f"Metrics endpoint not started on port {port}: {e}")
+        return None
+    logger.info(f"Metrics available at http://{host}:{port}/metrics")
+    return server
+
+
+async def stop_server(server):
+    if server:
+        server.close()
+        await server.wait_closed()
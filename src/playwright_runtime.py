@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import os
+import time
+
+from playwright.async_api import async_playwright
+
+logger = logging.getLogger(__name__)
+
+# Seconds between driver health checks (a cheap round-trip to the Node driver)
+PLAYWRIGHT_HEALTH_INTERVAL = float(os.environ.get("PLAYWRIGHT_HEALTH_INTERVAL", "30"))
+
+
+class PlaywrightRuntime:
+    """
+    One long-lived Playwright driver (Node process) shared by every account of the
+    batch/daemon process. Accounts only pay for connect_over_cdp; the driver is
+    health-checked periodically and restarted automatically if it dies.
+    """
+
+    def __init__(self):
+        self._playwright = None
+        self._loop = None
+        self._lock = asyncio.Lock()
+        self._last_check = 0.0
+        self.start_durations = []
+        self.restarts = 0
+        self.attachments = 0
+        # Average start time before the last reset_stats(), for the estimate of a period without starts
+        self._avg_before_reset = 0.0
+
+    async def _start(self):
+        started = time.perf_counter()
+        self._playwright = await async_playwright().start()
+        self._loop = asyncio.get_running_loop()
+        self._last_check = time.monotonic()
+        duration = time.perf_counter() - started
+        self.start_durations.append(duration)
+        logger.info(f"Playwright driver started in {duration:.2f}s")
+
+    async def _stop_driver(self):
+        if self._playwright:
+            try: await self._playwright.stop()
+            except: pass
+        self._playwright = None
+
+    async def is_healthy(self):
+        """
+        True if the driver answers a round-trip within 5s.
+        """
+        if not self._playwright or self._loop is not asyncio.get_running_loop():
+            return False
+        try:
+            request_ctx = await asyncio.wait_for(self._playwright.request.new_context(), timeout=5)
+            await request_ctx.dispose()
+            return True
+        except Exception as e:
+            logger.warning(f"Playwright driver health check failed: {e}")
+            return False
+
+    async def get(self, force_check=False):
+        """
+        Returns the shared Playwright instance, (re)starting the driver when needed.
+        """
+        async with self._lock:
+            if self._playwright and self._loop is not asyncio.get_running_loop():
+                # Driver belongs to a previous asyncio.run(); start a fresh one
+                self._playwright = None
+            due = time.monotonic() - self._last_check > PLAYWRIGHT_HEALTH_INTERVAL
+            if self._playwright and (force_check or due):
+                self._last_check = time.monotonic()
+                if not await self.is_healthy():
+                    logger.warning("Playwright driver is dead. Restarting...")
+                    await self._stop_driver()
+                    self.restarts += 1
+            if not self._playwright:
+                await self._start()
+            return self._playwright
+
+    async def connect_over_cdp(self, ws_endpoint):
+        """
+        Attaches to an AdsPower browser. Retries once on a fresh driver if the
+        shared one turns out to be dead.
+        """
+        playwright = await self.get()
+        try:
+            browser = await playwright.chromium.connect_over_cdp(ws_endpoint)
+        except Exception:
+            playwright = await self.get(force_check=True)
+            browser = await playwright.chromium.connect_over_cdp(ws_endpoint)
+        self.attachments += 1
+        return browser
+
+    async def stop(self):
+        async with self._lock:
+            if self._playwright and self._loop is asyncio.get_running_loop():
+                await self._stop_driver()
+            self._playwright = None
+
+    def stats(self):
+        """
+        Driver startup cost of this process vs. the old one-driver-per-account model.
+        """
+        starts = len(self.start_durations)
+        total = sum(self.start_durations)
+        avg = total / starts if starts else self._avg_before_reset
+        return {
+            "driver_starts": starts,
+            "driver_restarts": self.restarts,
+            "driver_startup_seconds": round(total, 2),
+            "avg_startup_seconds": round(avg, 2),
+            "attachments": self.attachments,
+            # Estimate of the old model (one driver start per attachment) from this
+            # process's own start times; src/benchmark.py measures it for real
+            "per_account_startup_seconds_estimated": round(avg * self.attachments, 2),
+        }
+
+
+    def reset_stats(self):
+        """
+        Starts the counters over (agendador, once per daily report); the driver keeps running.
+        """
+        if self.start_durations:
+            self._avg_before_reset = sum(self.start_durations) / len(self.start_durations)
+        self.start_durations = []
+        self.restarts = 0
+        self.attachments = 0
+
+
+# Process-wide runtime
+runtime = PlaywrightRuntime()
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import os
+
+from src.scraper import prepare_profile
+from src.adspower import AdsPowerController
+
+logger = logging.getLogger(__name__)
+
+# How many started-but-idle browsers we allow while slots are busy
+PREWARM_LOOKAHEAD = int(os.environ.get("PREWARM_LOOKAHEAD", "1"))
+# Do not start another browser ahead of time below this much available RAM
+PREWARM_MIN_FREE_MB = int(os.environ.get("PREWARM_MIN_FREE_MB", "1024"))
+
+
+def available_memory_mb():
+    """
+    MemAvailable from /proc/meminfo. None where it cannot be read (Windows).
+    """
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+
+class ProfilePrewarmer:
+    """
+    Pipeline stage that prepares the next accounts (proxy session, AdsPower start,
+    CDP attach, window sizing) while the scraping slots are busy.
+    At most `lookahead` prepared profiles wait in the queue, so the number of open
+    browsers stays at (concurrency window + lookahead).
+
+    With `accounts=None` the feed stays open: add() appends accounts for as long
+    as the pipeline lives (worker and scheduler modes). Accounts for which
+    `skip(account)` is true when their turn comes are not started; they come out
+    of get() as (account, None).
+    """
+
+    def __init__(self, accounts=None, lookahead=None, launch_bucket=None, skip=None):
+        self.lookahead = max(1, lookahead or PREWARM_LOOKAHEAD)
+        self.launch_bucket = launch_bucket
+        self.skip = skip
+        self._accounts = asyncio.Queue()
+        self._ready = asyncio.Queue()
+        self._room = asyncio.Semaphore(self.lookahead)
+        self._workers = []
+        if accounts is not None:
+            self.add(accounts)
+            self.finish()
+
+    def add(self, accounts):
+        for account in accounts:
+            self._accounts.put_nowait(account)
+
+    def finish(self):
+        """
+        No more accounts: each worker exits once the queue is empty.
+        """
+        for _ in range(self.lookahead):
+            self._accounts.put_nowait(None)
+
+    def start(self):
+        # One worker per look-ahead slot so several profiles can warm up at once
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.lookahead)]
+
+    async def _wait_for_memory(self):
+        while True:
+            free_mb = available_memory_mb()
+            if free_mb is None or free_mb >= PREWARM_MIN_FREE_MB:
+                return
+            logger.warning(f"Low memory ({free_mb}MB free). Holding pre-warm...")
+            await asyncio.sleep(5)
+
+    async def _worker(self):
+        while True:
+            await self._room.acquire()
+            account = await self._accounts.get()
+            if account is None:
+                self._room.release()
+                return
+            if self.skip and self.skip(account):
+                await self._ready.put((account, None))
+                continue
+            await self._wait_for_memory()
+            if self.launch_bucket:
+                await self.launch_bucket.take()
+            logger.info(f"Pre-warming profile for {account['username']} ({account['adspower_user_id']})...")
+            prepared = await prepare_profile(account['adspower_user_id'])
+            await self._ready.put((account, prepared))
+
+    async def get(self, acquire_slot=None):
+        """
+        Next ready (account, PreparedProfile). With `acquire_slot`, waits for a
+        scraping slot only once a profile is ready (launch pacing never holds a
+        slot) and keeps its look-ahead slot until then, so open browsers stay
+        bounded. Frees the look-ahead slot for the workers. Skipped accounts
+        come back as (account, None) without taking a slot.
+        """
+        item = await self._ready.get()
+        if item[1] is not None and self.skip and self.skip(item[0]):
+            # Dropped while its profile was warming up
+            await self._discard(item[1])
+            item = (item[0], None)
+        if acquire_slot and item[1] is not None:
+            try:
+                await acquire_slot()
+            except BaseException:
+                # Cancelled while waiting: leave the profile for close() to stop
+                self._ready.put_nowait(item)
+                raise
+        self._room.release()
+        return item
+
+    async def _discard(self, prepared):
+        await prepared.close()
+        await AdsPowerController.stop_profile(prepared.adspower_user_id)
+
+    async def close(self):
+        """
+        Cancels workers and stops any profile that was prepared but never used.
+        """
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        while not self._ready.empty():
+            account, prepared = self._ready.get_nowait()
+            if prepared is not None:
+                await self._discard(prepared)
@@ -0,0 +1,305 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+from src import metrics
+from src.token_store import get_store
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+# Token that must never lapse: "refresh" (what Skyvio renews access tokens with) or "access"
+SCHEDULER_TOKEN = os.environ.get("SCHEDULER_TOKEN", "refresh").lower()
+# Refresh this long before `exp` (room for a failed attempt and its retry)
+SCHEDULER_LEAD = float(os.environ.get("SCHEDULER_LEAD", str(3 * 3600)))
+# Deadlines further away than this are left alone (token still fresh)
+SCHEDULER_HORIZON = float(os.environ.get("SCHEDULER_HORIZON", str(24 * 3600)))
+# Tokens without a readable exp are refreshed this long after they were stored (the old daily run)
+SCHEDULER_DEFAULT_INTERVAL = float(os.environ.get("SCHEDULER_DEFAULT_INTERVAL", str(24 * 3600)))
+SCHEDULER_TICK = float(os.environ.get("SCHEDULER_TICK", "30"))
+# A processed account is not picked again for this long; consecutive failures double it
+# (capped at SCHEDULER_DEFAULT_INTERVAL), since a failed run keeps its old deadline
+SCHEDULER_COOLDOWN = float(os.environ.get("SCHEDULER_COOLDOWN", "1800"))
+SCHEDULER_ACCOUNTS_REFRESH = float(os.environ.get("SCHEDULER_ACCOUNTS_REFRESH", "600"))
+SCHEDULER_CURVE_INTERVAL = float(os.environ.get("SCHEDULER_CURVE_INTERVAL", "3600"))
+
+SCHEDULED_ACCOUNTS = metrics.Gauge("umx_scheduler_accounts", "Active accounts by refresh state", labels=("state",))
+DISPATCH_RATE = metrics.Gauge("umx_scheduler_rate_per_hour", "Pace at which upcoming accounts are fed to the workers")
+DISPATCHED = metrics.Counter("umx_scheduler_dispatched_total", "Accounts fed to the workers", labels=("reason",))
+
+SUCCESS_OUTCOMES = {"SUCCESS", "REFRESHED"}
+# Retrying these the same day only burns proxy traffic (or deepens the block)
+TERMINAL_OUTCOMES = {"AUTH_FAILED", "RESET_REQUIRED", "WAF_BLOCK"}
+
+
+def refresh_deadline(expiry, now):
+    """
+    Latest moment to refresh an account, from its TokenStore.expiries() entry:
+    (`exp` of the watched token minus SCHEDULER_LEAD, `exp`). No stored token
+    means (now, None).
+    """
+    if not expiry:
+        return now, None
+    access_exp, refresh_exp, updated_at = expiry
+    exp = (refresh_exp or access_exp) if SCHEDULER_TOKEN == "refresh" else access_exp
+    if exp is None:
+        return (updated_at or 0) + SCHEDULER_DEFAULT_INTERVAL, None
+    return exp - SCHEDULER_LEAD, exp
+
+
+def next_day(now):
+    """
+    Local midnight after `now` (unix time).
+    """
+    return datetime.combine(datetime.fromtimestamp(now).date() + timedelta(days=1), datetime.min.time()).timestamp()
+
+
+class RefreshPlan:
+    """
+    Snapshot of which accounts need a refresh. `upcoming` ones (deadline within
+    the horizon) are fed earliest-deadline-first at `rate`, the slowest constant
+    pace that still meets every deadline, so the load is spread instead of piling
+    up at one hour; the rest are `fresh`.
+
+    Past its deadline an account is `late` and paced to its `exp` instead (the
+    lead is the margin it ate into). Accounts without a valid token (none stored
+    yet, or already expired) are the `backlog`: nothing lapses if they wait, so
+    each gets a due time spread evenly over the horizon the first time it shows
+    up (`backlog_due`, kept by the caller across plans) instead of all of them
+    going at once. Whatever is due already is `overdue` and goes right away.
+    """
+
+    def __init__(self, accounts, expiries, now, horizon=None, exclude=(), backlog_due=None):
+        horizon = horizon or SCHEDULER_HORIZON
+        self.now = now
+        self.overdue = []
+        self.upcoming = []
+        self.fresh = 0
+        self.late = 0
+        self.backlog_due = {}
+        backlog_due = backlog_due or {}
+        unscheduled = []
+        for acc in accounts:
+            username = acc["username"]
+            if username in exclude:
+                # Resting after a failed try: keeps its slot, so it goes as soon as the rest ends
+                if username in backlog_due:
+                    self.backlog_due[username] = backlog_due[username]
+                continue
+            deadline, exp = refresh_deadline(expiries.get(username), now)
+            if deadline > now + horizon:
+                self.fresh += 1
+                continue
+            if deadline <= now:
+                if exp is None or exp <= now:
+                    if username not in backlog_due:
+                        unscheduled.append(acc)
+                        continue
+                    deadline = self.backlog_due[username] = backlog_due[username]
+                else:
+                    self.late += 1
+                    deadline = exp
+            self._add(deadline, acc)
+        for i, acc in enumerate(unscheduled):
+            due = self.backlog_due[acc["username"]] = now + horizon * i / len(unscheduled)
+            self._add(due, acc)
+        self.overdue.sort(key=lambda item: item[0])
+        self.upcoming.sort(key=lambda item: item[0])
+        # The i-th upcoming account (0-based) must be out by its deadline: i + 1 dispatches
+        self.rate = max(((i + 1) / (d - now) for i, (d, _) in enumerate(self.upcoming)), default=0.0)
+
+    def _add(self, deadline, acc):
+        (self.overdue if deadline <= self.now else self.upcoming).append((deadline, acc))
+
+    @property
+    def backlog(self):
+        return len(self.backlog_due)
+
+    def load_curve(self, hours=24, bucket=3600):
+        """
+        [(bucket_start, just_in_time, planned)]: accounts per bucket if each one
+        ran at its deadline, and as actually paced by this plan.
+        """
+        jit = [0] * hours
+        planned = [0] * hours
+        jit[0] += len(self.overdue)
+        planned[0] += len(self.overdue)
+        for i, (deadline, _) in enumerate(self.upcoming):
+            k = int((deadline - self.now) // bucket)
+            if k < hours:
+                jit[k] += 1
+            k = int(((i + 1) / self.rate) // bucket)
+            if k < hours:
+                planned[k] += 1
+        return [(self.now + k * bucket, jit[k], planned[k]) for k in range(hours)]
+
+
+def format_load_curve(plan, hours=24, width=40):
+    curve = plan.load_curve(hours)
+    total = len(plan.overdue) + len(plan.upcoming) + plan.fresh
+    peak = max([max(j, p) for _, j, p in curve] + [1])
+    lines = [
+        f"Projected load ({total} active: {len(plan.overdue)} overdue, {len(plan.upcoming)} due within "
+        f"{SCHEDULER_HORIZON / 3600:.0f}h ({plan.backlog} without a valid token spread over it, {plan.late} late), "
+        f"{plan.fresh} skipped as fresh; pace {plan.rate * 3600:.1f}/h)",
+        "hour   planned                                    just-in-time",
+    ]
+    for start, jit, planned in curve:
+        bar = "█" * round(planned / peak * width)
+        lines.append(f"{datetime.fromtimestamp(start).strftime('%H:%M')}  {planned:5d} {bar:<{width}} {jit:5d}")
+    lines.append(
+        f"Peak per hour: {max(p for _, _, p in curve)} planned vs {max(j for _, j, _ in curve)} just-in-time "
+        f"vs {total} at once in the old daily run"
+    )
+    return "\n".join(lines)
+
+
+class RefreshScheduler:
+    """
+    Continuous feed for the worker pool: every tick it re-plans from the token
+    expiries and hands out overdue accounts plus the upcoming ones the pace
+    allows, as chunks to `process_chunk(accounts, on_finished)`; each account
+    reports its outcome through `on_finished(account, outcome)`. Accounts in
+    flight or in their cooldown are not planned again: SCHEDULER_COOLDOWN after
+    a success, doubling per consecutive failure up to SCHEDULER_DEFAULT_INTERVAL,
+    and until the next day after a TERMINAL_OUTCOMES one.
+    """
+
+    def __init__(self, process_chunk, fetch_accounts, store=None, tick=None):
+        self.process_chunk = process_chunk
+        self.fetch_accounts = fetch_accounts
+        self.store = store or get_store()
+        self.tick = tick or SCHEDULER_TICK
+        self.accounts = []
+        self.plan = None
+        self.in_flight = set()
+        self.cooldown = {}
+        self.failures = {}
+        self.parked = {}
+        self.backlog_due = {}
+        self.credit = 0.0
+        self.stats = {"overdue": 0, "paced": 0, "chunks": 0, "skipped_fresh": 0, "backoff": 0, "parked": 0}
+        self._tasks = set()
+        self._accounts_loaded_at = 0.0
+        self._curve_logged_at = 0.0
+        SCHEDULED_ACCOUNTS.set_function(lambda: len(self.plan.overdue) if self.plan else 0, state="overdue")
+        SCHEDULED_ACCOUNTS.set_function(lambda: len(self.plan.upcoming) if self.plan else 0, state="upcoming")
+        SCHEDULED_ACCOUNTS.set_function(lambda: self.plan.fresh if self.plan else 0, state="fresh")
+        SCHEDULED_ACCOUNTS.set_function(lambda: len(self.in_flight), state="in_flight")
+        SCHEDULED_ACCOUNTS.set_function(lambda: len(self.failures), state="backoff")
+        SCHEDULED_ACCOUNTS.set_function(lambda: len(self.parked), state="parked")
+        DISPATCH_RATE.set_function(lambda: self.plan.rate * 3600 if self.plan else 0)
+
+    async def replan(self, now=None):
+        now = now or time.time()
+        if now - self._accounts_loaded_at >= SCHEDULER_ACCOUNTS_REFRESH or not self.accounts:
+            try:
+                self.accounts = await self.fetch_accounts()
+                self._accounts_loaded_at = now
+            except Exception as e:
+                logger.warning(f"Scheduler could not reload accounts (keeping {len(self.accounts)}): {e}")
+        self.cooldown = {u: t for u, t in self.cooldown.items() if t > now}
+        self.parked = {u: t for u, t in self.parked.items() if t > now}
+        expiries = await asyncio.to_thread(self.store.expiries)
+        self.plan = RefreshPlan(
+            self.accounts, expiries, now, exclude=self.in_flight | set(self.cooldown), backlog_due=self.backlog_due
+        )
+        self.backlog_due = self.plan.backlog_due
+        return self.plan
+
+    def take(self, elapsed):
+        """
+        Accounts to dispatch now: every overdue one, plus as many upcoming ones
+        as the pace earned over `elapsed` seconds.
+        """
+        plan = self.plan
+        if not plan.upcoming:
+            self.credit = 0.0
+        else:
+            self.credit = min(self.credit + plan.rate * elapsed, float(len(plan.upcoming)))
+        count = int(self.credit)
+        self.credit -= count
+        self.stats["overdue"] += len(plan.overdue)
+        self.stats["paced"] += count
+        DISPATCHED.inc(len(plan.overdue), reason="overdue")
+        DISPATCHED.inc(count, reason="paced")
+        return [acc for _, acc in plan.overdue] + [acc for _, acc in plan.upcoming[:count]]
+
+    def settle(self, username, outcome, now=None):
+        """
+        Takes an account out of flight and sets how long it rests, by outcome.
+        """
+        now = now or time.time()
+        self.in_flight.discard(username)
+        if outcome in SUCCESS_OUTCOMES:
+            self.failures.pop(username, None)
+            self.cooldown[username] = now + SCHEDULER_COOLDOWN
+        elif outcome in TERMINAL_OUTCOMES:
+            self.failures.pop(username, None)
+            self.parked[username] = self.cooldown[username] = next_day(now)
+            # Spread again with the others coming back tomorrow instead of all at midnight
+            self.backlog_due.pop(username, None)
+            self.stats["parked"] += 1
+            logger.info(f"Scheduler: {username} parked until tomorrow ({outcome}).")
+        else:
+            failures = self.failures[username] = self.failures.get(username, 0) + 1
+            delay = min(SCHEDULER_COOLDOWN * 2 ** (failures - 1), SCHEDULER_DEFAULT_INTERVAL)
+            self.cooldown[username] = now + delay
+            self.stats["backoff"] += 1
+            if failures > 1:
+                logger.info(f"Scheduler: {username} failed {failures}x in a row ({outcome}); next try in {delay / 60:.0f} min.")
+
+    async def _run_chunk(self, chunk):
+        pending = {acc["username"] for acc in chunk}
+
+        async def on_finished(account, outcome):
+            pending.discard(account["username"])
+            self.settle(account["username"], outcome)
+
+        try:
+            await self.process_chunk(chunk, on_finished)
+        except Exception as e:
+            logger.error(f"Scheduled chunk of {len(chunk)} account(s) failed: {e}")
+            # Accounts that never reported back count as failed
+            for username in list(pending):
+                self.settle(username, "ERROR")
+
+    def dispatch(self, chunk):
+        self.in_flight.update(acc["username"] for acc in chunk)
+        self.stats["chunks"] += 1
+        task = asyncio.create_task(self._run_chunk(chunk))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def run(self, stop):
+        """
+        Runs until `stop` (an asyncio.Event) is set, then waits for running chunks.
+        """
+        loop = asyncio.get_running_loop()
+        last = loop.time()
+        while not stop.is_set():
+            now_mono = loop.time()
+            plan = await self.replan()
+            self.stats["skipped_fresh"] = plan.fresh
+            if time.time() - self._curve_logged_at >= SCHEDULER_CURVE_INTERVAL:
+                logger.info(format_load_curve(plan))
+                self._curve_logged_at = time.time()
+            chunk = self.take(now_mono - last)
+            last = now_mono
+            if chunk:
+                logger.info(
+                    f"Scheduler: dispatching {len(chunk)} account(s) ({len(plan.overdue)} overdue); "
+                    f"{len(plan.upcoming)} upcoming, {plan.fresh} fresh, {len(self.in_flight)} in flight"
+                )
+                self.dispatch(chunk)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=self.tick)
+            except asyncio.TimeoutError:
+                pass
+        if self._tasks:
+            logger.info(f"Scheduler stopping: waiting for {len(self._tasks)} running chunk(s)...")
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from src import http_pool
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+SUPABASE_URL = os.environ.get("SUPABASE_URL", "")
+SUPABASE_KEY = os.environ.get("SUPABASE_KEY", "")
+# supabase | sqlite (default: supabase when SUPABASE_URL is set; the local
+# SQLite file is only used when asked for, never as a silent fallback)
+DATA_BACKEND = os.environ.get("DATA_BACKEND", "supabase" if SUPABASE_URL else "").lower()
+DATA_SQLITE_PATH = os.environ.get("DATA_SQLITE_PATH", "data/local.db")
+ACCOUNTS_TABLE = os.environ.get("ACCOUNTS_TABLE", "accounts")
+SMS_TABLE = os.environ.get("SMS_TABLE", "sms_logs")
+RESULTS_TABLE = os.environ.get("RESULTS_TABLE", "account_results")
+# PostgREST caps responses (1000 rows on Supabase); larger reads are paged
+PAGE_SIZE = int(os.environ.get("DATA_PAGE_SIZE", "1000"))
+
+
+def _now_iso():
+    return time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime())
+
+
+class SupabaseRepository:
+    """
+    Accounts, SMS logs and run results over the Supabase REST API (PostgREST),
+    sent through the shared pooled AsyncClient (src/http_pool.py), so a query
+    never holds the event loop.
+    """
+
+    def __init__(self, url=None, key=None):
+        self.url = (url or SUPABASE_URL).rstrip("/")
+        self.key = key or SUPABASE_KEY
+        if not self.url or not self.key:
+            raise RuntimeError("SUPABASE_URL and SUPABASE_KEY must be set for the supabase backend")
+
+    def _headers(self, prefer=None):
+        headers = {"apikey": self.key, "Authorization": f"Bearer {self.key}"}
+        if prefer:
+            headers["Prefer"] = prefer
+        return headers
+
+    async def _request(self, method, table, params=None, json=None, prefer=None):
+        client = http_pool.get_client(self.url)
+        response = await client.request(
+            method, f"{self.url}/rest/v1/{table}", params=params, json=json, headers=self._headers(prefer)
+        )
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {table}: HTTP {response.status_code}: {response.text[:200]}")
+        return response.json() if response.content else []
+
+    async def _select(self, table, filters, columns="*", order=None, limit=None):
+        params = {"select": columns, **{k: f"eq.{v}" for k, v in filters.items()}}
+        if order:
+            params["order"] = order
+        rows = []
+        while True:
+            page = min(PAGE_SIZE, limit - len(rows)) if limit else PAGE_SIZE
+            batch = await self._request("GET", table, {**params, "limit": page, "offset": len(rows)})
+            rows.extend(batch)
+            if len(batch) < page or (limit and len(rows) >= limit):
+                return rows
+
+    async def find_accounts(self, columns="*", **filters):
+        # Stable order so offset paging never skips or repeats rows
+        return await self._select(ACCOUNTS_TABLE, filters, columns, order="username")
+
+    async def active_accounts(self):
+        return await self._select(ACCOUNTS_TABLE, {"status": "active"}, order="updated_at")
+
+    async def accounts_page(self, columns="*", after=None, limit=None):
+        """
+        Next `limit` accounts by username after `after` (keyset paging: constant
+        cost per page, unaffected by rows written meanwhile).
+        """
+        params = {"select": columns, "order": "username", "limit": limit or PAGE_SIZE}
+        if after is not None:
+            params["username"] = f"gt.{after}"
+        return await self._request("GET", ACCOUNTS_TABLE, params)
+
+    async def update_account(self, username, fields):
+        await self._request("PATCH", ACCOUNTS_TABLE, {"username": f"eq.{username}"}, json=fields)
+
+    async def update_accounts(self, usernames, fields):
+        """
+        Same change on many accounts, one request per PAGE_SIZE usernames.
+        """
+        usernames = list(usernames)
+        for i in range(0, len(usernames), PAGE_SIZE):
+            quoted = ",".join('"' + u.replace('\\', '\\\\').replace('"', '\\"') + '"' for u in usernames[i:i + PAGE_SIZE])
+            await self._request("PATCH", ACCOUNTS_TABLE, {"username": f"in.({quoted})"}, json=fields)
+
+    async def upsert_accounts(self, rows):
+        """
+        Bulk upsert; every row must carry the same columns (PostgREST takes them
+        from the payload as a whole).
+        """
+        await self._request(
+            "POST", ACCOUNTS_TABLE, {"on_conflict": "username"}, json=rows,
+            prefer="resolution=merge-duplicates,return=minimal",
+        )
+        return rows
+
+    async def insert_sms(self, rows):
+        await self._request("POST", SMS_TABLE, json=rows, prefer="return=minimal")
+
+    async def recent_sms(self, since_iso, limit=1):
+        params = {"select": "*", "created_at": f"gte.{since_iso}", "order": "created_at.desc", "limit": limit}
+        return await self._request("GET", SMS_TABLE, params)
+
+    async def upsert_results(self, rows):
+        await self._request(
+            "POST", RESULTS_TABLE, {"on_conflict": "username"}, json=rows,
+            prefer="resolution=merge-duplicates,return=minimal",
+        )
+
+    async def close(self):
+        # Connections belong to the shared http_pool (closed with http_pool.close_all())
+        pass
+
+
+class SQLiteRepository:
+    """
+    Same tables in a local SQLite file, for offline runs and benchmarks.
+    Queries run in a worker thread (asyncio.to_thread) behind one lock.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or DATA_SQLITE_PATH
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS {ACCOUNTS_TABLE} (
+                username TEXT PRIMARY KEY,
+                password TEXT,
+                latam_password TEXT,
+                adspower_user_id TEXT,
+                status TEXT DEFAULT 'active',
+                updated_at TEXT,
+                import_fingerprint TEXT,
+                phone TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_{ACCOUNTS_TABLE}_adspower ON {ACCOUNTS_TABLE} (adspower_user_id);
+            CREATE TABLE IF NOT EXISTS {SMS_TABLE} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                from_number TEXT,
+                text TEXT,
+                created_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_{SMS_TABLE}_created ON {SMS_TABLE} (created_at);
+            CREATE TABLE IF NOT EXISTS {RESULTS_TABLE} (
+                username TEXT PRIMARY KEY,
+                status TEXT,
+                outcome TEXT,
+                livelo_balance TEXT,
+                latam_balance TEXT,
+                run_id TEXT,
+                checked_at TEXT
+            );
+        """)
+        # Columns added after the first release of this schema
+        columns = {r[1] for r in self._conn.execute(f"PRAGMA table_info({ACCOUNTS_TABLE})")}
+        if "import_fingerprint" not in columns:
+            self._conn.execute(f"ALTER TABLE {ACCOUNTS_TABLE} ADD COLUMN import_fingerprint TEXT")
+        if "phone" not in columns:
+            self._conn.execute(f"ALTER TABLE {ACCOUNTS_TABLE} ADD COLUMN phone TEXT")
+        self._conn.commit()
+
+    async def _run(self, fn):
+        def locked():
+            with self._lock:
+                result = fn(self._conn)
+                self._conn.commit()
+                return result
+        return await asyncio.to_thread(locked)
+
+    def _upsert(self, conn, table, rows, key):
+        # One executemany per column set
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(row), []).append([_now_iso() if v == "now()" else v for v in row.values()])
+        for columns, values in groups.items():
+            updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != key) or f"{key} = excluded.{key}"
+            conn.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT({key}) DO UPDATE SET {updates}",
+                values
+            )
+
+    async def find_accounts(self, columns="*", **filters):
+        where = " AND ".join(f"{k} = ?" for k in filters) or "1 = 1"
+        return await self._run(lambda c: [dict(r) for r in c.execute(
+            f"SELECT {columns} FROM {ACCOUNTS_TABLE} WHERE {where}", list(filters.values())
+        )])
+
+    async def active_accounts(self):
+        return await self._run(lambda c: [dict(r) for r in c.execute(
+            f"SELECT * FROM {ACCOUNTS_TABLE} WHERE status = 'active' ORDER BY updated_at"
+        )])
+
+    async def accounts_page(self, columns="*", after=None, limit=None):
+        return await self._run(lambda c: [dict(r) for r in c.execute(
+            f"SELECT {columns} FROM {ACCOUNTS_TABLE} WHERE username > ? ORDER BY username LIMIT ?",
+            ("" if after is None else after, limit or PAGE_SIZE)
+        )])
+
+    async def update_account(self, username, fields):
+        sets = ", ".join(f"{k} = ?" for k in fields)
+        await self._run(lambda c: c.execute(
+            f"UPDATE {ACCOUNTS_TABLE} SET {sets} WHERE username = ?", [*fields.values(), username]
+        ))
+
+    async def update_accounts(self, usernames, fields):
+        sets = ", ".join(f"{k} = ?" for k in fields)
+        await self._run(lambda c: c.executemany(
+            f"UPDATE {ACCOUNTS_TABLE} SET {sets} WHERE username = ?", [[*fields.values(), u] for u in usernames]
+        ))
+
+    async def upsert_accounts(self, rows):
+        await self._run(lambda c: self._upsert(c, ACCOUNTS_TABLE, rows, "username"))
+        return rows
+
+    async def insert_sms(self, rows):
+        await self._run(lambda c: c.executemany(
+            f"INSERT INTO {SMS_TABLE} (from_number, text, created_at) VALUES (?, ?, ?)",
+            [(r.get("from_number"), r.get("text"), r.get("created_at") or _now_iso()) for r in rows]
+        ))
+
+    async def recent_sms(self, since_iso, limit=1):
+        return await self._run(lambda c: [dict(r) for r in c.execute(
+            f"SELECT * FROM {SMS_TABLE} WHERE created_at >= ? ORDER BY created_at DESC, id DESC LIMIT ?",
+            (since_iso, limit)
+        )])
+
+    async def upsert_results(self, rows):
+        await self._run(lambda c: self._upsert(c, RESULTS_TABLE, rows, "username"))
+
+    async def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_repository(backend=None):
+    backend = (backend or DATA_BACKEND).lower()
+    if not backend:
+        raise RuntimeError("No data backend configured: set SUPABASE_URL/SUPABASE_KEY, or DATA_BACKEND=sqlite for offline runs")
+    if backend == "supabase":
+        return SupabaseRepository()
+    if backend == "sqlite":
+        return SQLiteRepository()
+    raise ValueError(f"Unknown DATA_BACKEND: {backend}")
+
+
+_repository = None
+
+
+def get_repository():
+    """
+    Process-wide repository, created on first use.
+    """
+    global _repository
+    if _repository is None:
+        _repository = open_repository()
+        logger.info(f"Data backend: {DATA_BACKEND}")
+    return _repository
@@ -0,0 +1,195 @@
+import logging
+import os
+from urllib.parse import urlsplit
+
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+# off | safe | aggressive
+RESOURCE_BLOCKING = os.environ.get("RESOURCE_BLOCKING", "safe").lower()
+# Comma-separated extra domains to always block / never block
+RESOURCE_BLOCK_DOMAINS = [d.strip() for d in os.environ.get("RESOURCE_BLOCK_DOMAINS", "").split(",") if d.strip()]
+RESOURCE_ALLOW_DOMAINS = [d.strip() for d in os.environ.get("RESOURCE_ALLOW_DOMAINS", "").split(",") if d.strip()]
+
+# Tag managers, analytics, ads and session recorders: never needed to get tokens
+TRACKING_DOMAINS = (
+    "googletagmanager.com", "google-analytics.com", "analytics.google.com", "doubleclick.net",
+    "googleadservices.com", "googlesyndication.com", "facebook.net", "facebook.com", "connect.facebook.net",
+    "hotjar.com", "hotjar.io", "clarity.ms", "bing.com", "tiktok.com", "analytics.tiktok.com",
+    "linkedin.com", "ads.linkedin.com", "taboola.com", "criteo.com", "criteo.net", "onetrust.com",
+    "dynatrace.com", "newrelic.com", "nr-data.net", "braze.com", "appsflyer.com",
+    "sentry.io", "go-mpulse.net", "akstat.io", "youtube.com", "ytimg.com", "vimeo.com",
+)
+
+# Akamai Bot Manager / WAF: its sensor is first-party, but never touch its own hosts either
+WAF_DOMAINS = ("akamaihd.net", "akamaized.net", "akamai.net", "edgesuite.net", "edgekey.net")
+# Captcha / challenge providers a login form may fall back to. Google's shared
+# hosts only for the reCAPTCHA paths: analytics and fonts there stay blockable.
+CHALLENGE_DOMAINS = ("recaptcha.net", "hcaptcha.com")
+CHALLENGE_PATHS = (("google.com", "/recaptcha/"), ("gstatic.com", "/recaptcha/"))
+
+# Per target site: first-party domains plus site-specific allow/deny lists.
+# `block_types` overrides the mode's resource types for that site.
+SITES = {
+    "livelo": {
+        "domains": ("livelo.com.br", os.environ.get("LIVELO_DOMAIN", "livelo.com.br")),
+        "allow_domains": (),
+        "deny_domains": ("zendesk.com", "zdassets.com", "blip.ai"),
+    },
+    "latam": {
+        "domains": ("latamairlines.com", "latam.com"),
+        "allow_domains": ("latamairlines.net",),
+        "deny_domains": ("salesforce.com", "evergage.com"),
+    },
+}
+
+# safe: only bytes the token flow never looks at; scripts/XHR always pass (WAF sensor)
+# aggressive: also every third-party request outside the site/WAF allow lists
+MODES = {
+    "safe": {"block_types": {"image", "media", "font"}, "block_third_party": False},
+    "aggressive": {"block_types": {"image", "media", "font", "texttrack", "eventsource", "manifest"}, "block_third_party": True},
+}
+
+# Resource types that must never be aborted (navigation and the WAF's sensor calls)
+NEVER_BLOCK_TYPES = {"document"}
+
+# Typical transfer size per aborted request (bytes), used to estimate savings
+ESTIMATED_BYTES = {
+    "image": 35_000, "media": 400_000, "font": 40_000, "script": 60_000,
+    "stylesheet": 25_000, "xhr": 3_000, "fetch": 3_000, "other": 5_000,
+}
+
+BLOCKED_REQUESTS = metrics.Counter(
+    "umx_blocked_requests_total", "Requests aborted by the resource blocking profile", labels=("site", "resource_type")
+)
+BLOCKED_BYTES = metrics.Counter(
+    "umx_blocked_bytes_estimated_total", "Estimated bytes not downloaded thanks to resource blocking", labels=("site",)
+)
+
+# Process-wide totals for the run report (like scraper.page_check_stats())
+_totals = {"accounts": 0, "blocked": 0, "allowed": 0, "bytes_saved": 0}
+
+
+def _host(url):
+    try:
+        return (urlsplit(url).hostname or "").lower()
+    except ValueError:
+        return ""
+
+
+def _matches(host, domains):
+    return any(host == d or host.endswith("." + d) for d in domains if d)
+
+
+def _is_challenge(url, host):
+    if _matches(host, CHALLENGE_DOMAINS):
+        return True
+    try:
+        path = urlsplit(url).path
+    except ValueError:
+        return False
+    return any(_matches(host, (domain,)) and path.startswith(prefix) for domain, prefix in CHALLENGE_PATHS)
+
+
+def site_for(host):
+    for name, site in SITES.items():
+        if _matches(host, site["domains"]):
+            return name
+    return None
+
+
+class BlockingStats:
+    """
+    Counters of one account run (one browser context).
+    """
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.blocked = 0
+        self.allowed = 0
+        self.bytes_saved = 0
+        self.by_type = {}
+
+    def summary(self):
+        top = ", ".join(f"{t}={n}" for t, n in sorted(self.by_type.items(), key=lambda kv: -kv[1]))
+        return (
+            f"{self.blocked} blocked / {self.allowed} allowed requests, "
+            f"~{self.bytes_saved // 1024} KB saved ({top or 'nothing blocked'})"
+        )
+
+
+def should_block(url, resource_type, page_url, mode):
+    """
+    Returns the site name to account the block to, or None to let the request through.
+    """
+    if resource_type in NEVER_BLOCK_TYPES:
+        return None
+    host = _host(url)
+    if _matches(host, RESOURCE_ALLOW_DOMAINS) or _matches(host, WAF_DOMAINS) or _is_challenge(url, host):
+        return None
+    site_name = site_for(_host(page_url)) or site_for(host)
+    site = SITES.get(site_name, {})
+    label = site_name or "other"
+
+    if _matches(host, site.get("allow_domains", ())):
+        return None
+    if _matches(host, TRACKING_DOMAINS) or _matches(host, RESOURCE_BLOCK_DOMAINS) or _matches(host, site.get("deny_domains", ())):
+        return label
+    block_types = site.get("block_types", MODES[mode]["block_types"])
+    if resource_type in block_types:
+        return label
+    if MODES[mode]["block_third_party"] and site_name and not _matches(host, site["domains"]):
+        return label
+    return None
+
+
+async def install(context, mode=None):
+    """
+    Routes every request of `context` through the blocking profile.
+    Returns the BlockingStats of the context, or None when blocking is off.
+
+    Note: Playwright disables the HTTP cache of a context while routes are active,
+    so cached static files are fetched again; the saved bytes must beat that.
+    """
+    mode = (mode or RESOURCE_BLOCKING).lower()
+    if mode not in MODES:
+        return None
+    stats = BlockingStats(mode)
+    _totals["accounts"] += 1
+
+    async def handle(route, request):
+        try:
+            page_url = request.frame.url
+        except Exception:
+            # Service worker requests have no frame
+            page_url = ""
+        site = should_block(request.url, request.resource_type, page_url, mode)
+        if site is None:
+            stats.allowed += 1
+            _totals["allowed"] += 1
+            await route.fallback()
+            return
+        estimated = ESTIMATED_BYTES.get(request.resource_type, ESTIMATED_BYTES["other"])
+        stats.blocked += 1
+        stats.bytes_saved += estimated
+        stats.by_type[request.resource_type] = stats.by_type.get(request.resource_type, 0) + 1
+        _totals["blocked"] += 1
+        _totals["bytes_saved"] += estimated
+        BLOCKED_REQUESTS.inc(site=site, resource_type=request.resource_type)
+        BLOCKED_BYTES.inc(estimated, site=site)
+        await route.abort("blockedbyclient")
+
+    await context.route("**/*", handle)
+    return stats
+
+
+def totals():
+    stats = dict(_totals)
+    stats["bytes_saved_per_account"] = stats["bytes_saved"] // stats["accounts"] if stats["accounts"] else 0
+    return stats
+
+
+def reset():
+    for key in _totals:
+        _totals[key] = 0
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import os
+import time
+
+from dotenv import load_dotenv
+
+from src.repository import get_repository
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+RESULT_FLUSH_SIZE = int(os.environ.get("RESULT_FLUSH_SIZE", "50"))
+RESULT_FLUSH_INTERVAL = float(os.environ.get("RESULT_FLUSH_INTERVAL", "5"))
+RESULT_QUEUE_MAX = int(os.environ.get("RESULT_QUEUE_MAX", "1000"))
+RESULT_MAX_RETRIES = int(os.environ.get("RESULT_MAX_RETRIES", "5"))
+
+
+async def _repository_upsert(rows):
+    """
+    One bulk upsert (single round-trip) into the results table.
+    """
+    await get_repository().upsert_results(rows)
+
+
+class BatchWriter:
+    """
+    Queue drained by a background task that hands `write_batch` one batch every
+    `flush_size` records or `flush_interval` seconds, retrying with exponential
+    backoff. Subclasses shape the batch (_rows) and account for the outcome
+    (_flushed/_dropped).
+    submit() blocks when `max_pending` records are waiting, so a slow store
+    slows producers instead of growing memory.
+    """
+
+    label = "Batch"
+
+    def __init__(self, write_batch, flush_size, flush_interval, max_pending, max_retries=RESULT_MAX_RETRIES,
+                 retry_delay=1.0, max_retry_delay=30):
+        self.write_batch = write_batch
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._queue = asyncio.Queue(maxsize=max_pending)
+        self._task = None
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, record):
+        await self._queue.put(record)
+
+    async def close(self):
+        """
+        Final flush on shutdown: drains whatever is still queued.
+        """
+        if self._task:
+            await self._queue.put(None)
+            await self._task
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stop = False
+        while not stop:
+            batch = []
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.flush_size:
+                # Take what is already queued without a timer per record (bursts)
+                try:
+                    record = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        record = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if record is None:
+                    stop = True
+                    break
+                batch.append(record)
+            if batch:
+                await self._flush(batch)
+
+    async def _flush(self, batch):
+        rows = self._rows(batch)
+        delay = self.retry_delay
+        for attempt in range(1, self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                if asyncio.iscoroutinefunction(self.write_batch):
+                    await self.write_batch(rows)
+                else:
+                    await asyncio.to_thread(self.write_batch, rows)
+                self.written += len(rows)
+                self.flushes += 1
+                self._flushed(rows, time.perf_counter() - started)
+                return
+            except Exception as e:
+                logger.warning(f"{self.label} flush failed (attempt {attempt}/{self.max_retries}): {e}")
+                if attempt < self.max_retries:
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.max_retry_delay)
+        self.dropped += len(rows)
+        self._dropped(rows)
+
+    def _rows(self, batch):
+        return batch
+
+    def _flushed(self, rows, seconds):
+        logger.info(f"{self.label} flushed: {len(rows)} row(s) in {seconds:.2f}s")
+
+    def _dropped(self, rows):
+        logger.error(f"Dropping {len(rows)} {self.label.lower()} row(s) after {self.max_retries} attempts.")
+
+
+class ResultWriter(BatchWriter):
+    """
+    Buffered writer for per-account outcomes: one bulk upsert per batch.
+    """
+
+    label = "Results"
+
+    def __init__(self, write_batch=None, flush_size=None, flush_interval=None, max_pending=None):
+        super().__init__(
+            write_batch or _repository_upsert,
+            flush_size or RESULT_FLUSH_SIZE,
+            flush_interval or RESULT_FLUSH_INTERVAL,
+            max_pending or RESULT_QUEUE_MAX,
+        )
+
+    def _rows(self, batch):
+        # Last write wins per account (an upsert cannot touch the same row twice)
+        return list({r["username"]: r for r in batch}.values())
+
+    def _dropped(self, rows):
+        logger.error(f"Dropping {len(rows)} result row(s) after {self.max_retries} attempts: {[r['username'] for r in rows]}")
+
+
+# Writer used by scraper.update_account_db_multi while a batch/daemon is running
+default_writer = None
+
+
+async def start_default_writer(**kwargs):
+    global default_writer
+    default_writer = ResultWriter(**kwargs)
+    await default_writer.start()
+    return default_writer
+
+
+async def stop_default_writer():
+    global default_writer
+    writer, default_writer = default_writer, None
+    if writer:
+        await writer.close()
+        logger.info(f"Result writer closed: {writer.written} written, {writer.dropped} dropped, {writer.flushes} flush(es).")
@@ -0,0 +1,174 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.crypto_utils import ENCRYPTION_KEYS, rotate_many
+from src.repository import get_repository
+from src import http_pool
+
+# Load environment variables
+load_dotenv()
+
+# Accounts read, re-encrypted and written back per page
+ROTATE_PAGE_SIZE = int(os.environ.get("ROTATE_PAGE_SIZE", "1000"))
+ROTATE_WORKERS = int(os.environ.get("ROTATE_WORKERS", str(os.cpu_count() or 1)))
+# Last fully written username, so an interrupted rotation continues from there
+ROTATE_CHECKPOINT_PATH = os.environ.get("ROTATE_CHECKPOINT_PATH", "data/key_rotation.json")
+FAILED_EXAMPLES = 10
+
+SECRET_FIELDS = ("password", "latam_password")
+
+
+def _key_id():
+    # Identifies the target key in the checkpoint without storing the key itself
+    return hashlib.sha256(ENCRYPTION_KEYS[0].encode()).hexdigest()[:16]
+
+
+def load_checkpoint(path=ROTATE_CHECKPOINT_PATH):
+    """
+    Username to resume after, or None. A checkpoint written for another
+    target key belongs to a different rotation and is ignored.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return checkpoint.get("after") if checkpoint.get("key_id") == _key_id() else None
+
+
+def save_checkpoint(after, path=ROTATE_CHECKPOINT_PATH):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"key_id": _key_id(), "after": after, "saved_at": time.time()}, f)
+    os.replace(tmp, path)
+
+
+async def rotate_values(pool, workers, values):
+    """
+    rotate_many over the process pool, one slice per worker.
+    """
+    if pool is None:
+        return rotate_many(values)
+    loop = asyncio.get_running_loop()
+    size = -(-len(values) // workers)
+    parts = await asyncio.gather(*(
+        loop.run_in_executor(pool, rotate_many, values[i:i + size])
+        for i in range(0, len(values), size)
+    ))
+    return [v for part in parts for v in part]
+
+
+async def rotate_accounts(page_size=None, workers=None, dry_run=False, restart=False):
+    """
+    Re-encrypts `password` and `latam_password` of every account with the
+    current key (first of ENCRYPTION_KEYS). Pages are read by username (keyset),
+    so memory stays at two pages (the one being re-encrypted and the next one,
+    prefetched meanwhile) whatever the table size. Values already on the current
+    key are left alone, so re-running after a crash or from scratch is safe; the
+    checkpoint only avoids re-reading finished pages.
+
+    Run it while no import is writing passwords: a value changed between the
+    read and the write-back of its page would be overwritten.
+    """
+    if not ENCRYPTION_KEYS:
+        raise ValueError("ENCRYPTION_KEY not found in .env file.")
+    if len(ENCRYPTION_KEYS) < 2:
+        print("Warning: ENCRYPTION_KEYS lists a single key; only values already on it can be read.")
+    page_size = page_size or ROTATE_PAGE_SIZE
+    workers = max(1, workers or ROTATE_WORKERS)
+    repo = get_repository()
+
+    after = None if restart else load_checkpoint()
+    if after is not None:
+        print(f"Resuming after {after} (checkpoint {ROTATE_CHECKPOINT_PATH}).")
+    stats = {"scanned": 0, "rotated": 0, "current": 0, "failed": 0, "written": 0}
+    failed = []
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    started = time.perf_counter()
+    columns = "username," + ",".join(SECRET_FIELDS)
+    next_page = asyncio.create_task(repo.accounts_page(columns, after, page_size))
+    try:
+        while True:
+            page = await next_page
+            if not page:
+                break
+            after = page[-1]["username"]
+            next_page = asyncio.create_task(repo.accounts_page(columns, after, page_size))
+
+            cells = [(row, field) for row in page for field in SECRET_FIELDS if row.get(field)]
+            results = await rotate_values(pool, workers, [row[field] for row, field in cells])
+            changed = {}
+            for (row, field), result in zip(cells, results):
+                if result is None:
+                    stats["current"] += 1
+                elif isinstance(result, Exception):
+                    # Left untouched: neither key opens it (plain text, corrupted or an unknown key)
+                    stats["failed"] += 1
+                    failed.append(f"{row['username']}.{field}")
+                else:
+                    stats["rotated"] += 1
+                    changed.setdefault(row["username"], {"username": row["username"]})[field] = result
+            stats["scanned"] += len(page)
+
+            if not dry_run:
+                # updated_at is not touched: rotation must not reorder the batch queue
+                groups = {}
+                for row in changed.values():
+                    groups.setdefault(tuple(sorted(row)), []).append(row)
+                for group in groups.values():
+                    await repo.upsert_accounts(group)
+                stats["written"] += len(changed)
+                save_checkpoint(after)
+
+            elapsed = time.perf_counter() - started
+            print(f"✅ {stats['scanned']} account(s) scanned, {stats['rotated']} value(s) re-encrypted "
+                  f"({stats['scanned'] / elapsed:.0f} rows/s)...")
+    finally:
+        next_page.cancel()
+        if pool:
+            pool.shutdown()
+
+    elapsed = time.perf_counter() - started
+    print(f"Rotation {'dry run ' if dry_run else ''}complete in {elapsed:.2f}s "
+          f"({stats['scanned'] / elapsed if elapsed else 0:.0f} rows/s, {workers} worker(s)).")
+    print(f"Accounts scanned: {stats['scanned']}")
+    print(f"Values re-encrypted: {stats['rotated']}" + (" (not written)" if dry_run else f" in {stats['written']} account(s)"))
+    print(f"Values already on the current key: {stats['current']}")
+    examples = ", ".join(failed[:FAILED_EXAMPLES]) + (" ..." if len(failed) > FAILED_EXAMPLES else "")
+    print(f"Values no key could decrypt: {stats['failed']}" + (f" ({examples})" if examples else ""))
+    if not dry_run:
+        # Finished: the next run starts from the beginning (and finds nothing to do)
+        if os.path.exists(ROTATE_CHECKPOINT_PATH):
+            os.remove(ROTATE_CHECKPOINT_PATH)
+        if not stats["failed"]:
+            print("All account secrets are on the current key.")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-encrypt account passwords with the first key of ENCRYPTION_KEYS")
+    parser.add_argument("--dry-run", action="store_true", help="Only count what would be re-encrypted")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and scan from the beginning")
+    parser.add_argument("--page-size", type=int, default=None, help=f"Accounts per page (default {ROTATE_PAGE_SIZE})")
+    parser.add_argument("--workers", type=int, default=None, help=f"Encryption processes (default {ROTATE_WORKERS})")
+    args = parser.parse_args()
+
+    async def main():
+        try:
+            await rotate_accounts(args.page_size, args.workers, dry_run=args.dry_run, restart=args.restart)
+        finally:
+            await http_pool.close_all()
+
+    asyncio.run(main())
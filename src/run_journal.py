@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+RUN_JOURNAL_PATH = os.environ.get("RUN_JOURNAL_PATH", "data/run_journal.db")
+
+# States an account cannot leave within a run
+TERMINAL_STATES = ("success", "failed")
+
+
+class RunJournal:
+    """
+    Durable journal of batch runs (SQLite, WAL).
+    Every state transition of every account is recorded, so a run can be resumed
+    after a crash and the report is built from here instead of in-memory lists.
+    record() only appends to a buffer; a background task writes it in batches.
+    """
+
+    def __init__(self, path=RUN_JOURNAL_PATH, flush_interval=0.5, batch_size=100):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                started_at REAL NOT NULL,
+                finished_at REAL,
+                source_run_id TEXT
+            );
+            CREATE TABLE IF NOT EXISTS account_runs (
+                run_id TEXT NOT NULL,
+                username TEXT NOT NULL,
+                adspower_user_id TEXT,
+                state TEXT NOT NULL,
+                outcome TEXT,
+                detail TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (run_id, username)
+            );
+            CREATE TABLE IF NOT EXISTS events (
+                run_id TEXT NOT NULL,
+                username TEXT NOT NULL,
+                state TEXT NOT NULL,
+                outcome TEXT,
+                at REAL NOT NULL
+            );
+        """)
+        self._conn.commit()
+        self.run_id = None
+        self._buffer = []
+        self._flusher = None
+        self._wakeup = None
+
+    # --- Run lifecycle ---
+
+    def start_run(self, accounts, run_id=None, source_run_id=None):
+        """
+        Registers the accounts of a run (state 'queued'). Passing an existing
+        run_id resumes it: accounts already journaled keep their state.
+        """
+        self.run_id = run_id or time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        now = time.time()
+        with self._db_lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO runs (run_id, started_at, source_run_id) VALUES (?, ?, ?)",
+                (self.run_id, now, source_run_id)
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO account_runs (run_id, username, adspower_user_id, state, updated_at) VALUES (?, ?, ?, 'queued', ?)",
+                [(self.run_id, acc['username'], acc.get('adspower_user_id'), now) for acc in accounts]
+            )
+            self._conn.commit()
+        return self.run_id
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """
+        Stops the background writer, flushes what is left and marks the run finished.
+        """
+        if self._flusher:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+        if self.run_id:
+            with self._db_lock:
+                self._conn.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), self.run_id))
+                self._conn.commit()
+
+    # --- Writes (buffered) ---
+
+    def record(self, username, state, outcome=None, detail=None):
+        """
+        Non-blocking: the transition is written by the background flusher.
+        """
+        self._buffer.append((username, state, outcome, detail, time.time()))
+        if self._wakeup and len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Run journal flush failed: {e}")
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        await asyncio.to_thread(self._write, batch)
+
+    def _write(self, batch):
+        with self._db_lock:
+            self._conn.executemany(
+                "INSERT INTO events (run_id, username, state, outcome, at) VALUES (?, ?, ?, ?, ?)",
+                [(self.run_id, u, state, outcome, at) for u, state, outcome, _, at in batch]
+            )
+            self._conn.executemany(
+                """
+                UPDATE account_runs SET
+                    state = ?,
+                    outcome = COALESCE(?, outcome),
+                    detail = COALESCE(?, detail),
+                    attempts = attempts + (CASE WHEN ? = 'running' THEN 1 ELSE 0 END),
+                    updated_at = ?
+                WHERE run_id = ? AND username = ?
+                """,
+                [(state, outcome, detail, state, at, self.run_id, u) for u, state, outcome, detail, at in batch]
+            )
+            self._conn.commit()
+
+    # --- Reads ---
+
+    def latest_run_id(self):
+        with self._db_lock:
+            row = self._conn.execute("SELECT run_id FROM runs ORDER BY started_at DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def pending_usernames(self, run_id):
+        """
+        Accounts of `run_id` that never reached a terminal state (to resume a run).
+        """
+        with self._db_lock:
+            rows = self._conn.execute(
+                f"SELECT username FROM account_runs WHERE run_id = ? AND state NOT IN {TERMINAL_STATES}",
+                (run_id,)
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def failed_usernames(self, run_id):
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT username FROM account_runs WHERE run_id = ? AND state = 'failed'",
+                (run_id,)
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def summary(self, run_id=None):
+        """
+        Final numbers of a run, straight from the journal.
+        """
+        run_id = run_id or self.run_id
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT state, outcome, detail FROM account_runs WHERE run_id = ?",
+                (run_id,)
+            ).fetchall()
+        summary = {"total": len(rows), "success": 0, "failed": 0, "pending": 0, "skipped": 0, "by_outcome": {}, "details": []}
+        for state, outcome, detail in rows:
+            if state == "success":
+                summary["success"] += 1
+            elif state == "skipped":
+                # Handed over to another node (lost lease); not this run's to report
+                summary["skipped"] += 1
+            elif state == "failed":
+                summary["failed"] += 1
+                if detail:
+                    summary["details"].append(detail)
+            else:
+                summary["pending"] += 1
+            if outcome:
+                summary["by_outcome"][outcome] = summary["by_outcome"].get(outcome, 0) + 1
+        return summary
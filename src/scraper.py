@@ -4,12 +4,21 @@ import os
 import time
 import re
 import random
-import httpx
-from playwright.async_api import async_playwright
+import weakref
 from src.adspower import AdsPowerController
-from supabase import create_client, Client
+from src import result_writer
+from src import metrics
+from src import tracing
+from src import resource_blocking
+from src import bandwidth
+from src import screenshots
+from src import token_outbox
+from src import sms_hub
+from src.playwright_runtime import runtime as playwright_runtime
 from dotenv import load_dotenv
 from src.crypto_utils import decrypt_password
+from src.token_store import get_store as get_token_store
+from src.repository import get_repository
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,23 +26,56 @@ logger = logging.getLogger(__name__)
 
 # Persistence Setup
 load_dotenv()
-url: str = os.environ.get("SUPABASE_URL", "")
-key: str = os.environ.get("SUPABASE_KEY", "")
-supabase: Client = create_client(url, key) if url and key else None
 
 TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID")
 
+# Upper bounds for the event-driven waits (seconds)
+LOGIN_OUTCOME_TIMEOUT = float(os.environ.get("LOGIN_OUTCOME_TIMEOUT", "15"))
+RELOAD_SETTLE_TIMEOUT = float(os.environ.get("RELOAD_SETTLE_TIMEOUT", "5"))
+# Overridable so the flow can run against a local stand-in (src/fake_livelo.py)
+LIVELO_HOME_URL = os.environ.get("LIVELO_HOME_URL", "https://www.livelo.com.br/")
+LIVELO_LOGIN_HOST = os.environ.get("LIVELO_LOGIN_HOST", "acesso.livelo.com.br")
+LIVELO_DOMAIN = os.environ.get("LIVELO_DOMAIN", "livelo.com.br")
+
+# Page-state markers (Akamai block page / forced password reset), matched in the page
+# by one compiled regex so only the hits travel over CDP, never the whole HTML
+WAF_MARKERS = ("access denied", "you don't have permission", "edgesuite.net", "reference #", "akamai error", "403 forbidden")
+RESET_MARKERS = ("redefinir senha", "código de autenticação")
+VALID_TITLES = ("livelo", "programa de pontos", "troque seus pontos", "clube livelo")
+_MARKER_PATTERN = "|".join(re.sub(r"[.*+?^${}()|[\]\\]", r"\\\g<0>", m) for m in WAF_MARKERS + RESET_MARKERS)
+# Headers Akamai sets on its own responses (403 block pages)
+_AKAMAI_HEADERS = ("akamai-grn", "x-akamai-request-id", "x-reference-error")
+
+_PAGE_STATE_JS = """(pattern) => {
+    const title = document.title || '';
+    const text = (title + ' ' + (document.body ? document.body.innerText : '')).toLowerCase();
+    const nav = performance.getEntriesByType('navigation')[0];
+    return {
+        title: title,
+        markers: [...new Set(text.match(new RegExp(pattern, 'g')) || [])],
+        html_bytes: nav ? nav.decodedBodySize : 0,
+    };
+}"""
+
+# Same matcher as a wait condition (ends a wait early on a WAF or reset page)
+_BLOCKING_PAGE_JS = """(pattern) => {
+    const text = (document.title + ' ' + (document.body ? document.body.innerText : '')).toLowerCase();
+    return new RegExp(pattern).test(text) || location.href.includes('reset-credentials');
+}"""
+
+# Main-document response (status + headers) per page, filled from network events
+_main_documents = weakref.WeakKeyDictionary()
+
+# Page-state check counters for the report (process-wide, like playwright_runtime.stats())
+_page_check_stats = {"checks": 0, "header_hits": 0, "cdp_bytes": 0, "html_bytes_avoided": 0, "accounts": 0}
+
 
 async def _get_latam_code_from_supabase(start_time):
     """
     Polls Supabase 'sms_logs' table for the LATAM 2FA code.
     This replaces Telegram polling for better reliability.
     """
-    if not supabase:
-        logger.error("Supabase client not initialized. Cannot poll SMS logs.")
-        return None
-
     timeout = 120 # 2 minutes
     poll_start = time.time()
     # Convert start_time (unix) to ISO for Supabase comparison
@@ -44,15 +86,10 @@ async def _get_latam_code_from_supabase(start_time):
     while time.time() - poll_start < timeout:
         try:
             # Query sms_logs for messages since start_time containing 'LATAM'
-            response = supabase.table("sms_logs") \
-                .select("*") \
-                .filter("created_at", "gte", start_iso) \
-                .order("created_at", desc=True) \
-                .limit(1) \
-                .execute()
+            rows = await get_repository().recent_sms(start_iso, limit=1)
             
-            if response.data:
-                msg = response.data[0]
+            if rows:
+                msg = rows[0]
                 text = msg.get("text", "")
                 created_at = msg.get("created_at")
                 
@@ -75,62 +112,215 @@ async def _get_latam_code_from_supabase(start_time):
     return None
 
 
+async def _get_latam_code(start_time, username, phone=None, timeout=120):
+    """
+    Waits for the LATAM 2FA code pushed by webhook_server.py (routed to this
+    account / destination phone). Polls 'sms_logs' only if the webhook server
+    cannot be reached.
+    """
+    started = time.monotonic()
+    try:
+        # Accept codes that arrived shortly before the code screen showed up
+        code = await sms_hub.wait_for_code(phone=phone, account=username, since=start_time - 30, timeout=timeout)
+        if code:
+            logger.info(f"✅ SUCCESS: 2FA code pushed in {time.monotonic() - started:.2f}s")
+        else:
+            logger.warning("Timeout reached without receiving the 2FA code from the webhook.")
+        return code
+    except sms_hub.PushUnavailable as e:
+        logger.warning(f"SMS push unavailable ({e}); falling back to polling Supabase.")
+    code = await _get_latam_code_from_supabase(start_time)
+    if code:
+        sms_hub.CODE_WAIT.observe(time.monotonic() - started, path="db")
+    return code
+
+
 async def save_screenshot(page, name_prefix):
+    """
+    Captures and hands the image to the background writer (prints/<run_id>/).
+    Returns the final path; the file appears shortly after.
+    """
+    return await screenshots.capture(page, name_prefix)
+
+async def update_account_db_multi(username, status, livelo_val=None, latam_val=None, outcome=None, run_id=None):
+    """
+    Queues the account outcome for the buffered bulk writer (no per-account round-trip).
+    No-op when no writer is running (e.g. single-account scripts).
+    """
+    writer = result_writer.default_writer
+    if not writer:
+        return
+    await writer.submit({
+        "username": username,
+        "status": status,
+        "outcome": outcome,
+        "livelo_balance": livelo_val,
+        "latam_balance": latam_val,
+        "run_id": run_id,
+        "checked_at": time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime()),
+    })
+
+def classify_outcome(result):
+    """
+    Maps a get_balance() result to an outcome class used by the limiter and reports.
+    """
+    if result.get('status') == 'success':
+        return "SUCCESS"
+    text = f"{result.get('message', '')} {os.path.basename(result.get('error_screenshot') or '')}"
+    for outcome in ("WAF_BLOCK", "AUTH_FAILED", "RESET_REQUIRED"):
+        if outcome in text:
+            return outcome
+    if "Failed to start AdsPower profile" in text:
+        return "PROFILE_START_FAILED"
+    return "ERROR"
+
+async def _has_token_cookies(context):
+    names = {cookie['name'] for cookie in await context.cookies()}
+    return 'access_token' in names and 'refresh_token' in names
+
+async def _wait_for_token_cookies(context, timeout):
+    """
+    Cookie watcher: returns True as soon as access_token and refresh_token exist.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        try:
+            if await _has_token_cookies(context):
+                return True
+        except Exception:
+            pass
+        if loop.time() >= deadline:
+            return False
+        await asyncio.sleep(0.25)
+
+async def _wait_first(waiters, timeout):
+    """
+    Runs the named waiters concurrently and returns the name of the first one that
+    succeeds (returns something other than False without raising), or None on timeout.
+    """
+    tasks = {asyncio.create_task(coro): name for name, coro in waiters.items()}
+    pending = set(tasks)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    winner = None
     try:
-        os.makedirs("prints", exist_ok=True)
-        filename = f"prints/{name_prefix}.png"
-        await page.screenshot(path=filename)
-        logger.info(f"Screenshot saved to {filename}")
-        return filename
-    except Exception as e:
-        logger.error(f"Failed to save screenshot: {e}")
-        return None
+        while pending and winner is None:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.exception() and task.result() is not False:
+                    winner = tasks[task]
+                    break
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return winner
 
-# Removed update_account_db functionally as requested
+async def _wait_for_login_outcome(page, timeout=None):
+    """
+    Replaces the fixed post-submit sleep: resolves on the first real signal
+    (token cookies, navigation off the login host, WAF/reset page, login error).
+    """
+    timeout = timeout or LOGIN_OUTCOME_TIMEOUT
+    timeout_ms = timeout * 1000
+    started = time.monotonic()
+    signal = await _wait_first({
+        "tokens": _wait_for_token_cookies(page.context, timeout),
+        "navigation": page.wait_for_url(lambda u: LIVELO_LOGIN_HOST not in u, wait_until="domcontentloaded", timeout=timeout_ms),
+        "blocking_page": page.wait_for_function(_BLOCKING_PAGE_JS, arg=_MARKER_PATTERN, polling=500, timeout=timeout_ms),
+        "login_error": page.wait_for_selector(".error-message, #error-message", state="visible", timeout=timeout_ms),
+    }, timeout)
+    logger.info(f"Login outcome signal: {signal or 'timeout'} after {time.monotonic() - started:.1f}s")
+    return signal
 
-async def update_account_db_multi(username, status, livelo_val=None, latam_val=None):
-    # Supabase updates disabled as requested.
-    pass
+def _watch_main_document(page):
+    """
+    Records status and headers of every main-frame document response of `page`.
+    """
+    if page in _main_documents:
+        return
+    _main_documents[page] = None
 
-async def _check_waf_block(page):
+    def on_response(response):
+        try:
+            if response.request.resource_type == "document" and response.frame == page.main_frame:
+                _main_documents[page] = {"status": response.status, "headers": response.headers}
+        except Exception:
+            pass
+
+    page.on("response", on_response)
+
+def _blocked_by_headers(document):
+    """
+    Akamai answers blocked navigations itself: 403/429 with its server or reference headers.
+    """
+    if not document or document["status"] not in (403, 429):
+        return False
+    headers = document["headers"]
+    return "akamai" in headers.get("server", "").lower() or any(h in headers for h in _AKAMAI_HEADERS)
+
+async def _page_state(page):
+    """
+    One in-page evaluate returning the title and the matched markers only.
+    """
+    state = await page.evaluate(_PAGE_STATE_JS, _MARKER_PATTERN)
+    stats = _page_check_stats
+    stats["checks"] += 1
+    # What page.title() + page.content() would have pulled vs what we pulled
+    returned = len(state["title"]) + sum(len(m) for m in state["markers"])
+    stats["cdp_bytes"] += returned
+    stats["html_bytes_avoided"] += max(0, (state.get("html_bytes") or 0) - returned)
+    return state
+
+def page_check_stats():
+    stats = dict(_page_check_stats)
+    stats["avoided_per_account"] = stats["html_bytes_avoided"] // stats["accounts"] if stats["accounts"] else 0
+    return stats
+
+def reset_page_check_stats():
+    for key in _page_check_stats:
+        _page_check_stats[key] = 0
+
+async def _check_waf_block(page, state=None):
     """
     Verifica se a página atual é um bloqueio da Akamai/EdgeSuite.
-    Usa estratégia de Whitelist (Títulos Válidos) vs Blacklist (Termos de Erro).
+    1. Resposta do documento principal (403/429 com cabeçalhos da Akamai) - sem tocar na página.
+    2. Whitelist (Títulos Válidos) vs Blacklist (Termos de Erro), num único evaluate
+       (ou sobre o `state` já lido por _page_state).
     """
     try:
-        title = await page.title()
-        content = await page.content()
-        title_lower = title.lower()
-        content_lower = content.lower()
-        
-        # 1. Whitelist (Prioridade Máxima): Se for um título válido, IGNORA qualquer outra coisa.
-        whitelist_titles = [
-            "livelo", 
-            "programa de pontos", 
-            "troque seus pontos",
-            "clube livelo"
-        ]
-        
-        if any(valid in title_lower for valid in whitelist_titles):
+        if _blocked_by_headers(_main_documents.get(page)):
+            _page_check_stats["header_hits"] += 1
+            logger.warning(f"🚫 BLOQUEIO WAF DETECTADO (HTTP {_main_documents[page]['status']}, Akamai)")
+            return True
+
+        state = state or await _page_state(page)
+        title_lower = state["title"].lower()
+
+        # Whitelist (Prioridade Máxima): Se for um título válido, IGNORA qualquer outra coisa.
+        if any(valid in title_lower for valid in VALID_TITLES):
             return False
 
-        # 2. Blacklist: Se não caiu na whitelist, procura por erros explícitos.
-        block_terms = [
-            "access denied", 
-            "you don't have permission", 
-            "edgesuite.net", 
-            "reference #", 
-            "akamai error",
-            "403 forbidden"
-        ]
-        
-        if any(term in content_lower for term in block_terms) or "access denied" in title_lower:
-            logger.warning(f"🚫 BLOQUEIO WAF DETECTADO: {title}")
+        if any(m in WAF_MARKERS for m in state["markers"]) or "access denied" in title_lower:
+            logger.warning(f"🚫 BLOQUEIO WAF DETECTADO: {state['title']}")
             return True
             
     except: pass
     return False
 
+async def _requires_password_reset(page, state=None):
+    if "reset-credentials" in page.url:
+        return True
+    try:
+        state = state or await _page_state(page)
+        return any(m in RESET_MARKERS for m in state["markers"])
+    except Exception:
+        return False
+
 async def _extract_points(page):
     """
     CORREÇÃO CRÍTICA: Extração Estrita.
@@ -155,91 +345,102 @@ async def perform_login(page, username, password):
         logger.info("Starting Login process...")
         
         # 1. Cookie Banner (Pode bloquear o clique)
-        try:
-            cookie_btn = page.locator("button:has-text('Autorizar'), #cookies-politics-button, .css-g7eayk:has-text('Autorizar')")
-            if await cookie_btn.is_visible(timeout=3000):
-                logger.info("Banner de cookies detectado. Autorizando...")
-                await cookie_btn.click()
-                await asyncio.sleep(1)
-        except: pass
+        with tracing.span("login.cookie_banner"):
+            try:
+                cookie_btn = page.locator("button:has-text('Autorizar'), #cookies-politics-button, .css-g7eayk:has-text('Autorizar')")
+                if await cookie_btn.is_visible(timeout=3000):
+                    logger.info("Banner de cookies detectado. Autorizando...")
+                    await cookie_btn.click()
+                    await asyncio.sleep(1)
+            except: pass
 
         # 2. Garantir que estamos no formulário
-        if not await page.locator("#username").is_visible(timeout=3000):
-            logger.info("Botão de login necessário no cabeçalho...")
-            # O ID #l-header__button_login é o oficial da Livelo para o botão do cabeçalho
-            btn_header = page.locator("#l-header__button_login")
-            if await btn_header.is_visible(timeout=3000):
-                logger.info("Clicando em #l-header__button_login...")
-                await btn_header.click()
-            else:
-                # Fallback apenas se o ID mudar, mas usando texto do botão e não do link
-                logger.info("ID #l-header__button_login não encontrado, tentando 'Fazer login'...")
-                await page.get_by_text("Fazer login").first.click()
+        with tracing.span("login.open_form"):
+            if not await page.locator("#username").is_visible(timeout=3000):
+                logger.info("Botão de login necessário no cabeçalho...")
+                # O ID #l-header__button_login é o oficial da Livelo para o botão do cabeçalho
+                btn_header = page.locator("#l-header__button_login")
+                if await btn_header.is_visible(timeout=3000):
+                    logger.info("Clicando em #l-header__button_login...")
+                    await btn_header.click()
+                else:
+                    # Fallback apenas se o ID mudar, mas usando texto do botão e não do link
+                    logger.info("ID #l-header__button_login não encontrado, tentando 'Fazer login'...")
+                    await page.get_by_text("Fazer login").first.click()
             
-            try: 
-                # Espera carregar a página de login
-                await page.wait_for_selector("#username", state="visible", timeout=15000)
-            except: 
-                logger.warning("Página de login (#username) não apareceu após clique no cabeçalho.")
+                try: 
+                    # Espera carregar a página de login
+                    await page.wait_for_selector("#username", state="visible", timeout=15000)
+                except: 
+                    logger.warning("Página de login (#username) não apareceu após clique no cabeçalho.")
 
         # 2. Preenchimento (Humanizado)
-        logger.info("Filling credentials (Humanized)...")
+        with tracing.span("login.fill_credentials"):
+            logger.info("Filling credentials (Humanized)...")
         
-        # CPF Sanitization Double-Check (Zero Padding)
-        if username.isdigit() and len(username) < 11:
-            username = username.zfill(11)
+            # CPF Sanitization Double-Check (Zero Padding)
+            if username.isdigit() and len(username) < 11:
+                username = username.zfill(11)
             
-        await asyncio.sleep(random.uniform(1.2, 2.5)) # Pause before typing
-        await page.locator("#username").fill("")
-        await page.type("#username", username, delay=random.randint(80, 180))
+            await asyncio.sleep(random.uniform(1.2, 2.5)) # Pause before typing
+            await page.locator("#username").fill("")
+            await page.type("#username", username, delay=random.randint(80, 180))
         
-        await asyncio.sleep(random.uniform(0.5, 1.2)) # Pause before password
-        await page.locator("#password").fill("")
-        await page.type("#password", password, delay=random.randint(60, 150))
-        await asyncio.sleep(0.5)
+            await asyncio.sleep(random.uniform(0.5, 1.2)) # Pause before password
+            await page.locator("#password").fill("")
+            await page.type("#password", password, delay=random.randint(60, 150))
+            await asyncio.sleep(0.5)
         
         # Wait for the submit button to be enabled before clicking
-        submit_btn = page.locator("#btn-submit")
-        try:
-            # Livelo login button has a 'disabled' attribute that is removed when fields are valid
-            await submit_btn.wait_for(state="visible", timeout=5000)
-            # Ensure it's not disabled (Playwright's click() waits for actionable, but being explicit helps)
-            await page.wait_for_function(
-                "selector => !document.querySelector(selector).disabled",
-                arg="#btn-submit",
-                timeout=5000
-            )
-            await submit_btn.click()
-            logger.info("Credentials submitted via #btn-submit. Waiting...")
-        except Exception as click_err:
-            logger.warning(f"Failed to click #btn-submit directly: {click_err}. Falling back to Enter key.")
-            await page.press("#password", "Enter")
+        with tracing.span("login.submit"):
+            submit_btn = page.locator("#btn-submit")
+            try:
+                # Livelo login button has a 'disabled' attribute that is removed when fields are valid
+                await submit_btn.wait_for(state="visible", timeout=5000)
+                # Ensure it's not disabled (Playwright's click() waits for actionable, but being explicit helps)
+                await page.wait_for_function(
+                    "selector => !document.querySelector(selector).disabled",
+                    arg="#btn-submit",
+                    timeout=5000
+                )
+                await submit_btn.click()
+                logger.info("Credentials submitted via #btn-submit. Waiting...")
+            except Exception as click_err:
+                logger.warning(f"Failed to click #btn-submit directly: {click_err}. Falling back to Enter key.")
+                await page.press("#password", "Enter")
         
-        # 3. Wait for redirect/load
-        await asyncio.sleep(10)
+        # 3. Wait for redirect/load (first real signal, bounded)
+        with tracing.span("login.wait_outcome"):
+            await _wait_for_login_outcome(page)
         
         # 4. VALIDAÇÃO PÓS-LOGIN
-        if await _check_waf_block(page):
-            raise Exception("WAF_BLOCK: Access Denied detectado.")
+        with tracing.span("login.validate"):
+            # One evaluate serves both the WAF and the password-reset checks
+            try:
+                state = await _page_state(page)
+            except Exception:
+                state = None
+            if await _check_waf_block(page, state):
+                raise Exception("WAF_BLOCK: Access Denied detectado.")
 
-        # Verificar se caímos na página de redefinição de senha
-        content_lower = (await page.content()).lower()
-        if "redefinir senha" in content_lower or "código de autenticação" in content_lower or "reset-credentials" in page.url:
-             logger.warning(f"⚠️ CONTA BLOQUEADA: {username} exige redefinição de senha.")
-             raise Exception("RESET_REQUIRED: Conta exige redefinição de senha manual.")
+            # Verificar se caímos na página de redefinição de senha
+            if await _requires_password_reset(page, state):
+                 logger.warning(f"⚠️ CONTA BLOQUEADA: {username} exige redefinição de senha.")
+                 raise Exception("RESET_REQUIRED: Conta exige redefinição de senha manual.")
 
-        if await page.locator("#username").is_visible(timeout=2000) or await page.locator("#btn-submit").is_visible(timeout=2000):
-            # Se ainda estiver visível, pode ser erro de credencial ou bloqueio.
-            error_msg = await page.locator(".error-message, #error-message").first.text_content() if await page.locator(".error-message, #error-message").first.is_visible(timeout=1000) else "Desconhecido"
+            if await page.locator("#username").is_visible(timeout=2000) or await page.locator("#btn-submit").is_visible(timeout=2000):
+                # Se ainda estiver visível, pode ser erro de credencial ou bloqueio.
+                error_msg = await page.locator(".error-message, #error-message").first.text_content() if await page.locator(".error-message, #error-message").first.is_visible(timeout=1000) else "Desconhecido"
             
-            # Checar se é erro de credencial explicitamente
-            if "incorret" in error_msg.lower() or "inválid" in error_msg.lower():
-                logger.error(f"❌ AUTH_FAILED: Credenciais incorretas para {username}")
-                await save_screenshot(page, f"AUTH_FAILED_{username}")
-                raise Exception(f"AUTH_FAILED: Usuário ou senha inválidos.")
+                # Checar se é erro de credencial explicitamente
+                if "incorret" in error_msg.lower() or "inválid" in error_msg.lower():
+                    logger.error(f"❌ AUTH_FAILED: Credenciais incorretas para {username}")
+                    await save_screenshot(page, f"AUTH_FAILED_{username}")
+                    raise Exception(f"AUTH_FAILED: Usuário ou senha inválidos.")
             
-            # await save_screenshot(page, f"LOGIN_FAILED_{username}")
-            raise Exception(f"LOGIN FALHOU: Formulário ainda visível. Erro: {error_msg}")
+                # await save_screenshot(page, f"LOGIN_FAILED_{username}")
+                raise Exception(f"LOGIN FALHOU: Formulário ainda visível. Erro: {error_msg}")
+
 
     except Exception as e:
         err_str = str(e)
@@ -267,6 +468,36 @@ async def _ensure_clean_tab(context, page=None):
     await new_page.bring_to_front()
     return new_page
 
+async def deliver_livelo_tokens(username, access_token, refresh_token):
+    """
+    Hands a captured token pair to the Skyvio outbox and remembers it locally for
+    the browserless refresh fast path. Capture is what counts as success: with a
+    running sender the POST happens in the background (batched, retried); without
+    one (standalone scripts) it is attempted once inline and stays queued on failure.
+    """
+    try:
+        await asyncio.to_thread(get_token_store().put, username, access_token, refresh_token)
+    except Exception as store_err:
+        logger.warning(f"Failed to store tokens locally for {username}: {store_err}")
+
+    sender = token_outbox.default_sender
+    # The POST itself runs in the sender, outside this trace: the span covers the hand-off
+    with tracing.span("token_delivery", background=bool(sender)) as span:
+        try:
+            if sender:
+                result = await sender.enqueue(username, access_token, refresh_token)
+                span.set_attribute("outbox", result)
+                logger.info(f"Tokens Livelo de {username} na fila de entrega ({result}).")
+                return True
+            result = await asyncio.to_thread(token_outbox.get_outbox().enqueue, username, access_token, refresh_token)
+            span.set_attribute("outbox", result)
+            if result == "queued":
+                await token_outbox.OutboxSender(token_outbox.get_outbox()).drain_once(usernames={username})
+        except Exception as e:
+            span.set_error(e)
+            logger.error(f'Erro no envio de tokens Livelo para {username}: {e}')
+    return True
+
 async def _send_livelo_tokens(context, username):
     """
     Collects access and refresh tokens from cookies and sends them to Skyvio API.
@@ -285,23 +516,7 @@ async def _send_livelo_tokens(context, username):
         
         if access_token and refresh_token:
             logger.info(f"Fresh tokens found for {username}! Sending to Skyvio...")
-            api_url_tokens_umx_receive = 'https://adm.skyvio.com.br/api/livelo/tokens/receive/'
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    url=api_url_tokens_umx_receive,
-                    json={
-                        "username": username,
-                        "access_token": access_token,
-                        "refresh_token": refresh_token
-                    },
-                    timeout=30.0
-                )
-                if response.status_code == 200:
-                    logger.info(f"✅ Tokens Livelo enviados com sucesso para {username}!")
-                    return True
-                else:
-                    logger.error(f'❌ Erro ao enviar tokens Livelo: {response.status_code}')
-                    logger.error(f'Resposta erro: {response.text}')
+            return await deliver_livelo_tokens(username, access_token, refresh_token)
         else:
             logger.info(f"No access/refresh tokens found in session for {username} yet.")
     except Exception as e:
@@ -313,8 +528,9 @@ async def extract_livelo(context, username, password):
     page = None
     for p in context.pages:
         try:
-            if "livelo.com.br" in p.url:
+            if LIVELO_DOMAIN in p.url:
                 page = p
+                _watch_main_document(page)
                 await page.bring_to_front()
                 try: await p.evaluate("window.stop()")
                 except: pass
@@ -330,7 +546,10 @@ async def extract_livelo(context, username, password):
     try:
         if not page:
             page = await _ensure_clean_tab(context, page)
-            await page.goto("https://www.livelo.com.br/", timeout=60000)
+            _watch_main_document(page)
+            await bandwidth.track(page)
+            with metrics.phase("goto"):
+                await page.goto(LIVELO_HOME_URL, timeout=60000)
         
         if await _check_waf_block(page):
             raise Exception("WAF_BLOCK: Bloqueio inicial detectado.")
@@ -341,11 +560,16 @@ async def extract_livelo(context, username, password):
             logger.info("✅ SUCESSO RÁPIDO (Tokens enviados, já logado)")
             return 0, None
 
-        if "acesso.livelo.com.br" not in page.url:
+        if LIVELO_LOGIN_HOST not in page.url:
             logger.info("Atualizando página para garantir...")
             try: 
                 await page.reload(wait_until="domcontentloaded")
-                await asyncio.sleep(5)
+                # Session restored (tokens), logged-out header or a WAF page, whichever comes first
+                await _wait_first({
+                    "tokens": _wait_for_token_cookies(context, RELOAD_SETTLE_TIMEOUT),
+                    "login_button": page.wait_for_selector("#l-header__button_login", state="visible", timeout=RELOAD_SETTLE_TIMEOUT * 1000),
+                    "blocking_page": page.wait_for_function(_BLOCKING_PAGE_JS, arg=_MARKER_PATTERN, polling=500, timeout=RELOAD_SETTLE_TIMEOUT * 1000),
+                }, RELOAD_SETTLE_TIMEOUT)
             except: pass
             if await _check_waf_block(page): raise Exception("WAF_BLOCK: Bloqueio após recarga")
             
@@ -355,7 +579,11 @@ async def extract_livelo(context, username, password):
                 return 0, None
 
         logger.info("Sessão não encontrada ou tokens não enviados. Iniciando Login...")
-        await perform_login(page, username, password)
+        with metrics.phase("perform_login"):
+            await perform_login(page, username, password)
+        
+        # Navigation can land slightly before the token cookies are written
+        await _wait_for_token_cookies(context, RELOAD_SETTLE_TIMEOUT)
         
         # Send tokens AGAIN after successful login to ensure they are fresh
         token_sent = await _send_livelo_tokens(context, username)
@@ -381,7 +609,7 @@ async def extract_livelo(context, username, password):
             
         return {"livelo": None, "error": err_msg, "screenshot": final_screenshot}
 
-async def perform_latam_login(page, username, password):
+async def perform_latam_login(page, username, password, phone=None):
     """
     Handles LATAM Login with 2-step process and 2FA support.
     """
@@ -430,13 +658,13 @@ async def perform_latam_login(page, username, password):
                     await page.wait_for_selector("#form-input--code-0", timeout=15000)
 
                 if await page.locator("#form-input--code-0").is_visible(timeout=5000):
-                    logger.info("2FA Code Input screen detected. Polling Supabase...")
+                    logger.info("2FA Code Input screen detected. Waiting for the SMS code...")
                     start_time = time.time()
                     
-                    # --- WEBHOOK INTERCEPTION ---
-                    code = await _get_latam_code_from_supabase(start_time)
+                    # --- WEBHOOK PUSH (Supabase polling as fallback) ---
+                    code = await _get_latam_code(start_time, username, phone)
                     if not code:
-                        raise Exception("Failed to retrieve 2FA code from Supabase.")
+                        raise Exception("Failed to retrieve 2FA code.")
                     
                     logger.info(f"Filling 2FA code (Humanized)...")
                     for i, digit in enumerate(code[:6]):
@@ -476,7 +704,7 @@ async def perform_latam_login(page, username, password):
         await save_screenshot(page, f"latam_login_failed_{username}")
         raise e
 
-async def extract_latam(context, username, password):
+async def extract_latam(context, username, password, phone=None):
     """
     Scrapes LATAM Pass Miles with 2FA support.
     """
@@ -509,7 +737,7 @@ async def extract_latam(context, username, password):
             else:
                 await fazer_login_text.click()
 
-            await perform_latam_login(page, username, password)
+            await perform_latam_login(page, username, password, phone)
         else:
             logger.info("Login button not found. Assuming already logged in.")
 
@@ -585,13 +813,41 @@ async def extract_latam(context, username, password):
             logger.info("LATAM tab closed.")
         except: pass
 
-async def get_balance(username, password, adspower_user_id=None, latam_password=None):
-    if not adspower_user_id:
-        return {"status": "error", "message": "Missing adspower_user_id"}
+class PreparedProfile:
+    """
+    An AdsPower profile that is already started, with Playwright attached over CDP
+    and the window sized. Produced by prepare_profile() and consumed by scrape_prepared().
+    """
 
-    # --- OXYLABS STICKY SESSION LOGIC ---
+    def __init__(self, adspower_user_id):
+        self.adspower_user_id = adspower_user_id
+        self.profile_name = None
+        self.proxy_session = None
+        self.proxy_host = None
+        self.ws_endpoint = None
+        self.browser = None
+        self.context = None
+        self.error = None
+        self.prepare_seconds = 0.0
+        # Root span of this account's trace; ended by whoever consumes the profile
+        self.trace = tracing.NOOP_SPAN
+
+    async def close(self):
+        """
+        Detaches from the browser (the shared Playwright driver keeps running).
+        The AdsPower profile itself is stopped by the caller.
+        """
+        if self.browser:
+            try: await self.browser.close()
+            except: pass
+            self.browser = None
+
+async def _rotate_proxy_session(adspower_user_id, details):
+    """
+    --- OXYLABS STICKY SESSION LOGIC ---
+    Sets a fresh Oxylabs session id on the profile proxy. Returns the session id (or None).
+    """
     try:
-        details = await AdsPowerController.get_profile_details(adspower_user_id)
         if details and "user_proxy_config" in details:
             proxy_cfg = details["user_proxy_config"]
             host = proxy_cfg.get("proxy_host", "").lower()
@@ -617,55 +873,125 @@ async def get_balance(username, password, adspower_user_id=None, latam_password=
                     await AdsPowerController.update_proxy_config(adspower_user_id, proxy_cfg)
                     # Brief wait for AdsPower to save
                     await asyncio.sleep(2)
+                    return session_id
     except Exception as proxy_err:
         logger.warning(f"Failed to set sticky session (non-critical): {proxy_err}")
+    return None
 
-    ws_endpoint = await AdsPowerController.start_profile(adspower_user_id)
-    if not ws_endpoint:
-        return {"status": "error", "message": "Failed to start AdsPower profile"}
-    playwright = await async_playwright().start()
+async def _maximize_window(context):
+    # 2. Deep Maximization via CDP
     try:
-        browser = await playwright.chromium.connect_over_cdp(ws_endpoint)
+        # We open a temp page just to ensure we have a "web content" target for the CDP commands
+        # This helps avoid "No web contents in the target" errors
+        temp_page = await context.new_page()
+        session = await temp_page.context.new_cdp_session(temp_page)
         
-        # 1. Force Viewport and Window Optimization
-        # Use an explicit 1080p viewport to ensure rendering matches targets
-        context = browser.contexts[0] if browser.contexts else await browser.new_context(
-            viewport={'width': 1920, 'height': 1080},
-            device_scale_factor=1
-        )
+        # Get the window ID for the current target
+        window_info = await session.send("Browser.getWindowForTarget")
+        window_id = window_info.get("windowId")
+        
+        if window_id:
+            logger.info(f"Forcing window {window_id} to maximized state via CDP...")
+            await session.send("Browser.setWindowBounds", {
+                "windowId": window_id,
+                "bounds": {"windowState": "maximized"}
+            })
+        await temp_page.close()
+    except Exception as cdp_err:
+        logger.warning(f"CDP Maximization failed (non-critical): {cdp_err}")
 
-        # 2. Deep Maximization via CDP
+async def prepare_profile(adspower_user_id):
+    """
+    Startup stage of an account run: proxy session rotation, AdsPower start,
+    CDP attach and window sizing. Never raises; failures are kept in `.error`.
+    """
+    prepared = PreparedProfile(adspower_user_id)
+    # Pre-warm stage opens the account trace itself; get_balance() already has one
+    prepared.trace = tracing.current_span() or tracing.start_span("get_balance", {"profile_id": adspower_user_id})
+    with tracing.activate(prepared.trace), tracing.span("prepare_profile"):
+        started = time.monotonic()
         try:
-            # We open a temp page just to ensure we have a "web content" target for the CDP commands
-            # This helps avoid "No web contents in the target" errors
-            temp_page = await context.new_page()
-            session = await temp_page.context.new_cdp_session(temp_page)
-            
-            # Get the window ID for the current target
-            window_info = await session.send("Browser.getWindowForTarget")
-            window_id = window_info.get("windowId")
-            
-            if window_id:
-                logger.info(f"Forcing window {window_id} to maximized state via CDP...")
-                await session.send("Browser.setWindowBounds", {
-                    "windowId": window_id,
-                    "bounds": {"windowState": "maximized"}
-                })
-            await temp_page.close()
-        except Exception as cdp_err:
-            logger.warning(f"CDP Maximization failed (non-critical): {cdp_err}")
+            details = await AdsPowerController.get_profile_details(adspower_user_id)
+            if details:
+                prepared.profile_name = details.get("name")
+                prepared.proxy_host = (details.get("user_proxy_config") or {}).get("proxy_host") or None
+                prepared.trace.set_attribute("profile_name", prepared.profile_name)
+            with metrics.phase("proxy_rotation"):
+                prepared.proxy_session = await _rotate_proxy_session(adspower_user_id, details)
+            prepared.trace.set_attribute("proxy_session", prepared.proxy_session)
+
+            with metrics.phase("start_profile"):
+                prepared.ws_endpoint = await AdsPowerController.start_profile(adspower_user_id)
+            if not prepared.ws_endpoint:
+                prepared.error = "Failed to start AdsPower profile"
+                return prepared
+
+            with metrics.phase("connect_over_cdp"):
+                prepared.browser = await playwright_runtime.connect_over_cdp(prepared.ws_endpoint)
         
+            # 1. Force Viewport and Window Optimization
+            # Use an explicit 1080p viewport to ensure rendering matches targets
+            prepared.context = prepared.browser.contexts[0] if prepared.browser.contexts else await prepared.browser.new_context(
+                viewport={'width': 1920, 'height': 1080},
+                device_scale_factor=1
+            )
+            with metrics.phase("window_maximize"):
+                await _maximize_window(prepared.context)
+        except Exception as e:
+            logger.error(f"Profile preparation failed for {adspower_user_id}: {e}")
+            prepared.error = str(e)
+        finally:
+            prepared.prepare_seconds = time.monotonic() - started
+    return prepared
+
+async def scrape_prepared(prepared, username, password, latam_password=None, password_encrypted=True, phone=None):
+    """
+    Scraping stage: runs the Livelo flow on an already prepared profile.
+    Passwords come encrypted from the accounts table; the API passes the
+    caller's plain text with `password_encrypted=False`. `phone` (accounts
+    column) routes the LATAM 2FA SMS to this login.
+    """
+    prepared.trace.set_attribute("account", username)
+    if prepared.error:
+        return {"status": "error", "message": prepared.error, "livelo": None}
+    _page_check_stats["accounts"] += 1
+    with tracing.activate(prepared.trace):
+        return await _scrape(prepared, username, password, latam_password, password_encrypted, phone)
+
+async def _scrape(prepared, username, password, latam_password, password_encrypted=True, phone=None):
+    context = prepared.context
+    blocking = None
+    meter = None
+    try:
+        # Abort images/fonts/trackers before the first navigation (proxy bandwidth)
+        try:
+            blocking = await resource_blocking.install(context)
+        except Exception as route_err:
+            logger.warning(f"Resource blocking not installed: {route_err}")
+        # Bytes actually pulled through this account's proxy session
+        try:
+            meter = await bandwidth.BandwidthMeter(
+                context, username, proxy=prepared.proxy_host, session=prepared.proxy_session
+            ).start()
+        except Exception as meter_err:
+            logger.warning(f"Bandwidth meter not started: {meter_err}")
+
         # Decrypt passwords before using them
-        decrypted_pass = decrypt_password(password)
-        decrypted_latam_pass = decrypt_password(latam_password) if latam_password else decrypted_pass
+        if password_encrypted:
+            decrypted_pass = decrypt_password(password)
+            decrypted_latam_pass = decrypt_password(latam_password) if latam_password else decrypted_pass
+        else:
+            decrypted_pass = password
+            decrypted_latam_pass = latam_password or password
 
         # 1. LIVELO
-        result = await extract_livelo(context, username, decrypted_pass)
+        with metrics.phase("extract_livelo"):
+            result = await extract_livelo(context, username, decrypted_pass)
         livelo_balance = result[0] if isinstance(result, tuple) else result.get("livelo") if isinstance(result, dict) else result
         error_screenshot = result[1] if isinstance(result, tuple) else result.get("screenshot") if isinstance(result, dict) else None
 
         # 2. LATAM (TEMPORARILY DEACTIVATED)
-        # latam_result = await extract_latam(context, username, decrypted_latam_pass)
+        # latam_result = await extract_latam(context, username, decrypted_latam_pass, phone)
         # latam_balance = latam_result[0] if isinstance(latam_result, tuple) else latam_result
         # latam_error_screenshot = latam_result[1] if isinstance(latam_result, tuple) else None
         
@@ -697,4 +1023,24 @@ async def get_balance(username, password, adspower_user_id=None, latam_password=
         logger.error(f"Global Scraper Error: {e}")
         return {"status": "error", "message": str(e), "livelo": None}
     finally:
-        if playwright: await playwright.stop()
+        span = tracing.current_span() or tracing.NOOP_SPAN
+        if blocking:
+            logger.info(f"Resource blocking ({blocking.mode}) for {username}: {blocking.summary()}")
+            span.set_attribute("blocked_requests", blocking.blocked)
+        if meter:
+            await meter.stop()
+            logger.info(f"Bandwidth for {username} (session {prepared.proxy_session or '-'}): {meter.summary()}")
+            span.set_attribute("bytes_received", meter.total)
+
+async def get_balance(username, password, adspower_user_id=None, latam_password=None, password_encrypted=True, phone=None):
+    if not adspower_user_id:
+        return {"status": "error", "message": "Missing adspower_user_id"}
+
+    with tracing.trace("get_balance", account=username, profile_id=adspower_user_id) as root:
+        prepared = await prepare_profile(adspower_user_id)
+        try:
+            result = await scrape_prepared(prepared, username, password, latam_password, password_encrypted, phone)
+            root.set_attribute("outcome", classify_outcome(result))
+            return result
+        finally:
+            await prepared.close()
@@ -0,0 +1,180 @@
+import asyncio
+import base64
+import hashlib
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+SCREENSHOT_DIR = os.environ.get("SCREENSHOT_DIR", "prints")
+# jpeg | webp | png (encoded by Chromium during the capture)
+SCREENSHOT_FORMAT = os.environ.get("SCREENSHOT_FORMAT", "jpeg").lower()
+SCREENSHOT_QUALITY = int(os.environ.get("SCREENSHOT_QUALITY", "60"))
+# Oldest files are evicted above this size
+SCREENSHOT_MAX_MB = float(os.environ.get("SCREENSHOT_MAX_MB", "500"))
+SCREENSHOT_QUEUE_MAX = int(os.environ.get("SCREENSHOT_QUEUE_MAX", "50"))
+
+_EXTENSIONS = {"jpeg": "jpg", "webp": "webp", "png": "png"}
+
+# Subfolder of the current run (set by batch_runner / worker)
+run_id = "adhoc"
+
+
+def set_run_id(value):
+    global run_id
+    run_id = value or "adhoc"
+
+
+class ScreenshotWriter:
+    """
+    Background writer for screenshots: the scraping coroutine only captures and
+    enqueues; decoding, deduplication (identical frames become hard links to the
+    first copy), disk writes and oldest-first eviction happen here.
+    """
+
+    def __init__(self, directory=None, max_bytes=None, max_pending=None):
+        self.directory = directory or SCREENSHOT_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else SCREENSHOT_MAX_MB * 1024 * 1024
+        self._queue = asyncio.Queue(maxsize=max_pending or SCREENSHOT_QUEUE_MAX)
+        self._task = None
+        self._files = None  # path -> (mtime, size, inode), loaded on first write
+        self._by_digest = {}
+        self.written = 0
+        self.deduplicated = 0
+        self.evicted = 0
+        self.dropped = 0
+
+    def submit(self, data, path, encoded_base64=False):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        try:
+            self._queue.put_nowait((data, path, encoded_base64))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Screenshot queue full; dropping {path}")
+            return False
+
+    async def close(self):
+        if self._task:
+            await self._queue.put(None)
+            await self._task
+            self._task = None
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            try:
+                await asyncio.to_thread(self._write, *item)
+            except Exception as e:
+                logger.error(f"Failed to write screenshot {item[1]}: {e}")
+
+    def _scan(self):
+        self._files = {}
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                self._files[path] = (st.st_mtime, st.st_size, st.st_ino)
+
+    def _write(self, data, path, encoded_base64):
+        if self._files is None:
+            self._scan()
+        if encoded_base64:
+            data = base64.b64decode(data)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        digest = hashlib.sha1(data).hexdigest()
+        original = self._by_digest.get(digest)
+        if original and os.path.exists(original):
+            try:
+                os.link(original, path)
+                self.deduplicated += 1
+                logger.info(f"Screenshot {path} identical to {original} (linked)")
+            except OSError:
+                original = None
+        if not original or not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(data)
+            self._by_digest[digest] = path
+            self.written += 1
+            logger.info(f"Screenshot saved to {path} ({len(data) // 1024} KB)")
+        st = os.stat(path)
+        self._files[path] = (st.st_mtime, st.st_size, st.st_ino)
+        self._evict()
+
+    def _evict(self):
+        # Hard links share an inode: count their bytes once
+        def used():
+            return sum({inode: size for _, size, inode in self._files.values()}.values())
+
+        total = used()
+        if total <= self.max_bytes:
+            return
+        for path, _ in sorted(self._files.items(), key=lambda kv: kv[1][0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self._files.pop(path, None)
+            self.evicted += 1
+            total = used()
+
+
+_writer = None
+
+
+def _get_writer():
+    global _writer
+    if _writer is None:
+        _writer = ScreenshotWriter()
+    return _writer
+
+
+async def capture(page, name_prefix):
+    """
+    Captures the page (encoded by Chromium in SCREENSHOT_FORMAT) and queues it.
+    Returns the path the file will have, or None if the capture failed.
+    """
+    fmt = SCREENSHOT_FORMAT if SCREENSHOT_FORMAT in _EXTENSIONS else "jpeg"
+    stamp = time.strftime("%Y%m%d-%H%M%S") + f"{int(time.time() * 1000) % 1000:03d}"
+    path = os.path.join(SCREENSHOT_DIR, run_id, f"{name_prefix}_{stamp}.{_EXTENSIONS[fmt]}")
+    try:
+        if fmt == "webp":
+            # Playwright only exposes png/jpeg; Chromium encodes WebP through CDP
+            session = await page.context.new_cdp_session(page)
+            try:
+                shot = await session.send("Page.captureScreenshot", {"format": "webp", "quality": SCREENSHOT_QUALITY})
+            finally:
+                await session.detach()
+            queued = _get_writer().submit(shot["data"], path, encoded_base64=True)
+        elif fmt == "jpeg":
+            queued = _get_writer().submit(await page.screenshot(type="jpeg", quality=SCREENSHOT_QUALITY), path)
+        else:
+            queued = _get_writer().submit(await page.screenshot(type="png"), path)
+    except Exception as e:
+        logger.error(f"Failed to capture screenshot: {e}")
+        return None
+    return path if queued else None
+
+
+async def close():
+    """
+    Writes what is still queued (call on shutdown).
+    """
+    global _writer
+    writer, _writer = _writer, None
+    if writer:
+        await writer.close()
+        logger.info(
+            f"Screenshots: {writer.written} written, {writer.deduplicated} deduplicated, "
+            f"{writer.evicted} evicted, {writer.dropped} dropped."
+        )
@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import deque
+
+from src import http_pool
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+# Where webhook_server.py listens; LATAM logins long-poll its /sms/wait endpoint
+SMS_PUSH_URL = os.environ.get("SMS_PUSH_URL", "http://127.0.0.1:8080")
+# How long a code that nobody was waiting for stays claimable (seconds)
+SMS_CODE_TTL = float(os.environ.get("SMS_CODE_TTL", "180"))
+SMS_PENDING_MAX = int(os.environ.get("SMS_PENDING_MAX", "1000"))
+# Length of one long-poll request; the waiter re-polls until its own deadline
+SMS_LONG_POLL = float(os.environ.get("SMS_LONG_POLL", "25"))
+
+CODE_PATTERN = re.compile(r"(?<!\d)(\d{6})(?!\d)")
+
+CODES_PUBLISHED = metrics.Counter(
+    "umx_sms_codes_total", "2FA SMS received by the webhook, by routing result", labels=("result",)
+)
+CODE_WAIT = metrics.Histogram(
+    "umx_sms_code_wait_seconds", "Time a LATAM login waited for its 2FA code", labels=("path",)
+)
+
+
+class PushUnavailable(Exception):
+    """
+    The webhook server could not be reached; the caller should poll the database.
+    """
+
+
+def extract_code(text):
+    """
+    Six-digit code of a LATAM verification SMS, or None for any other message.
+    """
+    text = text or ""
+    if "LATAM" not in text.upper() and "CÓDIGO" not in text.upper():
+        return None
+    match = CODE_PATTERN.search(text)
+    return match.group(1) if match else None
+
+
+def normalize_phone(number):
+    """
+    Digits only, without country code (last 11 digits: DDD + number), so
+    "+55 (11) 91234-5678" and "11912345678" route to the same waiter.
+    """
+    digits = re.sub(r"\D", "", number or "")
+    return digits[-11:] or None
+
+
+def _routes_to(code, phone, account):
+    if code["phone"] and phone:
+        return code["phone"] == phone
+    if code["account"] and account:
+        return code["account"] == account
+    return False
+
+
+class _Waiter:
+    def __init__(self, phone, account):
+        self.phone = phone
+        self.account = account
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class SmsHub:
+    """
+    In-process pub-sub for 2FA codes (lives in webhook_server.py).
+
+    Each waiting login subscribes with its destination phone and/or account.
+    A published code goes to the oldest matching waiter; a code nobody is
+    waiting for yet stays in a short-lived pending index and is claimed by the
+    first matching subscriber.
+
+    A message without phone/account (forwarder that does not send `to_number`)
+    goes to the oldest waiting login, preferring those without a phone of their
+    own: codes are requested and delivered roughly in order, so this is right
+    far more often than the old "newest code in sms_logs" poll, which handed the
+    same code to every concurrent login. Set `to_number` on the forwarder and
+    `phone` on the accounts to route exactly.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = SMS_CODE_TTL if ttl is None else ttl
+        self._waiters = []
+        self._pending = deque(maxlen=SMS_PENDING_MAX)
+
+    def _expire(self, now):
+        while self._pending and now - self._pending[0]["received_at"] > self.ttl:
+            self._pending.popleft()
+
+    def publish(self, text, to_number=None, account=None, from_number=None):
+        """
+        Routes one incoming SMS. Returns "delivered", "unrouted" (no destination,
+        handed to the oldest waiter), "pending" or "ignored".
+        """
+        code_value = extract_code(text)
+        if not code_value:
+            CODES_PUBLISHED.inc(result="ignored")
+            return "ignored"
+        now = time.time()
+        self._expire(now)
+        code = {
+            "code": code_value,
+            "phone": normalize_phone(to_number),
+            "account": account or None,
+            "from_number": from_number,
+            "received_at": now,
+        }
+        self._waiters = [w for w in self._waiters if not w.future.done()]
+
+        routed = bool(code["phone"] or code["account"])
+        if routed:
+            waiter = next((w for w in self._waiters if _routes_to(code, w.phone, w.account)), None)
+        else:
+            waiter = next((w for w in self._waiters if not w.phone), None) or next(iter(self._waiters), None)
+
+        if waiter:
+            self._waiters.remove(waiter)
+            waiter.future.set_result(code)
+            result = "delivered" if routed else "unrouted"
+            CODES_PUBLISHED.inc(result=result)
+            if routed or not self._waiters:
+                logger.info(f"2FA code routed to {waiter.account or waiter.phone}")
+            else:
+                logger.warning(
+                    f"2FA code without destination phone/account handed to the oldest waiting login "
+                    f"({waiter.account or waiter.phone}); {len(self._waiters)} other(s) still waiting."
+                )
+            return result
+
+        self._pending.append(code)
+        CODES_PUBLISHED.inc(result="pending")
+        return "pending"
+
+    def _claim(self, phone, account, since):
+        """
+        Takes a pending code for this subscriber (newest first). Unrouted codes
+        only stay pending when nobody was waiting, so the first login to come
+        asking takes them.
+        """
+        for code in reversed(self._pending):
+            if code["received_at"] < since:
+                break
+            if _routes_to(code, phone, account) or (not code["phone"] and not code["account"]):
+                self._pending.remove(code)
+                return code
+        return None
+
+    async def subscribe(self, phone=None, account=None, since=None, timeout=120.0):
+        """
+        Waits for the code addressed to `phone` / `account`, received after `since`
+        (unix time). Returns the code dict, or None on timeout.
+        """
+        phone = normalize_phone(phone)
+        since = since if since is not None else time.time()
+        self._expire(time.time())
+        code = self._claim(phone, account, since)
+        if code:
+            return code
+        waiter = _Waiter(phone, account)
+        self._waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(waiter.future, timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        except asyncio.CancelledError:
+            # Client went away right after the code was routed: keep it claimable
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._pending.append(waiter.future.result())
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def stats(self):
+        return {"waiting": len([w for w in self._waiters if not w.future.done()]), "pending": len(self._pending)}
+
+
+async def wait_for_code(phone=None, account=None, since=None, timeout=120.0):
+    """
+    Client side, used by the LATAM login: long-polls the webhook server until the
+    code for this phone/account arrives or `timeout` expires. Returns the code or
+    None; raises PushUnavailable when the server cannot be reached.
+    """
+    started = time.monotonic()
+    since = since if since is not None else time.time()
+    client = http_pool.get_client(SMS_PUSH_URL)
+    while True:
+        remaining = timeout - (time.monotonic() - started)
+        if remaining <= 0:
+            return None
+        window = min(SMS_LONG_POLL, remaining)
+        params = {"since": since, "timeout": window}
+        if phone:
+            params["phone"] = phone
+        if account:
+            params["account"] = account
+        try:
+            response = await client.get(
+                f"{SMS_PUSH_URL.rstrip('/')}/sms/wait", params=params, timeout=window + 10
+            )
+        except Exception as e:
+            raise PushUnavailable(str(e) or type(e).__name__) from e
+        if response.status_code != 200:
+            raise PushUnavailable(f"HTTP {response.status_code}")
+        code = response.json().get("code")
+        if code:
+            CODE_WAIT.observe(time.monotonic() - started, path="push")
+            return code
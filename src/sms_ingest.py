@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+
+from dotenv import load_dotenv
+
+from src import metrics
+from src.repository import get_repository
+from src.result_writer import BatchWriter
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+SMS_FLUSH_SIZE = int(os.environ.get("SMS_FLUSH_SIZE", "200"))
+SMS_FLUSH_INTERVAL = float(os.environ.get("SMS_FLUSH_INTERVAL", "0.5"))
+SMS_QUEUE_MAX = int(os.environ.get("SMS_QUEUE_MAX", "20000"))
+# Recent messages kept in memory for /sms/recent
+SMS_RING_SIZE = int(os.environ.get("SMS_RING_SIZE", "1000"))
+SMS_MAX_RETRIES = int(os.environ.get("SMS_MAX_RETRIES", "5"))
+
+SMS_RECEIVED = metrics.Counter("umx_sms_received_total", "SMS accepted by the webhook")
+SMS_STORED = metrics.Counter("umx_sms_stored_total", "SMS rows handed to storage, by result", labels=("result",))
+SMS_QUEUE_DEPTH = metrics.Gauge("umx_sms_ingest_queue_depth", "SMS waiting to be written to storage")
+SMS_FLUSH_SECONDS = metrics.Histogram(
+    "umx_sms_flush_seconds", "Duration of one batched SMS insert",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+async def _repository_insert(rows):
+    """
+    One bulk insert (single round-trip) into the SMS table.
+    """
+    await get_repository().insert_sms(rows)
+
+
+class SmsIngestor(BatchWriter):
+    """
+    Ingestion path of webhook_server.py /sms.
+    submit() never waits: the message goes into a ring buffer of recent SMS and
+    into a bounded queue that the BatchWriter task writes in batches (every
+    `flush_size` messages or `flush_interval` seconds) through the async
+    repository (src/repository.py), off the request path.
+    """
+
+    label = "SMS"
+
+    def __init__(self, write_batch=None, flush_size=None, flush_interval=None, max_pending=None, ring_size=None):
+        super().__init__(
+            write_batch or _repository_insert,
+            flush_size or SMS_FLUSH_SIZE,
+            flush_interval or SMS_FLUSH_INTERVAL,
+            max_pending or SMS_QUEUE_MAX,
+            max_retries=SMS_MAX_RETRIES,
+            retry_delay=0.5,
+            max_retry_delay=10,
+        )
+        self._recent = deque(maxlen=ring_size or SMS_RING_SIZE)
+        self.received = 0
+        self.overflow = 0
+        SMS_QUEUE_DEPTH.set_function(self._queue.qsize)
+
+    def submit(self, from_number, text, **extra):
+        """
+        Accepts one SMS. Returns False if the storage queue is full (the message
+        is still routed and kept in the recent buffer, only its row is lost).
+        """
+        message = {"from_number": from_number, "text": text, "received_at": time.time(), **extra}
+        self._recent.append(message)
+        self.received += 1
+        SMS_RECEIVED.inc()
+        try:
+            self._queue.put_nowait({"from_number": from_number, "text": text})
+            return True
+        except asyncio.QueueFull:
+            self.overflow += 1
+            SMS_STORED.inc(result="overflow")
+            if self.overflow == 1 or self.overflow % 1000 == 0:
+                logger.error(f"SMS queue full ({self._queue.maxsize}); {self.overflow} message(s) not stored so far")
+            return False
+
+    def recent(self, since=None, limit=50):
+        """
+        Newest first; only messages received at or after `since` (unix time).
+        """
+        found = []
+        for message in reversed(self._recent):
+            if since is not None and message["received_at"] < since:
+                break
+            found.append(message)
+            if len(found) >= limit:
+                break
+        return found
+
+    def _flushed(self, rows, seconds):
+        SMS_FLUSH_SECONDS.observe(seconds)
+        SMS_STORED.inc(len(rows), result="stored")
+        logger.debug(f"SMS flushed: {len(rows)} row(s) in {seconds:.3f}s")
+
+    def _dropped(self, rows):
+        SMS_STORED.inc(len(rows), result="dropped")
+        super()._dropped(rows)
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "stored": self.written,
+            "queued": self._queue.qsize(),
+            "dropped": self.dropped,
+            "overflow": self.overflow,
+            "flushes": self.flushes,
+        }
@@ -2,12 +2,12 @@ import asyncio
 import os
 import sys
 from dotenv import load_dotenv
-from supabase import create_client, Client
 
 # Add project root to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from src.scraper import get_balance
+from src.repository import get_repository
 
 # Load environment variables
 load_dotenv()
@@ -15,27 +15,12 @@ load_dotenv()
 async def main():
     print("=== Livelo Scraper Local Test (Automated) ===")
     
-    # Initialize Supabase
-    url: str = os.environ.get("SUPABASE_URL", "")
-    key: str = os.environ.get("SUPABASE_KEY", "")
-    
-    if not url or not key:
-        print("Error: SUPABASE_URL and SUPABASE_KEY must be set in .env")
-        return
-
-    supabase: Client = create_client(url, key)
-
     # Defina aqui o ID que você quer testar
     TARGET_ADSPOWER_ID = "k17ttaq2"  # Substitua pelo ID desejado
 
     print(f"Buscando conta específica: {TARGET_ADSPOWER_ID}...")
     try:
-        response = supabase.table("accounts")\
-            .select("*")\
-            .eq("adspower_user_id", TARGET_ADSPOWER_ID)\
-            .execute()
-        
-        accounts = response.data
+        accounts = await get_repository().find_accounts(adspower_user_id=TARGET_ADSPOWER_ID)
         
         if not accounts:
             print(f"Error: No accounts found in database with adspower_user_id='{TARGET_ADSPOWER_ID}'.")
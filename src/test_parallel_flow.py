@@ -17,31 +17,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger("TestParallelFlow")
 
-import os
-from supabase import create_client, Client
+from src.repository import get_repository
 from dotenv import load_dotenv
 import random
 
 # Load environment variables
 load_dotenv()
-url: str = os.environ.get("SUPABASE_URL", "")
-key: str = os.environ.get("SUPABASE_KEY", "")
-supabase: Client = create_client(url, key) if url and key else None
 
 async def test_full_flow_parallel():
-    if not supabase:
-        logger.error("Supabase credentials missing. Cannot fetch random accounts.")
-        return
-
     # 1. Busca contas ativas no banco
     logger.info("Buscando contas ativas no Supabase...")
     try:
-        response = supabase.table("accounts")\
-            .select("*")\
-            .eq("status", "active")\
-            .execute()
-        
-        all_accounts = response.data
+        all_accounts = await get_repository().find_accounts(status="active")
         if not all_accounts or len(all_accounts) < 1:
             logger.error(f"Contas insuficientes encontradas ({len(all_accounts)}).")
             return
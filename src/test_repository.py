@@ -0,0 +1,108 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Repository test with an event-loop lag probe: a ticker that should wake every
+# 5 ms records how late it runs while the repository is hammered concurrently.
+# A blocking call anywhere in the data path shows up as a lag spike.
+#
+#   python src/test_repository.py            (SQLite backend, always)
+#   DATA_BACKEND=supabase python src/test_repository.py   (also PostgREST; writes test rows)
+
+tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DATA_SQLITE_PATH", os.path.join(tmp_dir, "local.db"))
+
+from src.repository import SQLiteRepository, SupabaseRepository, DATA_BACKEND
+from src import http_pool
+
+TICK = 0.005
+# Largest acceptable loop stall while queries run (ms)
+LAG_BUDGET_MS = float(os.environ.get("LAG_BUDGET_MS", "50"))
+
+
+class LagProbe:
+    def __init__(self):
+        self.max_lag = 0.0
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + TICK
+            await asyncio.sleep(TICK)
+            self.max_lag = max(self.max_lag, loop.time() - expected)
+
+    def __enter__(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+
+async def workload(repo, prefix):
+    accounts = [
+        {"username": f"{prefix}{i:08d}", "password": "x", "adspower_user_id": f"{prefix}ads{i}", "status": "active", "updated_at": "now()"}
+        for i in range(500)
+    ]
+    await asyncio.gather(*(repo.upsert_accounts(accounts[i:i + 50]) for i in range(0, len(accounts), 50)))
+    await repo.update_account(f"{prefix}00000001", {"adspower_user_id": None})
+    await repo.insert_sms([{"from_number": "LATAM", "text": f"{prefix} LATAM código {100000 + i}"} for i in range(200)])
+
+    lookups = await asyncio.gather(*(
+        repo.find_accounts("username", adspower_user_id=f"{prefix}ads{i}") for i in range(0, 500, 5)
+    ))
+    active = await repo.active_accounts()
+    since = time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime(time.time() - 60))
+    recent = await asyncio.gather(*(repo.recent_sms(since, limit=1) for _ in range(50)))
+    await repo.upsert_results([{"username": a["username"], "status": "success", "outcome": "SUCCESS"} for a in accounts[:100]])
+    return {
+        "lookups_found": sum(1 for rows in lookups if rows),
+        "active": len([a for a in active if a["username"].startswith(prefix)]),
+        "recent_found": sum(1 for rows in recent if rows),
+    }
+
+
+async def check(name, repo, prefix):
+    with LagProbe() as probe:
+        started = time.perf_counter()
+        counts = await workload(repo, prefix)
+        duration = time.perf_counter() - started
+    lag_ms = probe.max_lag * 1000
+    ok = lag_ms <= LAG_BUDGET_MS and counts["lookups_found"] >= 99 and counts["active"] == 500 and counts["recent_found"] == 50
+    print(f"{'✅' if ok else '❌'} {name}: {duration:.2f}s, max loop lag {lag_ms:.1f}ms (budget {LAG_BUDGET_MS}ms), {counts}")
+    return ok
+
+
+async def control():
+    """
+    The probe must catch a real blocking call (otherwise a pass means nothing).
+    """
+    with LagProbe() as probe:
+        await asyncio.sleep(0.02)
+        time.sleep(0.2)
+        await asyncio.sleep(0.02)
+    caught = probe.max_lag * 1000 > LAG_BUDGET_MS
+    print(f"{'✅' if caught else '❌'} control: blocking time.sleep(0.2) seen as {probe.max_lag * 1000:.0f}ms lag")
+    return caught
+
+
+async def main():
+    print("=== Repository / event-loop lag test ===")
+    results = [await control()]
+    sqlite_repo = SQLiteRepository()
+    results.append(await check("sqlite", sqlite_repo, "t"))
+    await sqlite_repo.close()
+    if DATA_BACKEND == "supabase":
+        results.append(await check("supabase", SupabaseRepository(), f"lagtest{int(time.time())}"))
+    await http_pool.close_all()
+    print("✅ SUCCESS" if all(results) else "❌ FAILED")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qs
+
+import jwt
+import uvicorn
+from cryptography.fernet import Fernet
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Local stand-in for the Livelo OAuth endpoint and the Skyvio receiver
+PORT = 8765
+BASE_URL = f"http://127.0.0.1:{PORT}"
+tmp_dir = tempfile.mkdtemp()
+os.environ["LIVELO_TOKEN_URL"] = f"{BASE_URL}/oauth/token"
+os.environ["SKYVIO_TOKENS_URL"] = f"{BASE_URL}/tokens/receive/"
+os.environ["TOKEN_STORE_PATH"] = os.path.join(tmp_dir, "tokens.db")
+os.environ["TOKEN_OUTBOX_PATH"] = os.path.join(tmp_dir, "token_outbox.db")
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+
+from src.token_store import get_store
+from src.token_refresh import refresh_tokens_fast_path
+from src import http_pool
+
+stand_in = FastAPI()
+delivered = []
+
+
+def make_jwt(sub, ttl):
+    return jwt.encode({"sub": sub, "exp": int(time.time()) + ttl}, "stand-in-secret", algorithm="HS256")
+
+
+@stand_in.post("/oauth/token")
+async def oauth_token(request: Request):
+    # Parsed by hand: request.form() would need python-multipart
+    form = {k: v[0] for k, v in parse_qs((await request.body()).decode()).items()}
+    if form.get("grant_type") != "refresh_token" or "revoked" in form.get("refresh_token", ""):
+        return JSONResponse({"error": "invalid_grant"}, status_code=400)
+    claims = jwt.decode(form["refresh_token"], options={"verify_signature": False})
+    return {
+        "access_token": make_jwt(claims["sub"], 3600),
+        "refresh_token": make_jwt(claims["sub"], 86400),
+    }
+
+
+@stand_in.post("/tokens/receive/")
+async def tokens_receive(request: Request):
+    delivered.append((await request.json())["username"])
+    return {"status": "ok"}
+
+
+async def main():
+    print("=== Browserless Token Refresh Test (local stand-in) ===")
+    server = uvicorn.Server(uvicorn.Config(stand_in, host="127.0.0.1", port=PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        await asyncio.sleep(0.1)
+
+    store = get_store()
+    store.put("00000000001", make_jwt("00000000001", -10), make_jwt("00000000001", 86400))   # valid refresh
+    store.put("00000000002", make_jwt("00000000002", -10), make_jwt("00000000002", -10))     # expired refresh
+    accounts = [
+        {"username": "00000000001"},
+        {"username": "00000000002"},
+        {"username": "00000000003"},  # never seen -> needs browser
+    ]
+
+    satisfied = await refresh_tokens_fast_path(accounts)
+    await http_pool.close_all()
+    server.should_exit = True
+
+    print(f"Satisfied without browser: {sorted(satisfied)}")
+    print(f"Delivered to stand-in Skyvio: {delivered}")
+    if satisfied == {"00000000001"} and delivered == ["00000000001"]:
+        print("✅ SUCCESS: Only the account with a valid refresh token skipped the browser.")
+    else:
+        print("❌ FAILED: Unexpected fast path result.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
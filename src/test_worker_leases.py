@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Idle nodes re-check quickly so stolen leases are picked up within the test
+os.environ["WORKER_IDLE_POLL"] = "0.5"
+
+from src.leases import open_lease_store
+from src.worker import run_lease_loop
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(processName)s - %(message)s')
+
+RUN_KEY = "lease-test"
+ACCOUNTS = [{"username": f"{i:011d}"} for i in range(60)]
+TTL = 2.0
+
+
+def worker_process(db_path, node_id, crash_after_claims):
+    """
+    Fake worker: 'processes' each account with a short sleep. The crashing node
+    dies right after its first claim, leaving leases behind to be stolen.
+    """
+    async def main():
+        store = open_lease_store(db_path)
+        claims = 0
+
+        async def process_chunk(chunk, on_finished):
+            nonlocal claims
+            claims += 1
+            if crash_after_claims and claims >= crash_after_claims:
+                print(f"💥 {node_id} crashing while holding {len(chunk)} lease(s)")
+                os._exit(1)
+            await asyncio.sleep(0.05 * len(chunk))
+            for acc in chunk:
+                await on_finished(acc, f"SUCCESS:{node_id}")
+
+        await run_lease_loop(store, RUN_KEY, node_id, ACCOUNTS, process_chunk, claim_size=4, ttl=TTL)
+
+    asyncio.run(main())
+
+
+def main():
+    print("=== Lease-based Worker Test (SQLite stand-in, 4 processes) ===")
+    db_path = os.path.join(tempfile.mkdtemp(), "leases.db")
+    open_lease_store(db_path)  # create schema once
+
+    start = time.time()
+    procs = [
+        multiprocessing.Process(target=worker_process, args=(db_path, f"node-{i}", 1 if i == 0 else 0), name=f"node-{i}")
+        for i in range(4)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    duration = time.time() - start
+
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT username, outcome, attempts FROM account_leases WHERE run_key = ?", (RUN_KEY,)).fetchall()
+    done = [r for r in rows if r[1]]
+    stolen = [r for r in rows if r[2] > 1]
+    per_node = {}
+    for _, outcome, _ in done:
+        node = outcome.split(":")[1]
+        per_node[node] = per_node.get(node, 0) + 1
+
+    print(f"Finished in {duration:.1f}s")
+    print(f"Accounts done: {len(done)}/{len(ACCOUNTS)}")
+    print(f"Per node: {per_node}")
+    print(f"Leases stolen from the crashed node: {len(stolen)}")
+    if len(done) == len(ACCOUNTS) and stolen:
+        print("✅ SUCCESS: Every account processed once; dead node's work was picked up.")
+    else:
+        print("❌ FAILED: Some accounts were not processed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from src import http_pool
+from src import metrics
+from src.crypto_utils import DecryptionError, encrypt_password, decrypt_password
+
+logger = logging.getLogger(__name__)
+
+TOKEN_OUTBOX_PATH = os.environ.get("TOKEN_OUTBOX_PATH", "data/token_outbox.db")
+SKYVIO_TOKENS_URL = os.environ.get("SKYVIO_TOKENS_URL", "https://adm.skyvio.com.br/api/livelo/tokens/receive/")
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", "20"))
+OUTBOX_CONCURRENCY = int(os.environ.get("OUTBOX_CONCURRENCY", "4"))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_POLL_INTERVAL = float(os.environ.get("OUTBOX_POLL_INTERVAL", "5"))
+# How long shutdown keeps trying to drain before leaving rows for the next start
+OUTBOX_DRAIN_TIMEOUT = float(os.environ.get("OUTBOX_DRAIN_TIMEOUT", "60"))
+
+DELIVERIES = metrics.Counter("umx_token_deliveries_total", "Skyvio token deliveries by result", labels=("result",))
+
+
+def _fingerprint(access_token, refresh_token):
+    return hashlib.sha256(f"{access_token}\n{refresh_token}".encode()).hexdigest()
+
+
+async def post_tokens(username, access_token, refresh_token):
+    """
+    One POST to Skyvio. Returns None on success, or the error text.
+    """
+    try:
+        client = http_pool.get_client(SKYVIO_TOKENS_URL)
+        with metrics.phase("token_delivery"):
+            response = await client.post(
+                url=SKYVIO_TOKENS_URL,
+                json={
+                    "username": username,
+                    "access_token": access_token,
+                    "refresh_token": refresh_token
+                },
+                timeout=30.0
+            )
+        if response.status_code == 200:
+            return None
+        return f"HTTP {response.status_code}: {response.text[:200]}"
+    except Exception as e:
+        return str(e) or type(e).__name__
+
+
+class TokenOutbox:
+    """
+    On-disk outbox of token pairs waiting for Skyvio (SQLite/WAL, tokens encrypted
+    with crypto_utils). One row per account: a newer pair replaces an undelivered
+    one, and a pair identical to the last delivered one is not sent again.
+    """
+
+    def __init__(self, path=TOKEN_OUTBOX_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                username TEXT PRIMARY KEY,
+                access_token TEXT NOT NULL,
+                refresh_token TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                enqueued_at REAL NOT NULL,
+                delivered_at REAL,
+                delivered_fingerprint TEXT
+            )
+        """)
+        self._conn.commit()
+
+    def enqueue(self, username, access_token, refresh_token):
+        """
+        Returns "queued", or "unchanged" when this exact pair was already delivered.
+        """
+        fingerprint = _fingerprint(access_token, refresh_token)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT delivered_fingerprint FROM outbox WHERE username = ?", (username,)
+            ).fetchone()
+            if row and row[0] == fingerprint:
+                return "unchanged"
+            self._conn.execute(
+                """
+                INSERT INTO outbox (username, access_token, refresh_token, fingerprint, state, attempts, next_attempt_at, enqueued_at)
+                VALUES (?, ?, ?, ?, 'pending', 0, ?, ?)
+                ON CONFLICT(username) DO UPDATE SET
+                    access_token = excluded.access_token,
+                    refresh_token = excluded.refresh_token,
+                    fingerprint = excluded.fingerprint,
+                    state = 'pending',
+                    attempts = 0,
+                    next_attempt_at = excluded.next_attempt_at,
+                    last_error = NULL,
+                    enqueued_at = excluded.enqueued_at
+                """,
+                (username, encrypt_password(access_token), encrypt_password(refresh_token), fingerprint, now, now)
+            )
+            self._conn.commit()
+        return "queued"
+
+    def due(self, limit, usernames=None):
+        query = (
+            "SELECT username, access_token, refresh_token, fingerprint, attempts FROM outbox "
+            "WHERE state = 'pending' AND next_attempt_at <= ?"
+        )
+        params = [time.time()]
+        if usernames:
+            query += f" AND username IN ({','.join('?' * len(usernames))})"
+            params.extend(usernames)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY next_attempt_at LIMIT ?", params + [limit]).fetchall()
+        due = []
+        for r in rows:
+            try:
+                access_token, refresh_token = decrypt_password(r[1]), decrypt_password(r[2])
+            except DecryptionError as e:
+                # Encrypted under a key no longer configured: park it instead of retrying forever
+                logger.error(f"Outbox tokens for {r[0]} cannot be decrypted; marking as failed.")
+                self.mark_failed(r[0], r[3], OUTBOX_MAX_ATTEMPTS, str(e), 0)
+                continue
+            due.append({
+                "username": r[0],
+                "access_token": access_token,
+                "refresh_token": refresh_token,
+                "fingerprint": r[3],
+                "attempts": r[4],
+            })
+        return due
+
+    def mark_delivered(self, username, fingerprint):
+        with self._lock:
+            # A newer pair may have been enqueued meanwhile: only settle the one we sent
+            self._conn.execute(
+                "UPDATE outbox SET state = 'delivered', delivered_at = ?, delivered_fingerprint = ?, last_error = NULL "
+                "WHERE username = ? AND fingerprint = ?",
+                (time.time(), fingerprint, username, fingerprint)
+            )
+            self._conn.commit()
+
+    def mark_failed(self, username, fingerprint, attempts, error, retry_in):
+        state = "failed" if attempts >= OUTBOX_MAX_ATTEMPTS else "pending"
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET state = ?, attempts = ?, next_attempt_at = ?, last_error = ? "
+                "WHERE username = ? AND fingerprint = ?",
+                (state, attempts, time.time() + retry_in, error, username, fingerprint)
+            )
+            self._conn.commit()
+        return state
+
+    def requeue_failed(self):
+        """
+        Gives rows that exhausted their attempts in a previous process one more round.
+        """
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE outbox SET state = 'pending', attempts = 0, next_attempt_at = ? WHERE state = 'failed'",
+                (time.time(),)
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM outbox GROUP BY state").fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class OutboxSender:
+    """
+    Background sender: drains due rows in batches (OUTBOX_CONCURRENCY parallel
+    POSTs over the pooled client), retries failures with exponential backoff and
+    jitter, and wakes up immediately when something is enqueued.
+    """
+
+    def __init__(self, outbox, post=None, batch_size=None, concurrency=None, poll_interval=None):
+        self.outbox = outbox
+        self.post = post or post_tokens
+        self.batch_size = batch_size or OUTBOX_BATCH_SIZE
+        self.concurrency = concurrency or OUTBOX_CONCURRENCY
+        self.poll_interval = poll_interval or OUTBOX_POLL_INTERVAL
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task = None
+        self.stats = {"queued": 0, "unchanged": 0, "delivered": 0, "retries": 0, "failed": 0}
+
+    async def start(self):
+        requeued = await asyncio.to_thread(self.outbox.requeue_failed)
+        if requeued:
+            logger.info(f"Token outbox: {requeued} previously failed delivery(ies) queued again.")
+        self._task = asyncio.create_task(self._run())
+
+    async def enqueue(self, username, access_token, refresh_token):
+        # SQLite write + encryption off the event loop
+        result = await asyncio.to_thread(self.outbox.enqueue, username, access_token, refresh_token)
+        self.stats[result] += 1
+        if result == "unchanged":
+            DELIVERIES.inc(result="unchanged")
+        self._wake.set()
+        return result
+
+    async def _run(self):
+        while True:
+            try:
+                delivered_any = await self.drain_once()
+            except Exception as e:
+                # A broken outbox read must not end the sender: log, back off, try again
+                logger.error(f"Token outbox: drain failed: {e}")
+                if self._stopping:
+                    return
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if self._stopping and not delivered_any:
+                return
+            if not delivered_any:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def drain_once(self, usernames=None):
+        """
+        Sends one batch of due rows. Returns how many were attempted.
+        """
+        rows = await asyncio.to_thread(self.outbox.due, self.batch_size, usernames)
+        if not rows:
+            return 0
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(row):
+            async with semaphore:
+                error = await self.post(row["username"], row["access_token"], row["refresh_token"])
+            if error is None:
+                await asyncio.to_thread(self.outbox.mark_delivered, row["username"], row["fingerprint"])
+                self.stats["delivered"] += 1
+                DELIVERIES.inc(result="delivered")
+                logger.info(f"✅ Tokens Livelo enviados com sucesso para {row['username']}!")
+                return
+            attempts = row["attempts"] + 1
+            retry_in = min(2 ** attempts, 600) * random.uniform(0.8, 1.2)
+            state = await asyncio.to_thread(
+                self.outbox.mark_failed, row["username"], row["fingerprint"], attempts, error, retry_in
+            )
+            if state == "failed":
+                self.stats["failed"] += 1
+                DELIVERIES.inc(result="failed")
+                logger.error(f"❌ Entrega de tokens para {row['username']} desistida após {attempts} tentativas: {error}")
+            else:
+                self.stats["retries"] += 1
+                DELIVERIES.inc(result="retry")
+                logger.warning(f"Token delivery for {row['username']} failed (attempt {attempts}), retry in {retry_in:.0f}s: {error}")
+
+        await asyncio.gather(*(send(row) for row in rows))
+        return len(rows)
+
+    async def close(self, timeout=None):
+        """
+        Keeps draining up to `timeout` seconds; whatever is left stays on disk.
+        """
+        if not self._task:
+            return
+        self._stopping = True
+        self._wake.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=OUTBOX_DRAIN_TIMEOUT if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Token outbox not fully drained; remaining deliveries resume on next start.")
+        self._task = None
+
+    def summary(self):
+        counts = self.outbox.counts()
+        return {**self.stats, "pending": counts.get("pending", 0)}
+
+    def reset_stats(self):
+        self.stats = dict.fromkeys(self.stats, 0)
+
+
+_outbox = None
+# Sender used by scraper.deliver_livelo_tokens while a batch/worker/API is running
+default_sender = None
+
+
+def get_outbox():
+    global _outbox
+    if _outbox is None:
+        _outbox = TokenOutbox()
+    return _outbox
+
+
+async def start_default_sender(**kwargs):
+    global default_sender
+    default_sender = OutboxSender(get_outbox(), **kwargs)
+    await default_sender.start()
+    return default_sender
+
+
+async def stop_default_sender():
+    global default_sender
+    sender, default_sender = default_sender, None
+    if sender:
+        await sender.close()
+        logger.info(f"Token outbox closed: {sender.summary()}")
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import os
+
+from src import http_pool
+from src.scraper import deliver_livelo_tokens
+from src.token_store import get_store, is_expired
+
+logger = logging.getLogger(__name__)
+
+# OAuth refresh endpoint used by the Livelo web app (fast path is disabled when unset)
+LIVELO_TOKEN_URL = os.environ.get("LIVELO_TOKEN_URL", "")
+LIVELO_CLIENT_ID = os.environ.get("LIVELO_CLIENT_ID", "")
+# Parallel refresh exchanges (plain HTTP, no browser)
+TOKEN_REFRESH_CONCURRENCY = int(os.environ.get("TOKEN_REFRESH_CONCURRENCY", "10"))
+
+
+async def refresh_account_tokens(username):
+    """
+    Browserless refresh: exchanges the last known refresh_token for a new pair
+    and delivers it to Skyvio. Returns True if the account needs no browser.
+    """
+    tokens = get_store().get(username)
+    if not tokens:
+        return False
+    if is_expired(tokens["refresh_token"], margin=60):
+        logger.info(f"Refresh token expired for {username}. Browser login required.")
+        return False
+
+    payload = {
+        "grant_type": "refresh_token",
+        "refresh_token": tokens["refresh_token"],
+    }
+    if LIVELO_CLIENT_ID:
+        payload["client_id"] = LIVELO_CLIENT_ID
+    try:
+        client = http_pool.get_client(LIVELO_TOKEN_URL)
+        resp = await client.post(LIVELO_TOKEN_URL, data=payload, timeout=20)
+        if resp.status_code != 200:
+            logger.info(f"Refresh exchange rejected for {username}: {resp.status_code}")
+            return False
+        data = resp.json()
+    except Exception as e:
+        logger.warning(f"Refresh exchange failed for {username}: {e}")
+        return False
+
+    access_token = data.get("access_token")
+    # Some servers rotate the refresh token, others keep the current one
+    refresh_token = data.get("refresh_token") or tokens["refresh_token"]
+    if not access_token:
+        return False
+
+    return await deliver_livelo_tokens(username, access_token, refresh_token)
+
+
+async def refresh_tokens_fast_path(accounts, concurrency=None):
+    """
+    Pre-stage of run_batch. Returns the set of usernames satisfied without a browser.
+    """
+    if not LIVELO_TOKEN_URL:
+        logger.info("LIVELO_TOKEN_URL not set. Browserless refresh disabled.")
+        return set()
+
+    semaphore = asyncio.Semaphore(concurrency or TOKEN_REFRESH_CONCURRENCY)
+    satisfied = set()
+
+    async def refresh(account):
+        async with semaphore:
+            if await refresh_account_tokens(account['username']):
+                satisfied.add(account['username'])
+
+    await asyncio.gather(*(refresh(acc) for acc in accounts))
+    logger.info(f"Browserless refresh: {len(satisfied)}/{len(accounts)} accounts satisfied without AdsPower.")
+    return satisfied
@@ -0,0 +1,134 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import jwt
+
+from src.crypto_utils import DecryptionError, encrypt_password, decrypt_password
+
+logger = logging.getLogger(__name__)
+
+TOKEN_STORE_PATH = os.environ.get("TOKEN_STORE_PATH", "data/tokens.db")
+
+
+def jwt_expiry(token):
+    """
+    Reads the `exp` claim of a JWT locally (no signature check).
+    Returns a unix timestamp, or None if the token is not a JWT / has no exp.
+    """
+    if not token:
+        return None
+    try:
+        claims = jwt.decode(token, options={"verify_signature": False, "verify_exp": False})
+        exp = claims.get("exp")
+        return int(exp) if exp is not None else None
+    except Exception:
+        return None
+
+
+def is_expired(token, margin=0):
+    """
+    True if the JWT expires within `margin` seconds. Opaque tokens are never considered expired.
+    """
+    exp = jwt_expiry(token)
+    return exp is not None and exp - margin <= time.time()
+
+
+class TokenStore:
+    """
+    Last known Livelo tokens per account, encrypted at rest with crypto_utils.
+    Local SQLite file (WAL) so it survives restarts without touching Supabase.
+    """
+
+    def __init__(self, path=TOKEN_STORE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS tokens (
+                username TEXT PRIMARY KEY,
+                access_token TEXT NOT NULL,
+                refresh_token TEXT NOT NULL,
+                access_exp INTEGER,
+                refresh_exp INTEGER,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, username):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT access_token, refresh_token, access_exp, refresh_exp, updated_at FROM tokens WHERE username = ?",
+                (username,)
+            ).fetchone()
+        if not row:
+            return None
+        try:
+            access_token, refresh_token = decrypt_password(row[0]), decrypt_password(row[1])
+        except DecryptionError:
+            # Stored under a key no longer configured: the next browser login replaces it
+            logger.warning(f"Stored tokens for {username} cannot be decrypted; ignoring them.")
+            return None
+        return {
+            "access_token": access_token,
+            "refresh_token": refresh_token,
+            "access_exp": row[2],
+            "refresh_exp": row[3],
+            "updated_at": row[4],
+        }
+
+    def put(self, username, access_token, refresh_token):
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO tokens (username, access_token, refresh_token, access_exp, refresh_exp, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(username) DO UPDATE SET
+                    access_token = excluded.access_token,
+                    refresh_token = excluded.refresh_token,
+                    access_exp = excluded.access_exp,
+                    refresh_exp = excluded.refresh_exp,
+                    updated_at = excluded.updated_at
+                """,
+                (
+                    username,
+                    encrypt_password(access_token),
+                    encrypt_password(refresh_token),
+                    jwt_expiry(access_token),
+                    jwt_expiry(refresh_token),
+                    time.time(),
+                )
+            )
+            self._conn.commit()
+
+    def expiries(self):
+        """
+        {username: (access_exp, refresh_exp, updated_at)} for every stored account,
+        read from the plain columns (nothing is decrypted).
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT username, access_exp, refresh_exp, updated_at FROM tokens").fetchall()
+        return {r[0]: (r[1], r[2], r[3]) for r in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store = None
+
+
+def get_store():
+    """
+    Process-wide TokenStore (opened on first use).
+    """
+    global _store
+    if _store is None:
+        _store = TokenStore()
+    return _store
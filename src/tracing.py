@@ -0,0 +1,241 @@
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Fraction of account runs that are traced (0 disables tracing)
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0"))
+# JSON-lines file, or an OTLP/HTTP collector URL (e.g. http://127.0.0.1:4318/v1/traces)
+TRACE_EXPORT = os.environ.get("TRACE_EXPORT", "data/traces.jsonl")
+SERVICE_NAME = os.environ.get("TRACE_SERVICE_NAME", "umx-scraper")
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class _NoopSpan:
+    """
+    Returned for unsampled runs: every operation is a no-op, so instrumentation costs nothing.
+    """
+    sampled = False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_error(self, message):
+        pass
+
+    def end(self, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    sampled = True
+
+    def __init__(self, name, trace, parent=None, attributes=None):
+        self.name = name
+        self.trace = trace
+        self.trace_id = trace["trace_id"]
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent.span_id if parent else ""
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set_attribute(self, key, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_error(self, message):
+        self.error = str(message)[:500]
+
+    def end(self, **attributes):
+        if self.end_ns is not None:
+            return
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+        self.end_ns = time.time_ns()
+        self.trace["spans"].append(self)
+        if not self.parent_span_id:
+            # Root finished: the whole account trace goes out as one line
+            _exporter.submit(self.trace["spans"])
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+def current_span():
+    return _current.get()
+
+
+def start_span(name, attributes=None, parent=None):
+    """
+    Starts a span without activating it. Without a parent this is a new root
+    (one per account run) and the sampling decision is taken here.
+    """
+    parent = parent if parent is not None else _current.get()
+    if parent is None:
+        if TRACE_SAMPLE_RATE <= 0 or random.random() >= TRACE_SAMPLE_RATE:
+            return NOOP_SPAN
+        return Span(name, {"trace_id": os.urandom(16).hex(), "spans": []}, attributes=attributes)
+    if not parent.sampled:
+        return NOOP_SPAN
+    return Span(name, parent.trace, parent=parent, attributes=attributes)
+
+
+@contextmanager
+def activate(span):
+    """
+    Makes `span` the parent of spans opened inside the block (e.g. across pipeline stages).
+    """
+    token = _current.set(span)
+    try:
+        yield span
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def _activated(new_span):
+    token = _current.set(new_span)
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.set_error(e)
+        raise
+    finally:
+        _current.reset(token)
+        new_span.end()
+
+
+def span(name, **attributes):
+    """
+    Child span of the current one, active for the block; exceptions mark it as error.
+    Outside of a trace it records nothing.
+    """
+    return _activated(start_span(name, attributes, parent=_current.get() or NOOP_SPAN))
+
+
+@contextmanager
+def trace(name, **attributes):
+    """
+    Root span of an account run. When a trace is already active (e.g. the batch
+    opened it) the block joins it and only adds the attributes.
+    """
+    current = _current.get()
+    if current is not None:
+        for key, value in attributes.items():
+            current.set_attribute(key, value)
+        yield current
+        return
+    with _activated(start_span(name, attributes)) as root:
+        yield root
+
+
+class _Exporter:
+    """
+    Background thread writing finished traces as OTLP/JSON (one resourceSpans
+    document per line) to a file or POSTing them to a collector.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=10000)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, spans):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait([s.to_otlp() for s in spans])
+        except queue.Full:
+            logger.warning("Trace export queue full; dropping trace.")
+
+    def _document(self, spans):
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": "umx-scraper"}, "spans": spans}],
+            }]
+        }
+
+    def _write(self, batch):
+        if TRACE_EXPORT.startswith(("http://", "https://")):
+            import httpx
+            for spans in batch:
+                httpx.post(TRACE_EXPORT, json=self._document(spans), timeout=10)
+        else:
+            if os.path.dirname(TRACE_EXPORT):
+                os.makedirs(os.path.dirname(TRACE_EXPORT), exist_ok=True)
+            with open(TRACE_EXPORT, "a", encoding="utf-8") as f:
+                for spans in batch:
+                    f.write(json.dumps(self._document(spans), ensure_ascii=False) + "\n")
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = [item] if item is not None else []
+            while not self._queue.empty():
+                extra = self._queue.get_nowait()
+                if extra is None:
+                    item = None
+                else:
+                    batch.append(extra)
+            try:
+                if batch:
+                    self._write(batch)
+            except Exception as e:
+                logger.error(f"Trace export failed: {e}")
+            if item is None:
+                return
+
+    def flush(self, timeout=10):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            self._queue.put(None)
+            thread.join(timeout)
+
+
+_exporter = _Exporter()
+
+
+def shutdown():
+    """
+    Writes pending traces (call on process shutdown).
+    """
+    _exporter.flush()
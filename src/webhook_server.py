@@ -1,44 +1,89 @@
+import sys
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
 import uvicorn
 import os
 import re
-from supabase import create_client, Client
 from dotenv import load_dotenv
 
+# Add project root to path to allow 'from src...' imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import http_pool
+from src import metrics
+from src.sms_hub import SmsHub
+from src.sms_ingest import SmsIngestor
+
 # Carregar configurações
 load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-app = FastAPI()
+# Codes are pushed to the LATAM logins waiting on /sms/wait (see src/sms_hub.py)
+hub = SmsHub()
+# Rows go to the sms_logs table in batches, off the request path (see src/sms_ingest.py)
+ingestor = SmsIngestor()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await ingestor.start()
+    yield
+    # Shutdown: write what is still queued, then release pooled HTTP connections
+    await ingestor.close()
+    await http_pool.close_all()
+
+
+app = FastAPI(lifespan=lifespan)
 
 @app.get("/")
 async def root():
-    return {"status": "online", "message": "Servidor de SMS pronto!"}
+    return {"status": "online", "message": "Servidor de SMS pronto!", **hub.stats(), **ingestor.stats()}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.post("/sms")
 async def receive_sms(request: Request):
     try:
         # Recebe os dados do App Android
         data = await request.json()
-        print(f"\n📩 SMS RECEBIDO: {data}")
         
         from_number = data.get("from_number", "Desconhecido")
         text = data.get("text", "")
+        # Destination SIM / account, when the forwarder app sends them (used for routing)
+        to_number = data.get("to_number") or data.get("phone")
+        account = data.get("account")
+
+        # Entrega imediata a quem está esperando o código (antes de gravar no banco)
+        routed = hub.publish(text, to_number=to_number, account=account, from_number=from_number)
+        if routed != "ignored":
+            print(f"🔑 Código 2FA: {routed}")
         
-        # Salva no Supabase
-        res = supabase.table("sms_logs").insert({
-            "from_number": from_number,
-            "text": text
-        }).execute()
-        
-        print(f"✅ Salvo no Supabase com sucesso!")
+        # Salva no Supabase em lote (em segundo plano; a resposta não espera o banco)
+        ingestor.submit(from_number, text, to_number=to_number, account=account)
         return {"status": "success"}
         
     except Exception as e:
         print(f"❌ Erro ao processar SMS: {e}")
-        return {"status": "error", "message": str(e)}, 400
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=400)
+
+@app.get("/sms/recent")
+async def recent_sms(since: float = None, limit: int = 50):
+    """
+    Most recent SMS received by this server (newest first), from memory.
+    """
+    return {"messages": ingestor.recent(since=since, limit=min(limit, 500))}
+
+@app.get("/sms/wait")
+async def wait_sms_code(phone: str = None, account: str = None, since: float = None, timeout: float = 25.0):
+    """
+    Long-poll used by the LATAM login: answers as soon as the code for this
+    phone/account arrives (or with code=null after `timeout` seconds).
+    """
+    code = await hub.subscribe(phone=phone, account=account, since=since, timeout=min(timeout, 60.0))
+    if not code:
+        return {"code": None}
+    return {"code": code["code"], "received_at": code["received_at"]}
 
 if __name__ == "__main__":
     # Roda o servidor na porta 8080
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import os
+import socket
+import sys
+import time
+import uuid
+from datetime import datetime
+
+# Add project root to path to allow 'from src...' imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.leases import open_lease_store
+
+logger = logging.getLogger("Worker")
+
+# Lease settings
+LEASE_TTL = float(os.environ.get("LEASE_TTL", "600"))  # seconds without heartbeat before others steal it
+WORKER_CLAIM_SIZE = int(os.environ.get("WORKER_CLAIM_SIZE", "4"))
+WORKER_IDLE_POLL = float(os.environ.get("WORKER_IDLE_POLL", "15"))
+
+# Outcomes that say nothing about the account itself: give it back for another node
+RETRYABLE_OUTCOMES = {"PROFILE_START_FAILED"}
+
+
+def default_node_id():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:4]}"
+
+
+async def run_lease_loop(store, run_key, node_id, accounts, process_chunk, claim_size=None, ttl=None,
+                         backlog=None, wait_progress=None, on_lost=None):
+    """
+    Claims accounts via leases and hands them to `process_chunk(chunk, on_finished)`,
+    which only queues them (BatchExecutor.submit). Claims run ahead: a new chunk is
+    taken whenever `backlog()` (claimed accounts not started yet) drops below the
+    claim size, so the pipeline never runs dry between chunks.
+    A heartbeat renews every held lease each ttl/3 and reports the ones another node
+    took over to `on_lost(usernames)`; expired leases of dead nodes are claimed by
+    whoever asks next. Returns when nothing claimable is left and every claimed
+    account has finished.
+    """
+    claim_size = claim_size or WORKER_CLAIM_SIZE
+    ttl = ttl or LEASE_TTL
+    by_username = {acc['username']: acc for acc in accounts}
+    held = set()
+    changed = asyncio.Event()
+    backlog = backlog or (lambda: len(held))
+
+    async def wait_for_change(timeout):
+        if wait_progress:
+            await wait_progress(timeout)
+            return
+        changed.clear()
+        try:
+            await asyncio.wait_for(changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    await asyncio.to_thread(store.seed, run_key, list(by_username))
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(ttl / 3)
+            if not held:
+                continue
+            try:
+                still_ours = await asyncio.to_thread(store.renew, run_key, node_id, set(held), ttl)
+                lost = held - still_ours
+                if lost:
+                    logger.warning(f"[{node_id}] Lost lease on {len(lost)} account(s): {sorted(lost)}")
+                    held.difference_update(lost)
+                    if on_lost:
+                        on_lost(lost)
+            except Exception as e:
+                logger.error(f"[{node_id}] Lease heartbeat failed: {e}")
+
+    async def on_finished(account, outcome):
+        username = account['username']
+        held.discard(username)
+        changed.set()
+        done = outcome not in RETRYABLE_OUTCOMES
+        await asyncio.to_thread(store.release, run_key, node_id, username, outcome, done)
+
+    processed = 0
+    heartbeat_task = asyncio.create_task(heartbeat())
+    try:
+        while True:
+            if backlog() >= claim_size:
+                await wait_for_change(WORKER_IDLE_POLL)
+                continue
+            claimed = await asyncio.to_thread(store.claim, run_key, node_id, claim_size - backlog(), ttl)
+            if not claimed:
+                progress = await asyncio.to_thread(store.progress, run_key)
+                if progress["open"] == 0 and not held:
+                    logger.info(f"[{node_id}] Nothing left to claim ({progress}).")
+                    break
+                # Ours still running, or other nodes hold the rest: wait in case one of them dies
+                await wait_for_change(WORKER_IDLE_POLL)
+                continue
+
+            held.update(claimed)
+            chunk = [by_username[u] for u in claimed if u in by_username]
+            unknown = [u for u in claimed if u not in by_username]
+            for username in unknown:
+                # Seeded by another node but not active here anymore
+                await on_finished({"username": username}, "SKIPPED")
+            logger.info(f"[{node_id}] Claimed {len(chunk)} account(s) ({len(held)} held).")
+            await process_chunk(chunk, on_finished)
+            processed += len(chunk)
+    finally:
+        heartbeat_task.cancel()
+        await asyncio.gather(heartbeat_task, return_exceptions=True)
+    return processed
+
+
+async def run_worker(run_key=None, node_id=None, concurrency_limit=1, max_concurrency=None):
+    """
+    Worker mode of batch_runner: this node processes whatever it can claim from
+    the shared lease table, with its own AdsPower, journal and report.
+    """
+    from src import batch_runner
+    from src import http_pool
+    from src.playwright_runtime import runtime as playwright_runtime
+    from src.run_journal import RunJournal
+    from src import result_writer
+    from src import metrics
+    from src import tracing
+    from src import screenshots
+    from src import token_outbox
+
+    run_key = run_key or datetime.now().strftime("%Y-%m-%d")
+    node_id = node_id or default_node_id()
+    max_concurrency = max_concurrency or batch_runner.MAX_CONCURRENCY or concurrency_limit
+    logger.info(f">>> Worker {node_id} joining run {run_key} <<<")
+
+    accounts = await batch_runner.fetch_active_accounts()
+    store = open_lease_store()
+    journal = RunJournal()
+    journal.start_run([], run_id=f"{run_key}-{node_id}")
+    await journal.start()
+    screenshots.set_run_id(journal.run_id)
+    executor = batch_runner.BatchExecutor(journal, concurrency_limit, max_concurrency)
+
+    async def process_chunk(chunk, on_finished):
+        journal.start_run(chunk, run_id=journal.run_id)
+        await executor.submit(chunk, on_finished=on_finished)
+
+    start_time = time.time()
+    metrics_server = await metrics.start_server()
+    await result_writer.start_default_writer()
+    await token_outbox.start_default_sender()
+    executor.open()
+    try:
+        try:
+            await run_lease_loop(
+                store, run_key, node_id, accounts, process_chunk,
+                backlog=lambda: executor.queued,
+                wait_progress=executor.wait_progress,
+                on_lost=executor.drop,
+            )
+        finally:
+            await executor.close()
+        await batch_runner.send_report(
+            executor,
+            time.time() - start_time,
+            title=f"🤖 **Relatório do Worker {node_id} ({run_key})**",
+        )
+    finally:
+        await result_writer.stop_default_writer()
+        await token_outbox.stop_default_sender()
+        await screenshots.close()
+        await journal.close()
+        await playwright_runtime.stop()
+        await http_pool.close_all()
+        await metrics.stop_server(metrics_server)
+        tracing.shutdown()
+
+
+if __name__ == "__main__":
+    import argparse
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Lease-based batch worker (one per node)")
+    parser.add_argument("--run-key", help="Shared run identifier (default: today's date)")
+    parser.add_argument("--node-id", help="Unique node name (default: hostname-pid)")
+    parser.add_argument("--concurrency", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(run_worker(run_key=args.run_key, node_id=args.node_id, concurrency_limit=args.concurrency))